@@ -1,10 +1,11 @@
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request, g, Response
 from flask_cors import CORS
 from flask_restx import Api
 from dotenv import load_dotenv
 import os
 import logging
 import sys
+import time
 import traceback
 
 # 配置详细日志
@@ -34,7 +35,8 @@ try:
         r"/*": {
             "origins": "*",
             "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-            "allow_headers": ["Content-Type", "Authorization"]
+            "allow_headers": ["Content-Type", "Authorization", "X-Profile", "If-None-Match"],
+            "expose_headers": ["Server-Timing", "ETag"]
         }
     })
 
@@ -66,11 +68,52 @@ try:
     api.add_namespace(document_ns, path='/documents')
     api.add_namespace(api_ns, path='/system')
 
+    # 异步上传的后台维护线程：重新提交遗留的pending文档、清理入库运行（无服务器环境中不启动）
+    if os.getenv('VERCEL_ENV') is None:
+        from utils.ingest_queue import start_maintenance_thread
+        start_maintenance_thread()
+
+    from utils.metrics import (
+        http_request_seconds, render_metrics, start_profile, stop_profile, format_server_timing
+    )
+
+    @app.before_request
+    def start_request_timer():
+        """记录请求开始时间；请求头 X-Profile 为真时开启阶段耗时记录"""
+        g.request_started = time.perf_counter()
+        g.profiling = request.headers.get('X-Profile', '').lower() in ('1', 'true', 'yes')
+        if g.profiling:
+            start_profile()
+
+    @app.after_request
+    def record_request_metrics(response):
+        """统计请求耗时，开启分析时通过 Server-Timing 响应头返回各阶段耗时"""
+        started = g.get('request_started')
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        http_request_seconds.observe(elapsed, method=request.method, endpoint=endpoint,
+                                     status=response.status_code)
+        if g.get('profiling'):
+            response.headers['Server-Timing'] = format_server_timing(stop_profile(), total=elapsed)
+        return response
+
+    @app.teardown_request
+    def clear_request_profile(error=None):
+        if g.get('profiling'):
+            stop_profile()
+
     @app.route('/health')
     def health_check():
         """健康检查端点"""
         return jsonify({"status": "healthy", "environment": os.getenv('VERCEL_ENV', 'local')})
 
+    @app.route('/metrics')
+    def metrics():
+        """Prometheus 格式的进程内指标"""
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
     @app.errorhandler(Exception)
     def handle_error(error):
         """处理所有异常并记录详细信息"""
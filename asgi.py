@@ -0,0 +1,12 @@
+"""
+ASGI 入口（可选的异步服务模式，依赖见 requirements-asgi.txt）
+
+    uvicorn asgi:application --host 0.0.0.0 --port 8000 --workers 4
+
+文档读取和文档统计接口使用异步 MongoDB 客户端处理，等待数据库时不阻塞工作进程；
+其余接口仍由 Flask 应用处理（在线程池中执行），路由和 Swagger 文档与同步模式相同。
+"""
+from app import app
+from routes.async_routes import create_asgi_app
+
+application = create_asgi_app(app)
@@ -0,0 +1,422 @@
+"""
+文档入库基准测试：生成合成的 DOCX/PDF/TXT 文档，测量 DocumentProcessor 的吞吐量
+
+对每种格式生成若干内容互不相同的文档（避免触发重复上传检测），逐个调用
+process_and_save，统计每秒处理文档数、单文档耗时的 p50/p95、每个文档的数据库往返次数，
+随后通过 GET /api/documents/<id> 测量读取路径（首次读取、缓存命中、ETag重新验证）。
+指定 --compare-encodings 时，再分别以 raw 和 compact 内容存储格式处理同一批文档，
+对比内容块的存储大小和不经缓存的读取耗时。
+
+默认使用内存版MongoDB替身（benchmarks/memory_mongo.py），只衡量本进程内的处理开销；
+指定 --mongodb-uri 时连接本地 mongod，往返次数由 pymongo 的命令监听器统计。
+
+用法:
+    python benchmarks/ingest_benchmark.py [--docs 20] [--formats docx,pdf,txt] [--output result.json]
+    python benchmarks/ingest_benchmark.py --mongodb-uri mongodb://localhost:27017 --db-name ingest_benchmark
+    python benchmarks/ingest_benchmark.py --formats docx --tables 10 --table-rows 200 --compare-encodings
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import resource
+import statistics
+import sys
+import threading
+import time
+from typing import Callable, Dict, List
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+# 在导入应用模块之前配置日志，避免逐条输出处理日志影响测量
+logging.basicConfig(level=logging.WARNING)
+
+FORMATS = ('docx', 'pdf', 'txt')
+WORDS = ('lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur', 'adipiscing', 'elit',
+         'sed', 'do', 'eiusmod', 'tempor', 'incididunt', 'labore', 'dolore', 'magna')
+
+
+def make_sentence(seed: int, index: int, words: int = 12) -> str:
+    """生成确定性的句子；seed 不同的文档内容不同"""
+    picked = [WORDS[(seed * 7 + index * 3 + i) % len(WORDS)] for i in range(words)]
+    return f"Doc {seed} item {index}: " + ' '.join(picked) + '.'
+
+
+def make_docx(seed: int, heading_depth: int, sections_per_level: int,
+              paragraphs: int, tables: int, table_rows: int) -> bytes:
+    """生成带多级标题、段落和表格的Word文档"""
+    from docx import Document as DocxDocument
+
+    doc = DocxDocument()
+    counter = [0]
+
+    def add_level(level: int, prefix: str):
+        for i in range(sections_per_level):
+            number = f"{prefix}{i + 1}"
+            doc.add_heading(f"Section {number}", level=level)
+            for _ in range(paragraphs):
+                counter[0] += 1
+                doc.add_paragraph(make_sentence(seed, counter[0]))
+            if level < heading_depth:
+                add_level(level + 1, f"{number}.")
+
+    add_level(1, '')
+    for t in range(tables):
+        table = doc.add_table(rows=table_rows, cols=4)
+        for r, row in enumerate(table.rows):
+            for c, cell in enumerate(row.cells):
+                cell.text = f"T{seed}-{t}-{r}-{c}"
+
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def make_pdf(seed: int, pages: int, lines_per_page: int = 40) -> bytes:
+    """生成每页若干行文本的PDF（直接写出PDF对象，不依赖额外的库）"""
+    objects: List[bytes] = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_id = add(b"")
+    kids = []
+    for page in range(pages):
+        lines = b" ".join(
+            b"(%s) '" % make_sentence(seed, page * lines_per_page + line, words=8).encode('ascii')
+            for line in range(lines_per_page)
+        )
+        text = b"BT /F1 10 Tf 40 780 Td 12 TL " + lines + b" ET"
+        stream_id = add(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(text), text))
+        kids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_id, font_id, stream_id)
+        ))
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % kid for kid in kids), pages)
+    catalog_id = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref_offset = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        output += b"%010d 00000 n \n" % offset
+    output += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, catalog_id, xref_offset)
+    return bytes(output)
+
+
+def make_txt(seed: int, paragraphs: int) -> bytes:
+    """生成以空行分隔段落的UTF-8文本"""
+    return '\n\n'.join(
+        ' '.join(make_sentence(seed, p * 4 + s) for s in range(4)) for p in range(paragraphs)
+    ).encode('utf-8')
+
+
+def build_generators(args: argparse.Namespace) -> Dict[str, Callable[[int], bytes]]:
+    return {
+        'docx': lambda seed: make_docx(seed, args.heading_depth, args.sections_per_level,
+                                       args.paragraphs, args.tables, args.table_rows),
+        'pdf': lambda seed: make_pdf(seed, args.pdf_pages),
+        'txt': lambda seed: make_txt(seed, args.txt_paragraphs)
+    }
+
+
+class CommandCounter:
+    """统计真实 mongod 上执行的命令数（不含连接握手和心跳）"""
+
+    IGNORED = {'hello', 'ismaster', 'isMaster', 'endSessions', 'saslStart', 'saslContinue', 'ping'}
+
+    def __init__(self):
+        from pymongo import monitoring
+
+        counter = self
+
+        class Listener(monitoring.CommandListener):
+            def started(self, event):
+                if event.command_name not in CommandCounter.IGNORED:
+                    counter.record(event.command_name)
+
+            def succeeded(self, event):
+                pass
+
+            def failed(self, event):
+                pass
+
+        self.listener = Listener()
+        self.commands: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, command: str):
+        with self._lock:
+            self.commands[command] = self.commands.get(command, 0) + 1
+
+    @property
+    def round_trips(self) -> int:
+        return sum(self.commands.values())
+
+
+def connect(args: argparse.Namespace):
+    """创建数据库客户端并注入 database.mongo_client，返回可读取 round_trips 的计数对象"""
+    from database import mongo_client
+
+    os.environ['MONGODB_DB_NAME'] = args.db_name
+    if args.mongodb_uri:
+        from pymongo import MongoClient
+        counter = CommandCounter()
+        mongo_client._client = MongoClient(args.mongodb_uri, event_listeners=[counter.listener])
+        mongo_client.ping()
+    else:
+        from memory_mongo import MemoryClient
+        counter = mongo_client._client = MemoryClient()
+    mongo_client.ensure_indexes()
+    return counter
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(len(ordered) * fraction)) - 1))]
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return {
+        'mean': statistics.mean(values),
+        'p50': percentile(values, 0.5),
+        'p95': percentile(values, 0.95),
+        'max': max(values)
+    }
+
+
+def peak_rss_mb() -> Dict[str, float]:
+    """本进程及已结束子进程（PDF提取进程池）的峰值常驻内存"""
+    # Linux 上 ru_maxrss 的单位是KB，macOS 上是字节
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return {
+        'self': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+        'children': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    }
+
+
+def bench_ingest(file_type: str, payloads: List[bytes], counter, args: argparse.Namespace,
+                 codec=None) -> Dict:
+    """逐个处理文档，返回吞吐量、延迟和往返次数"""
+    from utils.document_processor import DocumentProcessor
+
+    latencies = []
+    round_trips = []
+    document_ids = []
+    rss_before = peak_rss_mb()['self']
+    started = time.perf_counter()
+    for index, payload in enumerate(payloads):
+        trips_before = counter.round_trips
+        doc_started = time.perf_counter()
+        processor = DocumentProcessor(
+            f"bench-{index}.{file_type}",
+            payload,
+            batch_size=args.batch_size,
+            pdf_workers=args.pdf_workers,
+            codec=codec
+        )
+        document_ids.append(processor.process_and_save())
+        latencies.append(time.perf_counter() - doc_started)
+        round_trips.append(counter.round_trips - trips_before)
+    elapsed = time.perf_counter() - started
+
+    return {
+        'documents': len(payloads),
+        'avg_file_bytes': int(statistics.mean(len(p) for p in payloads)),
+        'docs_per_sec': len(payloads) / elapsed,
+        'latency_s': summarize(latencies),
+        'round_trips_per_doc': summarize(round_trips),
+        'peak_rss_growth_mb': peak_rss_mb()['self'] - rss_before,
+        'document_ids': document_ids
+    }
+
+
+def bench_read(document_ids: List[str], counter, args: argparse.Namespace) -> Dict:
+    """测量 GET /api/documents/<id>：首次读取、缓存命中和 If-None-Match 重新验证"""
+    from app import app
+
+    client = app.test_client()
+    query = f"?limit={args.read_limit}" if args.read_limit else ''
+    results = {}
+    etags = {}
+    for phase in ('cold', 'cached', 'revalidate'):
+        latencies = []
+        round_trips = []
+        for _ in range(args.read_repeats if phase != 'cold' else 1):
+            for document_id in document_ids:
+                headers = {'If-None-Match': etags[document_id]} if phase == 'revalidate' else {}
+                trips_before = counter.round_trips
+                started = time.perf_counter()
+                response = client.get(f"/api/documents/{document_id}{query}", headers=headers)
+                latencies.append(time.perf_counter() - started)
+                round_trips.append(counter.round_trips - trips_before)
+                expected = 304 if phase == 'revalidate' else 200
+                if response.status_code != expected:
+                    raise RuntimeError(f"GET {document_id} returned {response.status_code}, expected {expected}")
+                etags[document_id] = response.headers.get('ETag')
+        results[phase] = {
+            'requests': len(latencies),
+            'latency_s': summarize(latencies),
+            'round_trips_per_request': summarize(round_trips)
+        }
+    return results
+
+
+def content_storage(document_ids: List[str]) -> Dict:
+    """指定文档的内容块数量和BSON编码后的总字节数"""
+    from bson import encode
+    from database.mongo_client import document_contents
+
+    sizes = [len(encode(content)) for content in document_contents.find({'document_id': {'$in': document_ids}})]
+    return {'contents': len(sizes), 'bytes': sum(sizes)}
+
+
+def bench_uncached_read(document_ids: List[str], query: str, args: argparse.Namespace) -> Dict:
+    """不经缓存读取文档的耗时"""
+    from app import app
+    from utils.document_cache import set_cache_backend, LRUCacheBackend
+
+    client = app.test_client()
+    # 容量为0的缓存不保存任何条目
+    set_cache_backend(LRUCacheBackend(max_bytes=0))
+    latencies = []
+    response_bytes = 0
+    try:
+        for _ in range(args.read_repeats):
+            for document_id in document_ids:
+                started = time.perf_counter()
+                response = client.get(f"/api/documents/{document_id}{query}")
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    raise RuntimeError(f"GET {document_id} returned {response.status_code}")
+                response_bytes += len(response.data)
+    finally:
+        set_cache_backend(LRUCacheBackend())
+    return {
+        'requests': len(latencies),
+        'latency_s': summarize(latencies),
+        'avg_response_bytes': response_bytes // max(1, len(latencies))
+    }
+
+
+def bench_encodings(file_type: str, payloads: List[bytes], counter, args: argparse.Namespace) -> Dict:
+    """分别以 raw 和 compact 格式处理同一批文档，对比存储大小和读取耗时"""
+    from database.mongo_client import documents
+    from utils.content_codec import ContentCodec
+
+    results = {}
+    document_ids = {}
+    for encoding in ('raw', 'compact'):
+        codec = ContentCodec(encoding=encoding)
+        ingest = bench_ingest(file_type, payloads, counter, args, codec=codec)
+        document_ids[encoding] = ingest.pop('document_ids')
+        # 去掉内容哈希，使同一批文件可以用另一种格式再次处理
+        documents.update_many({'_id': {'$in': document_ids[encoding]}}, {'$unset': {'content_hash': ''}})
+        results[encoding] = {
+            'compression': codec.compression if codec.is_compact else None,
+            'docs_per_sec': ingest['docs_per_sec'],
+            'storage': content_storage(document_ids[encoding])
+        }
+
+    # 两种格式都入库后再测量读取，使两者面对相同的数据量
+    for encoding in ('raw', 'compact'):
+        results[encoding]['read'] = bench_uncached_read(document_ids[encoding], '', args)
+        results[encoding]['read_without_tables'] = bench_uncached_read(
+            document_ids[encoding], '?include_tables=false', args)
+
+    raw, compact = results['raw'], results['compact']
+    results['savings'] = {
+        'storage_ratio': compact['storage']['bytes'] / max(1, raw['storage']['bytes']),
+        'read_p50_ratio': compact['read']['latency_s']['p50'] / raw['read']['latency_s']['p50'],
+        'read_without_tables_p50_ratio':
+            compact['read_without_tables']['latency_s']['p50'] / raw['read']['latency_s']['p50']
+    }
+    return results
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='文档入库基准测试')
+    parser.add_argument('--docs', type=int, default=20, help='每种格式处理的文档数')
+    parser.add_argument('--formats', default=','.join(FORMATS), help='逗号分隔的格式列表：docx,pdf,txt')
+    parser.add_argument('--heading-depth', type=int, default=3, help='DOCX标题层级深度')
+    parser.add_argument('--sections-per-level', type=int, default=3, help='DOCX每级标题下的子章节数')
+    parser.add_argument('--paragraphs', type=int, default=5, help='DOCX每个章节的段落数')
+    parser.add_argument('--tables', type=int, default=2, help='DOCX表格数')
+    parser.add_argument('--table-rows', type=int, default=20, help='DOCX每个表格的行数')
+    parser.add_argument('--pdf-pages', type=int, default=20, help='PDF页数')
+    parser.add_argument('--txt-paragraphs', type=int, default=200, help='TXT段落数')
+    parser.add_argument('--batch-size', type=int, default=500, help='DocumentProcessor批量写入大小')
+    parser.add_argument('--pdf-workers', type=int, default=None, help='PDF并行提取进程数')
+    parser.add_argument('--read-repeats', type=int, default=5, help='缓存命中和重新验证阶段的重复次数')
+    parser.add_argument('--read-limit', type=int, default=0, help='读取时的分页大小（0表示不分页）')
+    parser.add_argument('--compare-encodings', action='store_true',
+                        help='对比 raw 和 compact 内容存储格式的存储大小和读取耗时')
+    parser.add_argument('--mongodb-uri', help='本地 mongod 地址；不指定时使用内存替身')
+    parser.add_argument('--db-name', default='ingest_benchmark', help='测试使用的数据库名')
+    parser.add_argument('--drop-db', action='store_true', help='结束后删除测试数据库（仅对 --mongodb-uri 有效）')
+    parser.add_argument('--output', help='将结果写入JSON文件')
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    formats = [f.strip() for f in args.formats.split(',') if f.strip()]
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        raise SystemExit(f"不支持的格式: {', '.join(sorted(unknown))}")
+
+    counter = connect(args)
+    generators = build_generators(args)
+
+    report = {
+        'python': sys.version.split()[0],
+        'backend': 'mongod' if args.mongodb_uri else 'memory',
+        'parameters': {key: value for key, value in vars(args).items()
+                       if key not in ('mongodb_uri', 'output', 'drop_db')},
+        'ingest': {},
+        'read': {}
+    }
+    if args.compare_encodings:
+        report['encodings'] = {}
+    seed = 0
+    for file_type in formats:
+        payloads = []
+        for _ in range(args.docs):
+            seed += 1
+            payloads.append(generators[file_type](seed))
+        result = bench_ingest(file_type, payloads, counter, args)
+        document_ids = result.pop('document_ids')
+        report['ingest'][file_type] = result
+        report['read'][file_type] = bench_read(document_ids, counter, args)
+        if args.compare_encodings:
+            # 去掉内容哈希，使同一批文件可以再次处理
+            from database.mongo_client import documents
+            documents.update_many({'_id': {'$in': document_ids}}, {'$unset': {'content_hash': ''}})
+            report['encodings'][file_type] = bench_encodings(file_type, payloads, counter, args)
+
+    report['peak_rss_mb'] = peak_rss_mb()
+    report['commands'] = dict(counter.commands)
+
+    if args.mongodb_uri and args.drop_db:
+        from database import mongo_client
+        mongo_client.get_client().drop_database(args.db_name)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+
+
+if __name__ == '__main__':
+    main()
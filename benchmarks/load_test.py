@@ -0,0 +1,268 @@
+"""
+读取接口的并发负载测试：对比同步模式（gunicorn 同步工作进程）与 ASGI 模式（uvicorn + 异步 MongoDB 客户端）
+
+两种模式使用相同的工作进程数，以 --concurrency 个并发客户端持续请求 GET /api/documents/<id>，
+统计每秒请求数和延迟的 p50/p95/p99。默认关闭文档缓存，使每个请求都读取数据库。
+
+默认使用内存版MongoDB替身（benchmarks/memory_mongo.py），每个服务进程启动时生成相同的合成文档，
+并为每条数据库命令模拟 --latency-ms 毫秒的往返延迟（同步客户端阻塞等待，异步客户端在事件循环中等待）。
+指定 --mongodb-uri 时连接真实的 mongod：先写入合成文档，服务进程直接读取。
+
+依赖 requirements-asgi.txt 中的 ASGI 依赖。
+
+用法:
+    python benchmarks/load_test.py [--workers 2] [--concurrency 64] [--duration 10] [--latency-ms 5]
+    python benchmarks/load_test.py --mongodb-uri mongodb://localhost:27017 --db-name load_test --output result.json
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+DEFAULT_DOCS = 20
+DEFAULT_LATENCY_MS = 5.0
+MODES = ('sync', 'asgi')
+
+
+def document_ids(count: int) -> List[str]:
+    return [f'load-test-{i}' for i in range(count)]
+
+
+def seed_documents(count: int):
+    """写入合成文档（ID固定，已存在的跳过），每个文档约20个章节、60个段落和一个表格"""
+    from benchmarks.ingest_benchmark import make_docx
+    from database.mongo_client import documents
+    from models.document_models import Document, DocumentStatus
+    from utils.document_processor import DocumentProcessor
+
+    for i, document_id in enumerate(document_ids(count)):
+        if documents.find_one({'_id': document_id, 'status': DocumentStatus.PROCESSED.value}, {'_id': 1}):
+            continue
+        filename = f'{document_id}.docx'
+        doc = Document(filename, '')
+        doc.data['_id'] = document_id
+        doc.data['status'] = DocumentStatus.PROCESSING.value
+        documents.replace_one({'_id': document_id}, doc.data, upsert=True)
+        # 传入 document_id 时处理器沿用已创建的文档记录
+        DocumentProcessor(filename, make_docx(i, 2, 4, 3, 1, 10), document_id=document_id,
+                          build_embeddings=False).process_and_save()
+
+
+def _prepare_server():
+    """服务进程启动时连接数据库；内存模式下生成合成文档，之后开启延迟模拟"""
+    from database import mongo_client, async_mongo_client
+
+    mongodb_uri = os.getenv('LOAD_TEST_MONGODB_URI')
+    if mongodb_uri:
+        from pymongo import MongoClient
+        from motor.motor_asyncio import AsyncIOMotorClient
+        mongo_client._client = MongoClient(mongodb_uri)
+        async_mongo_client._async_client = AsyncIOMotorClient(mongodb_uri)
+        return
+
+    from benchmarks.memory_mongo import MemoryClient, AsyncMemoryClient
+    client = mongo_client._client = MemoryClient()
+    seed_documents(int(os.getenv('LOAD_TEST_DOCS', DEFAULT_DOCS)))
+    client.latency = float(os.getenv('LOAD_TEST_LATENCY_MS', DEFAULT_LATENCY_MS)) / 1000
+    async_mongo_client._async_client = AsyncMemoryClient(client)
+
+
+def create_wsgi_app():
+    """gunicorn 入口：'benchmarks.load_test:create_wsgi_app()'"""
+    _prepare_server()
+    from app import app
+    return app
+
+
+def create_asgi_app():
+    """uvicorn 入口：--factory benchmarks.load_test:create_asgi_app"""
+    _prepare_server()
+    from asgi import application
+    return application
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def server_command(mode: str, port: int, workers: int) -> List[str]:
+    if mode == 'sync':
+        return [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--worker-class', 'sync',
+                '--bind', f'127.0.0.1:{port}', 'benchmarks.load_test:create_wsgi_app()']
+    return [sys.executable, '-m', 'uvicorn', '--factory', 'benchmarks.load_test:create_asgi_app',
+            '--workers', str(workers), '--host', '127.0.0.1', '--port', str(port), '--no-access-log']
+
+
+def request(port: int, path: str) -> int:
+    """发起一次请求（每次新建连接，gunicorn 同步工作进程不保持连接）"""
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    try:
+        connection.request('GET', path)
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    finally:
+        connection.close()
+
+
+def wait_ready(port: int, paths: List[str], process: subprocess.Popen, timeout: float = 120.0):
+    """等待全部工作进程就绪：健康检查通过，且各文档均可读取"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"服务进程已退出（退出码 {process.returncode}）")
+        try:
+            if request(port, '/health') == 200 and all(request(port, path) == 200 for path in paths):
+                return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError('服务启动超时')
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(len(ordered) * fraction)) - 1))]
+
+
+def run_load(port: int, paths: List[str], concurrency: int, duration: float) -> Dict:
+    """以固定数量的并发客户端持续请求，统计吞吐量和延迟"""
+    latencies: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(index: int):
+        local, failed, i = [], 0, index
+        while time.monotonic() < deadline:
+            path = paths[i % len(paths)]
+            i += 1
+            started = time.perf_counter()
+            try:
+                ok = request(port, path) == 200
+            except OSError:
+                ok = False
+            if ok:
+                local.append(time.perf_counter() - started)
+            else:
+                failed += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(client, range(concurrency)))
+    elapsed = time.monotonic() - started
+    if not latencies:
+        return {'requests': 0, 'errors': errors[0]}
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'requests_per_second': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 0.5) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000
+    }
+
+
+def bench_mode(mode: str, paths: List[str], args: argparse.Namespace, env: Dict[str, str]) -> Dict:
+    port = free_port()
+    with tempfile.TemporaryFile() as log:
+        process = subprocess.Popen(server_command(mode, port, args.workers), cwd=ROOT_DIR, env=env,
+                                   stdout=log, stderr=subprocess.STDOUT)
+        try:
+            wait_ready(port, paths, process)
+            # 预热：让每个工作进程都处理过请求
+            run_load(port, paths, args.concurrency, min(2.0, args.duration))
+            return run_load(port, paths, args.concurrency, args.duration)
+        except RuntimeError:
+            log.seek(0)
+            sys.stderr.write(log.read().decode('utf-8', 'replace')[-4000:])
+            raise
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='同步模式与 ASGI 模式的读取接口负载测试')
+    parser.add_argument('--workers', type=int, default=2, help='两种模式的工作进程数')
+    parser.add_argument('--concurrency', type=int, default=64, help='并发客户端数')
+    parser.add_argument('--duration', type=float, default=10.0, help='每种模式的测量时长（秒）')
+    parser.add_argument('--docs', type=int, default=DEFAULT_DOCS, help='合成文档数')
+    parser.add_argument('--limit', type=int, default=50, help='每次读取的内容块数（limit 参数，0 表示全部）')
+    parser.add_argument('--latency-ms', type=float, default=DEFAULT_LATENCY_MS,
+                        help='内存模式下每条数据库命令模拟的往返延迟（毫秒）')
+    parser.add_argument('--cache', action='store_true', help='开启文档缓存（默认关闭，每个请求都读取数据库）')
+    parser.add_argument('--modes', default=','.join(MODES), help='测试的模式，逗号分隔')
+    parser.add_argument('--mongodb-uri', help='连接真实的 mongod（默认使用内存替身）')
+    parser.add_argument('--db-name', default='load_test', help='数据库名')
+    parser.add_argument('--output', help='将结果写入JSON文件')
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    env = dict(os.environ, PYTHONPATH=ROOT_DIR, MONGODB_DB_NAME=args.db_name, EXTRACT_ISOLATION='false',
+               LOAD_TEST_DOCS=str(args.docs), LOAD_TEST_LATENCY_MS=str(args.latency_ms))
+    if not args.cache:
+        env['DOCUMENT_CACHE_MAX_BYTES'] = '0'
+    if args.mongodb_uri:
+        from pymongo import MongoClient
+        from database import mongo_client
+
+        os.environ['MONGODB_DB_NAME'] = args.db_name
+        os.environ['EXTRACT_ISOLATION'] = 'false'
+        mongo_client._client = MongoClient(args.mongodb_uri)
+        mongo_client.ensure_indexes()
+        seed_documents(args.docs)
+        env['LOAD_TEST_MONGODB_URI'] = args.mongodb_uri
+
+    query = f'?limit={args.limit}' if args.limit else ''
+    paths = [f'/api/documents/{document_id}{query}' for document_id in document_ids(args.docs)]
+    results = {
+        'config': {
+            'workers': args.workers,
+            'concurrency': args.concurrency,
+            'duration_s': args.duration,
+            'docs': args.docs,
+            'limit': args.limit,
+            'cache': args.cache,
+            'backend': 'mongodb' if args.mongodb_uri else f'memory (latency {args.latency_ms:g}ms)'
+        }
+    }
+    for mode in args.modes.split(','):
+        print(f"Running {mode} mode...", file=sys.stderr)
+        results[mode] = bench_mode(mode, paths, args, env)
+
+    if 'sync' in results and 'asgi' in results and results['sync'].get('requests_per_second'):
+        results['asgi_speedup'] = results['asgi']['requests_per_second'] / results['sync']['requests_per_second']
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,544 @@
+"""
+基准测试使用的内存版MongoDB替身
+
+只实现本项目用到的 pymongo 接口子集（插入、查询、排序、投影、更新、批量写入）。
+文档以BSON编码保存并在读取时解码，使序列化开销与真实驱动处于同一量级；
+每次集合操作计为一次往返，便于与真实 mongod 的命令计数对比；可为每次往返模拟网络延迟。
+AsyncMemoryClient 以 Motor 的接口访问同一份数据（用于 ASGI 模式的负载测试）。
+
+用法:
+    from database import mongo_client, async_mongo_client
+    mongo_client._client = MemoryClient(latency=0.005)
+    async_mongo_client._async_client = AsyncMemoryClient(mongo_client._client)
+"""
+import re
+import time
+import asyncio
+import threading
+import contextvars
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import bson
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+
+def _get_path(doc: Dict[str, Any], path: str) -> Tuple[Any, bool]:
+    current = doc
+    for part in path.split('.'):
+        if isinstance(current, dict) and part in current:
+            current = current[part]
+        else:
+            return None, False
+    return current, True
+
+
+def _compare(value, operator: str, argument) -> bool:
+    if value is None:
+        return False
+    try:
+        if operator == '$gt':
+            return value > argument
+        if operator == '$gte':
+            return value >= argument
+        if operator == '$lt':
+            return value < argument
+        return value <= argument
+    except TypeError:
+        return False
+
+
+def _match_condition(value, exists: bool, condition) -> bool:
+    if isinstance(condition, dict) and any(key.startswith('$') for key in condition):
+        for operator, argument in condition.items():
+            if operator == '$in':
+                values = value if isinstance(value, list) else [value]
+                if not any(v in argument for v in values):
+                    return False
+            elif operator == '$nin':
+                values = value if isinstance(value, list) else [value]
+                if any(v in argument for v in values):
+                    return False
+            elif operator == '$ne':
+                if value == argument:
+                    return False
+            elif operator in ('$gt', '$gte', '$lt', '$lte'):
+                if not _compare(value, operator, argument):
+                    return False
+            elif operator == '$exists':
+                if exists != bool(argument):
+                    return False
+            elif operator == '$regex':
+                if not isinstance(value, str) or not re.search(argument, value):
+                    return False
+            else:
+                raise NotImplementedError(f"Unsupported query operator: {operator}")
+        return True
+    if isinstance(value, list) and not isinstance(condition, list):
+        return condition in value
+    return value == condition
+
+
+def matches(doc: Dict[str, Any], query: Optional[Dict[str, Any]]) -> bool:
+    """判断文档是否满足查询条件"""
+    for key, condition in (query or {}).items():
+        if key == '$or':
+            if not any(matches(doc, sub) for sub in condition):
+                return False
+        elif key == '$and':
+            if not all(matches(doc, sub) for sub in condition):
+                return False
+        else:
+            value, exists = _get_path(doc, key)
+            if not _match_condition(value, exists, condition):
+                return False
+    return True
+
+
+def _project(doc: Dict[str, Any], projection) -> Dict[str, Any]:
+    if not projection:
+        return doc
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+
+    included = [field for field, flag in projection.items() if flag and field != '_id']
+    if included:
+        result = {}
+        if projection.get('_id', 1) and '_id' in doc:
+            result['_id'] = doc['_id']
+        for field in included:
+            value, exists = _get_path(doc, field)
+            if exists:
+                target = result
+                parts = field.split('.')
+                for part in parts[:-1]:
+                    target = target.setdefault(part, {})
+                target[parts[-1]] = value
+        return result
+
+    for field, flag in projection.items():
+        if flag:
+            continue
+        target = doc
+        parts = field.split('.')
+        for part in parts[:-1]:
+            target = target.get(part) if isinstance(target, dict) else None
+        if isinstance(target, dict):
+            target.pop(parts[-1], None)
+    return doc
+
+
+def _sort_key(value):
+    # None 排在最前，与MongoDB一致
+    return (value is not None, value)
+
+
+def _apply_update(doc: Dict[str, Any], update: Dict[str, Any], inserting: bool = False):
+    for operator, fields in update.items():
+        for path, value in fields.items():
+            target = doc
+            parts = path.split('.')
+            for part in parts[:-1]:
+                target = target.setdefault(part, {})
+            name = parts[-1]
+            if operator == '$set':
+                target[name] = value
+            elif operator == '$setOnInsert':
+                if inserting:
+                    target[name] = value
+            elif operator == '$inc':
+                target[name] = target.get(name, 0) + value
+            elif operator == '$unset':
+                target.pop(name, None)
+            elif operator == '$push':
+                items = target.setdefault(name, [])
+                if isinstance(value, dict) and '$each' in value:
+                    items.extend(value['$each'])
+                    if '$slice' in value:
+                        limit = value['$slice']
+                        target[name] = items[limit:] if limit < 0 else items[:limit]
+                else:
+                    items.append(value)
+            elif operator == '$addToSet':
+                if value not in target.setdefault(name, []):
+                    target[name].append(value)
+            else:
+                raise NotImplementedError(f"Unsupported update operator: {operator}")
+
+
+class Result:
+    """各类写操作的返回值"""
+
+    def __init__(self, **fields):
+        self.acknowledged = True
+        self.__dict__.update(fields)
+
+
+class MemoryCursor:
+    """查询游标，迭代时才执行查询"""
+
+    def __init__(self, collection: 'MemoryCollection', query, projection):
+        self._collection = collection
+        self._query = query
+        self._projection = projection
+        self._sort: List[Tuple[str, int]] = []
+        self._skip = 0
+        self._limit = 0
+        self._results = None
+
+    def sort(self, key, direction: int = 1) -> 'MemoryCursor':
+        self._sort = [(key, direction)] if isinstance(key, str) else list(key)
+        return self
+
+    def skip(self, count: int) -> 'MemoryCursor':
+        self._skip = count
+        return self
+
+    def limit(self, count: int) -> 'MemoryCursor':
+        self._limit = count
+        return self
+
+    def batch_size(self, size: int) -> 'MemoryCursor':
+        return self
+
+    def hint(self, index) -> 'MemoryCursor':
+        return self
+
+    def close(self):
+        self._results = iter(())
+
+    def _execute(self):
+        self._collection.database.client.record_command(self._collection.name, 'find')
+        rows = self._collection.matching(self._query)
+        for field, direction in reversed(self._sort):
+            rows.sort(key=lambda row: _sort_key(_get_path(row[0], field)[0]), reverse=direction == -1)
+        rows = rows[self._skip:]
+        if self._limit:
+            rows = rows[:self._limit]
+        return (_project(bson.decode(raw), self._projection) for _, raw in rows)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._results is None:
+            self._results = self._execute()
+        return next(self._results)
+
+
+class MemoryCollection:
+    """内存集合：保存解码后的文档（用于匹配）和BSON编码（用于返回副本）"""
+
+    def __init__(self, database: 'MemoryDatabase', name: str):
+        self.database = database
+        self.name = name
+        self._rows: Dict[Any, Tuple[Dict[str, Any], bytes]] = {}
+        self._unique_fields: List[Tuple[str, bool]] = []
+        self._lock = threading.RLock()
+
+    def _record(self, command: str):
+        self.database.client.record_command(self.name, command)
+
+    def matching(self, query) -> List[Tuple[Dict[str, Any], bytes]]:
+        with self._lock:
+            document_id = (query or {}).get('_id')
+            if document_id is not None and not isinstance(document_id, dict):
+                row = self._rows.get(document_id)
+                return [row] if row and matches(row[0], query) else []
+            return [row for row in self._rows.values() if matches(row[0], query)]
+
+    def _check_unique(self, doc: Dict[str, Any], replacing=None):
+        if doc['_id'] in self._rows and doc['_id'] != replacing:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: _id_")
+        for field, sparse in self._unique_fields:
+            value, exists = _get_path(doc, field)
+            if sparse and not exists:
+                continue
+            for other_id, (other, _) in self._rows.items():
+                if other_id != replacing and _get_path(other, field) == (value, exists):
+                    raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: {field}_1")
+
+    def _store(self, doc: Dict[str, Any], replacing=None):
+        self._check_unique(doc, replacing)
+        raw = bson.encode(doc)
+        if replacing is not None and replacing != doc['_id']:
+            del self._rows[replacing]
+        self._rows[doc['_id']] = (bson.decode(raw), raw)
+
+    def _insert(self, doc: Dict[str, Any]):
+        if '_id' not in doc:
+            doc['_id'] = ObjectId()
+        self._store(doc)
+        return doc['_id']
+
+    def create_index(self, keys, unique: bool = False, sparse: bool = False, **kwargs) -> str:
+        self._record('createIndexes')
+        field = keys if isinstance(keys, str) else keys[0][0]
+        if unique:
+            self._unique_fields.append((field, sparse))
+        return f"{field}_1"
+
+    def insert_one(self, doc: Dict[str, Any]) -> Result:
+        self._record('insert')
+        with self._lock:
+            return Result(inserted_id=self._insert(doc))
+
+    def insert_many(self, docs: Iterable[Dict[str, Any]], ordered: bool = True) -> Result:
+        self._record('insert')
+        with self._lock:
+            return Result(inserted_ids=[self._insert(doc) for doc in docs])
+
+    def find(self, filter=None, projection=None, sort=None, limit: int = 0, **kwargs) -> MemoryCursor:
+        cursor = MemoryCursor(self, filter, projection)
+        if sort:
+            cursor.sort(sort)
+        if limit:
+            cursor.limit(limit)
+        return cursor
+
+    def find_one(self, filter=None, projection=None, sort=None, **kwargs) -> Optional[Dict[str, Any]]:
+        return next(self.find(filter, projection, sort=sort, limit=1), None)
+
+    def _update(self, query, update, upsert: bool, many: bool, replacement: bool = False) -> Result:
+        with self._lock:
+            rows = self.matching(query)
+            if not many:
+                rows = rows[:1]
+            for doc, _ in rows:
+                updated = bson.decode(bson.encode(doc))
+                if replacement:
+                    updated = dict(update, _id=doc['_id'])
+                else:
+                    _apply_update(updated, update)
+                self._store(updated, replacing=doc['_id'])
+            if rows or not upsert:
+                return Result(matched_count=len(rows), modified_count=len(rows), upserted_id=None)
+
+            doc = {key: value for key, value in query.items()
+                   if not key.startswith('$') and not isinstance(value, dict)}
+            if replacement:
+                doc.update(update)
+            else:
+                _apply_update(doc, update, inserting=True)
+            return Result(matched_count=0, modified_count=0, upserted_id=self._insert(doc))
+
+    def update_one(self, filter, update, upsert: bool = False, **kwargs) -> Result:
+        self._record('update')
+        return self._update(filter, update, upsert, many=False)
+
+    def update_many(self, filter, update, upsert: bool = False, **kwargs) -> Result:
+        self._record('update')
+        return self._update(filter, update, upsert, many=True)
+
+    def replace_one(self, filter, replacement, upsert: bool = False, **kwargs) -> Result:
+        self._record('update')
+        return self._update(filter, replacement, upsert, many=False, replacement=True)
+
+    def find_one_and_update(self, filter, update, projection=None, sort=None, upsert: bool = False,
+                            return_document: bool = False, **kwargs) -> Optional[Dict[str, Any]]:
+        self._record('findAndModify')
+        with self._lock:
+            rows = self.matching(filter)
+            for field, direction in reversed(sort or []):
+                rows.sort(key=lambda row: _sort_key(_get_path(row[0], field)[0]), reverse=direction == -1)
+            if not rows:
+                if not upsert:
+                    return None
+                result = self._update(filter, update, True, many=False)
+                before, after = None, self._rows[result.upserted_id][1]
+            else:
+                before = rows[0][1]
+                self._update({'_id': rows[0][0]['_id']}, update, False, many=False)
+                after = self._rows[rows[0][0]['_id']][1]
+            raw = after if return_document else before
+            return _project(bson.decode(raw), projection) if raw else None
+
+    def delete_one(self, filter) -> Result:
+        self._record('delete')
+        with self._lock:
+            rows = self.matching(filter)[:1]
+            for doc, _ in rows:
+                del self._rows[doc['_id']]
+            return Result(deleted_count=len(rows))
+
+    def delete_many(self, filter) -> Result:
+        self._record('delete')
+        with self._lock:
+            rows = self.matching(filter)
+            for doc, _ in rows:
+                del self._rows[doc['_id']]
+            return Result(deleted_count=len(rows))
+
+    def bulk_write(self, requests, ordered: bool = True) -> Result:
+        self._record('bulkWrite')
+        with self._lock:
+            for request in requests:
+                kind = type(request).__name__
+                if kind == 'InsertOne':
+                    self._insert(request._doc)
+                elif kind in ('UpdateOne', 'UpdateMany'):
+                    self._update(request._filter, request._doc, request._upsert, many=kind == 'UpdateMany')
+                elif kind == 'ReplaceOne':
+                    self._update(request._filter, request._doc, request._upsert, many=False, replacement=True)
+                elif kind in ('DeleteOne', 'DeleteMany'):
+                    rows = self.matching(request._filter)
+                    for doc, _ in (rows if kind == 'DeleteMany' else rows[:1]):
+                        del self._rows[doc['_id']]
+                else:
+                    raise NotImplementedError(f"Unsupported bulk operation: {kind}")
+        return Result()
+
+    def count_documents(self, filter, **kwargs) -> int:
+        self._record('aggregate')
+        return len(self.matching(filter))
+
+    def estimated_document_count(self, **kwargs) -> int:
+        self._record('count')
+        return len(self._rows)
+
+    def distinct(self, key: str, filter=None) -> List[Any]:
+        self._record('distinct')
+        values = []
+        for doc, _ in self.matching(filter):
+            value, exists = _get_path(doc, key)
+            if exists and value not in values:
+                values.append(value)
+        return values
+
+    def drop(self):
+        self._record('drop')
+        with self._lock:
+            self._rows.clear()
+
+
+class MemoryDatabase:
+    def __init__(self, client: 'MemoryClient', name: str):
+        self.client = client
+        self.name = name
+        self._collections: Dict[str, MemoryCollection] = {}
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        if name not in self._collections:
+            self._collections[name] = MemoryCollection(self, name)
+        return self._collections[name]
+
+    def __getattr__(self, name: str) -> MemoryCollection:
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+    def command(self, command, *args, **kwargs) -> Dict[str, Any]:
+        self.client.record_command(None, command)
+        return {'ok': 1.0}
+
+
+# 异步客户端发出的命令已在事件循环中等待过延迟，不再阻塞等待
+_async_command = contextvars.ContextVar('async_command', default=False)
+
+
+class MemoryClient:
+    """MongoClient 替身；commands 记录每个集合各类命令的次数，latency 为每次往返模拟的延迟（秒）"""
+
+    def __init__(self, latency: float = 0.0):
+        self._databases: Dict[str, MemoryDatabase] = {}
+        self._lock = threading.Lock()
+        self.commands: Dict[str, int] = {}
+        self.latency = latency
+
+    def record_command(self, collection: Optional[str], command: str):
+        with self._lock:
+            self.commands[command] = self.commands.get(command, 0) + 1
+        if self.latency and not _async_command.get():
+            time.sleep(self.latency)
+
+    @property
+    def round_trips(self) -> int:
+        return sum(self.commands.values())
+
+    def __getitem__(self, name: str) -> MemoryDatabase:
+        if name not in self._databases:
+            self._databases[name] = MemoryDatabase(self, name)
+        return self._databases[name]
+
+    @property
+    def admin(self) -> MemoryDatabase:
+        return self['admin']
+
+    def close(self):
+        pass
+
+
+class AsyncMemoryCursor:
+    """Motor 游标替身"""
+
+    def __init__(self, client: 'AsyncMemoryClient', cursor: MemoryCursor):
+        self._client = client
+        self._cursor = cursor
+
+    def sort(self, key, direction: int = 1) -> 'AsyncMemoryCursor':
+        self._cursor.sort(key, direction)
+        return self
+
+    def skip(self, count: int) -> 'AsyncMemoryCursor':
+        self._cursor.skip(count)
+        return self
+
+    def limit(self, count: int) -> 'AsyncMemoryCursor':
+        self._cursor.limit(count)
+        return self
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        docs = await self._client.run(lambda: list(self._cursor))
+        return docs if length is None else docs[:length]
+
+
+class AsyncMemoryCollection:
+    """Motor 集合替身（只读接口）"""
+
+    def __init__(self, client: 'AsyncMemoryClient', collection: MemoryCollection):
+        self._client = client
+        self._collection = collection
+        self.name = collection.name
+
+    async def find_one(self, *args, **kwargs) -> Optional[Dict[str, Any]]:
+        return await self._client.run(lambda: self._collection.find_one(*args, **kwargs))
+
+    def find(self, *args, **kwargs) -> AsyncMemoryCursor:
+        return AsyncMemoryCursor(self._client, self._collection.find(*args, **kwargs))
+
+    async def count_documents(self, *args, **kwargs) -> int:
+        return await self._client.run(lambda: self._collection.count_documents(*args, **kwargs))
+
+    async def estimated_document_count(self, **kwargs) -> int:
+        return await self._client.run(lambda: self._collection.estimated_document_count(**kwargs))
+
+
+class AsyncMemoryClient:
+    """AsyncIOMotorClient 替身：访问 MemoryClient 中的同一份数据，往返延迟在事件循环中等待（不阻塞其他请求）"""
+
+    def __init__(self, client: MemoryClient):
+        self.client = client
+
+    async def run(self, operation):
+        if self.client.latency:
+            await asyncio.sleep(self.client.latency)
+        token = _async_command.set(True)
+        try:
+            return operation()
+        finally:
+            _async_command.reset(token)
+
+    def __getitem__(self, name: str) -> 'AsyncMemoryDatabase':
+        return AsyncMemoryDatabase(self, self.client[name])
+
+    def close(self):
+        pass
+
+
+class AsyncMemoryDatabase:
+    def __init__(self, client: AsyncMemoryClient, database: MemoryDatabase):
+        self._client = client
+        self._database = database
+
+    def __getitem__(self, name: str) -> AsyncMemoryCollection:
+        return AsyncMemoryCollection(self._client, self._database[name])
@@ -0,0 +1,95 @@
+"""
+冷启动基准测试：测量从导入应用到 /health 返回第一个响应的耗时
+
+每次运行都在新的Python进程中执行，模拟无服务器环境的冷启动。
+
+用法:
+    python benchmarks/startup_benchmark.py [--runs 10] [--output result.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 在子进程中执行：导入应用并请求 /health
+PROBE_SCRIPT = """
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+response = app.app.test_client().get('/health')
+responded = time.perf_counter()
+from database import mongo_client
+print(json.dumps({
+    'import_s': imported - started,
+    'first_response_s': responded - started,
+    'status_code': response.status_code,
+    'mongo_client_created': mongo_client._client is not None
+}))
+"""
+
+
+def run_probe() -> dict:
+    """在新进程中执行一次冷启动测量"""
+    env = dict(os.environ, PYTHONPATH=ROOT_DIR)
+    # 测量过程不应连接数据库，未配置时使用一个不可达的地址
+    env.setdefault('MONGODB_URI', 'mongodb://127.0.0.1:1')
+    env.setdefault('MONGODB_DB_NAME', 'startup_benchmark')
+    # 不启动后台维护线程（线程启动后会访问数据库）
+    env.setdefault('INGEST_SWEEP_INTERVAL', '0')
+
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, '-c', PROBE_SCRIPT],
+        cwd=ROOT_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result['process_s'] = time.perf_counter() - started
+    return result
+
+
+def summarize(values: list) -> dict:
+    ordered = sorted(values)
+    return {
+        'min': ordered[0],
+        'median': statistics.median(ordered),
+        'p95': ordered[min(len(ordered) - 1, int(round(len(ordered) * 0.95)) - 1)],
+        'max': ordered[-1]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='应用冷启动基准测试')
+    parser.add_argument('--runs', type=int, default=10, help='测量次数')
+    parser.add_argument('--output', help='将结果写入JSON文件')
+    args = parser.parse_args()
+
+    results = [run_probe() for _ in range(args.runs)]
+    report = {
+        'runs': args.runs,
+        'python': sys.version.split()[0],
+        'import_s': summarize([r['import_s'] for r in results]),
+        'first_response_s': summarize([r['first_response_s'] for r in results]),
+        'process_s': summarize([r['process_s'] for r in results]),
+        'health_status_codes': sorted({r['status_code'] for r in results}),
+        'mongo_client_created': any(r['mongo_client_created'] for r in results)
+    }
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,70 @@
+"""
+异步 MongoDB 客户端（ASGI 服务模式的读取接口使用）
+
+使用 Motor，连接参数与同步客户端相同；Motor 为可选依赖（见 requirements-asgi.txt），首次调用时才导入。
+客户端绑定到首次使用它的事件循环，每个 ASGI 工作进程只有一个事件循环。
+"""
+import os
+import logging
+import threading
+import certifi
+from pymongo.server_api import ServerApi
+from database.mongo_client import (
+    CONFIG_ERROR_MESSAGE, DEFAULT_MAX_POOL_SIZE, DEFAULT_MIN_POOL_SIZE, DEFAULT_MAX_IDLE_TIME_MS, _get_int_env
+)
+from utils.metrics import command_listener
+
+logger = logging.getLogger(__name__)
+
+_async_client = None
+_async_client_lock = threading.Lock()
+
+
+def get_async_client():
+    """获取进程内共享的异步MongoDB客户端，首次调用时才创建"""
+    global _async_client
+    if _async_client is not None:
+        return _async_client
+
+    with _async_client_lock:
+        if _async_client is not None:
+            return _async_client
+
+        mongodb_uri = os.getenv('MONGODB_URI')
+        if not mongodb_uri or not os.getenv('MONGODB_DB_NAME'):
+            logger.error(CONFIG_ERROR_MESSAGE)
+            raise RuntimeError('缺少必要的环境变量配置: MONGODB_URI / MONGODB_DB_NAME')
+
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        logger.info("Creating async MongoDB client...")
+        _async_client = AsyncIOMotorClient(
+            mongodb_uri,
+            server_api=ServerApi('1'),
+            tlsCAFile=certifi.where(),
+            serverSelectionTimeoutMS=30000,
+            connectTimeoutMS=20000,
+            socketTimeoutMS=20000,
+            maxPoolSize=_get_int_env('MONGODB_MAX_POOL_SIZE', DEFAULT_MAX_POOL_SIZE),
+            minPoolSize=_get_int_env('MONGODB_MIN_POOL_SIZE', DEFAULT_MIN_POOL_SIZE),
+            maxIdleTimeMS=_get_int_env('MONGODB_MAX_IDLE_TIME_MS', DEFAULT_MAX_IDLE_TIME_MS),
+            retryWrites=True,
+            retryReads=True,
+            # 与同步客户端共用命令监听器（/metrics）
+            event_listeners=[command_listener]
+        )
+        return _async_client
+
+
+def get_async_collection(name: str):
+    """获取异步集合对象"""
+    return get_async_client()[os.getenv('MONGODB_DB_NAME')][name]
+
+
+def close_async_client():
+    """关闭异步客户端（ASGI 服务停止时调用）"""
+    global _async_client
+    with _async_client_lock:
+        if _async_client is not None:
+            _async_client.close()
+            _async_client = None
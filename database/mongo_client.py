@@ -1,10 +1,14 @@
 from pymongo import MongoClient
+from pymongo.collection import Collection
+from pymongo.database import Database
+import gridfs
 from dotenv import load_dotenv
 import os
-import sys
 import certifi
 import logging
+import threading
 from pymongo.server_api import ServerApi
+from utils.metrics import command_listener
 
 # 配置日志
 logging.basicConfig(level=logging.DEBUG)
@@ -15,61 +19,164 @@ if os.getenv('VERCEL_ENV') is None:
     load_dotenv()
     logger.info("Local environment detected, loading .env file")
 
-# MongoDB连接配置
-MONGODB_URI = os.getenv('MONGODB_URI')
-DB_NAME = os.getenv('MONGODB_DB_NAME')
+# 连接池默认配置
+DEFAULT_MAX_POOL_SIZE = 100
+DEFAULT_MIN_POOL_SIZE = 0
+DEFAULT_MAX_IDLE_TIME_MS = 60000
 
-if not MONGODB_URI or not DB_NAME:
-    error_message = """
+CONFIG_ERROR_MESSAGE = """
     错误: 缺少必要的环境变量配置
-    
+
     请确保以下环境变量已正确设置:
     - MONGODB_URI: MongoDB连接字符串
     - MONGODB_DB_NAME: 数据库名称
-    
+
     本地开发：请在.env文件中设置这些变量
     Vercel部署：请在Vercel项目设置的Environment Variables中配置这些变量
     """
-    logger.error(error_message)
-    sys.exit(1)
-
-try:
-    logger.info("Attempting to connect to MongoDB...")
-    # 创建MongoDB客户端，使用最新的稳定API版本
-    client = MongoClient(
-        MONGODB_URI,
-        server_api=ServerApi('1'),
-        tlsCAFile=certifi.where(),
-        serverSelectionTimeoutMS=30000,
-        connectTimeoutMS=20000,
-        socketTimeoutMS=20000,
-        retryWrites=True,
-        retryReads=True
-    )
-    
-    # 测试连接
-    client.admin.command('ping')
-    logger.info("Successfully connected to MongoDB Atlas!")
-    
-    # 获取数据库实例
-    db = client[DB_NAME]
-    
-    # 集合定义
-    documents = db.documents
-    document_sections = db.document_sections
-    document_contents = db.document_contents
-    content_relationships = db.content_relationships
-
-    # 创建索引
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def _get_int_env(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        logger.warning(f"Invalid {name} value, using default: {default}")
+        return default
+
+
+def get_client() -> MongoClient:
+    """获取进程内共享的MongoDB客户端，首次调用时才创建
+
+    模块导入时不建立连接，冷启动和不访问数据库的接口（如 /health）无需等待网络往返。
+    """
+    global _client
+    if _client is not None:
+        return _client
+
+    with _client_lock:
+        if _client is not None:
+            return _client
+
+        mongodb_uri = os.getenv('MONGODB_URI')
+        if not mongodb_uri or not os.getenv('MONGODB_DB_NAME'):
+            logger.error(CONFIG_ERROR_MESSAGE)
+            raise RuntimeError('缺少必要的环境变量配置: MONGODB_URI / MONGODB_DB_NAME')
+
+        logger.info("Creating MongoDB client...")
+        # 创建MongoDB客户端，使用最新的稳定API版本；连接在首次操作时建立
+        _client = MongoClient(
+            mongodb_uri,
+            server_api=ServerApi('1'),
+            tlsCAFile=certifi.where(),
+            serverSelectionTimeoutMS=30000,
+            connectTimeoutMS=20000,
+            socketTimeoutMS=20000,
+            maxPoolSize=_get_int_env('MONGODB_MAX_POOL_SIZE', DEFAULT_MAX_POOL_SIZE),
+            minPoolSize=_get_int_env('MONGODB_MIN_POOL_SIZE', DEFAULT_MIN_POOL_SIZE),
+            maxIdleTimeMS=_get_int_env('MONGODB_MAX_IDLE_TIME_MS', DEFAULT_MAX_IDLE_TIME_MS),
+            retryWrites=True,
+            retryReads=True,
+            # 统计各命令的次数和往返耗时（/metrics）
+            event_listeners=[command_listener]
+        )
+        return _client
+
+
+def get_db() -> Database:
+    """获取数据库实例"""
+    return get_client()[os.getenv('MONGODB_DB_NAME')]
+
+
+class LazyCollection:
+    """集合代理，首次访问集合方法时才创建客户端"""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def get(self) -> Collection:
+        return get_db()[self.name]
+
+    def __getattr__(self, attr):
+        return getattr(self.get(), attr)
+
+    def __repr__(self) -> str:
+        return f"LazyCollection({self.name!r})"
+
+
+class LazyGridFS:
+    """GridFS代理，首次使用时才创建"""
+
+    def __init__(self, collection: str):
+        self.collection = collection
+        self._fs = None
+
+    def get_fs(self) -> gridfs.GridFS:
+        if self._fs is None:
+            self._fs = gridfs.GridFS(get_db(), collection=self.collection)
+        return self._fs
+
+    def __getattr__(self, attr):
+        return getattr(self.get_fs(), attr)
+
+
+# 集合定义
+documents = LazyCollection('documents')
+document_sections = LazyCollection('document_sections')
+document_contents = LazyCollection('document_contents')
+content_relationships = LazyCollection('content_relationships')
+# 全文检索倒排索引：每个词项在每个内容块中的一条记录，以及词项的文档频率
+search_postings = LazyCollection('search_postings')
+search_terms = LazyCollection('search_terms')
+# 内容块的向量（float32二进制），用于相似内容检索
+content_embeddings = LazyCollection('content_embeddings')
+# 文档大纲：每个文档一条记录（_id 为文档ID），保存入库时生成的章节树
+document_outlines = LazyCollection('document_outlines')
+# 文档的历史版本：各版本的文件信息，以及被新版本替换或删除的章节、内容块
+document_versions = LazyCollection('document_versions')
+document_section_versions = LazyCollection('document_section_versions')
+document_content_versions = LazyCollection('document_content_versions')
+# 增量维护的统计计数器
+system_stats = LazyCollection('system_stats')
+# 异步处理队列中待解析文件的原始内容
+document_files = LazyGridFS('document_files')
+
+
+def ping():
+    """测试数据库连接"""
+    get_client().admin.command('ping')
+
+
+def ensure_indexes():
+    """创建所有索引（部署时执行一次：python manage.py create-indexes）"""
     documents.create_index("status")
+    # 文档列表：等值过滤字段 + 排序字段 (upload_time, _id)，按索引顺序分页读取，不需要内存排序；
+    # (status, upload_time, _id) 同时用于处理队列按上传时间领取任务
+    documents.create_index([("upload_time", -1), ("_id", -1)])
+    documents.create_index([("status", 1), ("upload_time", -1), ("_id", -1)])
+    documents.create_index([("file_type", 1), ("upload_time", -1), ("_id", -1)])
+    documents.create_index([("status", 1), ("file_type", 1), ("upload_time", -1), ("_id", -1)])
+    documents.create_index("filename")
+    # 入库运行清理：只有处理失败、等待清理的运行带有 expires_at
+    documents.create_index("ingest_run.expires_at", sparse=True)
+    # 内容哈希唯一，用于重复上传检测（出错的文档会移除该字段）
+    documents.create_index("content_hash", unique=True, sparse=True)
     document_sections.create_index([("document_id", 1), ("order", 1)])
     document_sections.create_index("parent_id")
     document_sections.create_index("section_number")
     document_contents.create_index([("document_id", 1), ("section_id", 1), ("order", 1)])
+    document_contents.create_index([("document_id", 1), ("order", 1), ("_id", 1)])
     document_contents.create_index("content_type")
     content_relationships.create_index("source_id")
     content_relationships.create_index("target_id")
-    
-except Exception as e:
-    logger.error(f"MongoDB connection error: {str(e)}", exc_info=True)
-    sys.exit(1) 
\ No newline at end of file
+    search_postings.create_index([("term", 1), ("tf", -1)])
+    search_postings.create_index("document_id")
+    content_embeddings.create_index("model")
+    content_embeddings.create_index("document_id")
+    content_relationships.create_index("relationship_type")
+    document_versions.create_index([("document_id", 1), ("version", 1)])
+    document_section_versions.create_index([("document_id", 1), ("superseded_version", 1)])
+    document_content_versions.create_index([("document_id", 1), ("superseded_version", 1)])
+    logger.info("MongoDB indexes are up to date")
\ No newline at end of file
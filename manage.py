@@ -0,0 +1,184 @@
+"""
+运维命令行工具
+
+用法:
+    python manage.py create-indexes
+    python manage.py worker [--poll-interval 2] [--once]
+    python manage.py sweep
+    python manage.py rebuild-stats
+    python manage.py build-embeddings
+    python manage.py similar-links [--k 5] [--min-score 0.3]
+    python manage.py batch-upload PATH [PATH ...] [--workers 8] [--threads] [--output manifest.json]
+    python manage.py export OUTPUT [--format ndjson|columnar] [--document-id ID ...] [--file-type pdf] [--batch-size 1000]
+"""
+import argparse
+import json
+import logging
+import os
+from datetime import datetime
+from dotenv import load_dotenv
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# 仅在非生产环境加载.env文件
+if os.getenv('VERCEL_ENV') is None:
+    load_dotenv()
+
+
+def create_indexes_command(args: argparse.Namespace):
+    """创建数据库索引（部署或升级时执行一次）"""
+    from database.mongo_client import ensure_indexes, ping
+    ping()
+    ensure_indexes()
+
+
+def run_worker_command(args: argparse.Namespace):
+    """启动独立的文档处理worker"""
+    from utils.ingest_queue import run_worker
+    run_worker(poll_interval=args.poll_interval, once=args.once)
+
+
+def sweep_command(args: argparse.Namespace):
+    """清理中断和失败的入库运行（可由定时任务执行），逐批执行直到没有需要清理的文档"""
+    from utils.ingest_runs import sweep
+    result = {'released': 0, 'abandoned': 0, 'collected': 0}
+    while True:
+        batch = sweep()
+        if not any(batch.values()):
+            break
+        for key, count in batch.items():
+            result[key] += count
+    logger.info(f"Ingest sweep finished: {result['released']} jobs released, {result['abandoned']} runs abandoned, "
+                f"{result['collected']} runs collected")
+
+
+def rebuild_stats_command(args: argparse.Namespace):
+    """按现有数据重建文档统计计数器"""
+    from utils.document_stats import rebuild_stats
+    counters = rebuild_stats()
+    logger.info(f"Document stats rebuilt: {counters['total_documents']} documents, "
+                f"{counters['total_sections']} sections, {counters['total_contents']} contents")
+
+
+def build_embeddings_command(args: argparse.Namespace):
+    """为还没有向量的内容块补算向量（启用向量化之前上传的文档或更换模型之后）"""
+    from utils.vector_index import backfill_embeddings
+    added = backfill_embeddings()
+    logger.info(f"Embeddings built for {added} contents")
+
+
+def similar_links_command(args: argparse.Namespace):
+    """重建内容块之间的相似关系"""
+    from utils.vector_index import build_similarity_links
+    created = build_similarity_links(k=args.k, min_score=args.min_score)
+    logger.info(f"Similarity links rebuilt: {created} relationships")
+
+
+def batch_upload_command(args: argparse.Namespace):
+    """批量处理本地文件、目录（递归）和 zip 压缩包，输出逐文件结果清单"""
+    from utils.batch_ingest import ingest_batch, iter_path_files
+    # 默认使用进程池以利用多核解析文档
+    use_processes = not args.threads
+    summary = ingest_batch(
+        iter_path_files(args.paths, extract_archives=use_processes),
+        max_workers=args.workers,
+        mode='process' if use_processes else 'thread'
+    )
+    manifest = json.dumps(summary, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(manifest)
+        logger.info(f"Batch manifest written to {args.output}")
+    else:
+        print(manifest)
+
+
+def export_command(args: argparse.Namespace):
+    """将处理完成的文档批量导出为 gzip 压缩文件"""
+    from utils.document_export import build_export_filter, export_documents
+    from utils.extractors import normalize_file_type
+    query = build_export_filter(
+        document_ids=args.document_id,
+        file_type=normalize_file_type(args.file_type) if args.file_type else None,
+        uploaded_after=args.uploaded_after,
+        uploaded_before=args.uploaded_before,
+        filename_prefix=args.filename_prefix
+    )
+    written = 0
+    with open(args.output, 'wb') as f:
+        for chunk in export_documents(query, args.format, args.batch_size):
+            f.write(chunk)
+            written += len(chunk)
+    logger.info(f"Export written to {args.output} ({written} bytes)")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='文档处理服务运维工具')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    indexes_parser = subparsers.add_parser('create-indexes', help='创建数据库索引')
+    indexes_parser.set_defaults(func=create_indexes_command)
+
+    worker_parser = subparsers.add_parser('worker', help='领取并处理异步上传的文档')
+    worker_parser.add_argument('--poll-interval', type=float, default=2.0,
+                               help='队列为空时的轮询间隔（秒）')
+    worker_parser.add_argument('--once', action='store_true',
+                               help='处理完当前队列后退出')
+    worker_parser.set_defaults(func=run_worker_command)
+
+    sweep_parser = subparsers.add_parser('sweep', help='恢复领取超时的任务，标记心跳超时的入库运行，删除失败运行写入的记录')
+    sweep_parser.set_defaults(func=sweep_command)
+
+    stats_parser = subparsers.add_parser('rebuild-stats', help='按现有数据重建统计计数器')
+    stats_parser.set_defaults(func=rebuild_stats_command)
+
+    embeddings_parser = subparsers.add_parser('build-embeddings', help='为缺少向量的内容块计算向量')
+    embeddings_parser.set_defaults(func=build_embeddings_command)
+
+    similar_parser = subparsers.add_parser('similar-links', help='重建内容块之间的相似关系')
+    similar_parser.add_argument('--k', type=int, default=5,
+                                help='每个内容块保留的相似内容块数量')
+    similar_parser.add_argument('--min-score', type=float, default=0.0,
+                                help='相似度下限（余弦相似度）')
+    similar_parser.set_defaults(func=similar_links_command)
+
+    batch_parser = subparsers.add_parser('batch-upload', help='批量处理本地文件、目录和 zip 压缩包')
+    batch_parser.add_argument('paths', nargs='+',
+                              help='文件、目录或 zip 压缩包路径')
+    batch_parser.add_argument('--workers', type=int, default=None,
+                              help='并发数（默认为 BATCH_MAX_WORKERS 或CPU核数）')
+    batch_parser.add_argument('--threads', action='store_true',
+                              help='使用线程池而不是进程池')
+    batch_parser.add_argument('--output',
+                              help='结果清单的输出文件（默认输出到标准输出）')
+    batch_parser.set_defaults(func=batch_upload_command)
+
+    export_parser = subparsers.add_parser('export', help='批量导出处理完成的文档（gzip 压缩）')
+    export_parser.add_argument('output',
+                               help='输出文件路径')
+    export_parser.add_argument('--format', choices=('ndjson', 'columnar'), default='ndjson',
+                               help='导出格式：ndjson（逐条记录）或 columnar（按列组织的行组）')
+    export_parser.add_argument('--document-id', action='append',
+                               help='只导出指定文档（可重复）')
+    export_parser.add_argument('--file-type',
+                               help='按文件类型过滤：MIME 类型或扩展名（如 pdf）')
+    export_parser.add_argument('--uploaded-after', type=datetime.fromisoformat,
+                               help='只导出该时间及之后上传的文档（ISO 8601，不带时区时为UTC）')
+    export_parser.add_argument('--uploaded-before', type=datetime.fromisoformat,
+                               help='只导出该时间之前上传的文档（ISO 8601，不带时区时为UTC）')
+    export_parser.add_argument('--filename-prefix',
+                               help='按文件名前缀过滤（区分大小写）')
+    export_parser.add_argument('--batch-size', type=int, default=None,
+                               help='数据库游标每批读取的记录数（默认为 EXPORT_BATCH_SIZE）')
+    export_parser.set_defaults(func=export_command)
+
+    return parser
+
+
+if __name__ == '__main__':
+    args = build_parser().parse_args()
+    args.func(args)
\ No newline at end of file
@@ -1,5 +1,6 @@
 from flask_restx import Namespace, Resource, fields
-from database.mongo_client import documents, document_sections, document_contents
+from utils.document_cache import get_document_cache
+from utils.document_stats import get_stats
 
 api_ns = Namespace('system', description='系统相关接口')
 
@@ -12,7 +13,23 @@ status_model = api_ns.model('Status', {
 stats_model = api_ns.model('Stats', {
     'total_documents': fields.Integer(description='文档总数'),
     'total_sections': fields.Integer(description='章节总数'),
-    'total_contents': fields.Integer(description='内容块总数')
+    'total_contents': fields.Integer(description='内容块总数'),
+    'documents_by_status': fields.Raw(description='各处理状态的文档数'),
+    'contents_by_type': fields.Raw(description='各类型的内容块数'),
+    'bytes_ingested': fields.Integer(description='已上传文件的总字节数'),
+    'updated_at': fields.DateTime(description='计数器最后更新时间'),
+    'source': fields.String(description='数据来源：counters（增量计数器）或 estimated（集合元数据估算）')
+})
+
+cache_stats_model = api_ns.model('CacheStats', {
+    'hits': fields.Integer(description='命中次数'),
+    'misses': fields.Integer(description='未命中次数'),
+    'invalidations': fields.Integer(description='因文档版本变化而失效的次数'),
+    'hit_rate': fields.Float(description='命中率'),
+    'entries': fields.Integer(description='缓存条目数'),
+    'size_bytes': fields.Integer(description='估算占用字节数'),
+    'max_bytes': fields.Integer(description='容量上限（字节）'),
+    'evictions': fields.Integer(description='淘汰次数')
 })
 
 @api_ns.route('/status')
@@ -35,13 +52,15 @@ class DocumentStats(Resource):
                 responses={200: '成功获取统计信息'})
     @api_ns.marshal_with(stats_model)
     def get(self):
-        """获取文档统计信息"""
-        total_documents = documents.count_documents({})
-        total_sections = document_sections.count_documents({})
-        total_contents = document_contents.count_documents({})
-        
-        return {
-            'total_documents': total_documents,
-            'total_sections': total_sections,
-            'total_contents': total_contents
-        } 
\ No newline at end of file
+        """获取文档统计信息（读取增量维护的计数器，不扫描集合）"""
+        return get_stats()
+
+@api_ns.route('/cache/stats')
+class CacheStats(Resource):
+    @api_ns.doc('get_cache_stats',
+                description='获取文档缓存的命中统计',
+                responses={200: '成功获取缓存统计'})
+    @api_ns.marshal_with(cache_stats_model)
+    def get(self):
+        """获取文档缓存统计信息"""
+        return get_document_cache().stats()
\ No newline at end of file
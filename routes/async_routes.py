@@ -0,0 +1,242 @@
+"""
+ASGI 服务模式的异步读取接口
+
+GET /api/documents/<document_id> 和 GET /api/system/documents/stats 由异步处理函数直接处理，
+通过异步 MongoDB 客户端读取，等待数据库时不占用工作线程；章节和大纲的查询并发执行。
+路由匹配、请求参数解析和响应模型与 Flask 应用中的同名接口相同（共用 url_map、请求解析器和 marshal 模型）。
+
+处理函数返回 None 时交给 Flask 应用处理（在 ASGI_WSGI_THREADS 个线程中并发执行），包括：
+参数错误和文档不存在（返回与同步模式相同的错误响应）、NDJSON 流式输出、按章节读取，
+以及携带 X-Profile 的请求。其余接口全部由 Flask 应用处理。
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from asgiref.sync import SyncToAsync
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from flask import Flask, request
+from flask_restx import marshal
+from werkzeug.exceptions import HTTPException
+
+from database.async_mongo_client import get_async_collection, close_async_client
+from database.mongo_client import documents, document_sections, document_contents, document_outlines
+from models.document_models import DocumentStatus
+from routes.document_routes import (
+    document_parser, make_cache_variant, cache_headers, render_document
+)
+from routes.api_routes import stats_model
+from utils.document_cache import get_document_cache, document_version, make_etag
+from utils.document_query import (
+    InvalidCursorError, CONTENT_SORT, ContentReadPlan, build_content_projection, clamp_page_size
+)
+from utils.document_outline import outline_positions, section_positions, reading_order
+from utils.document_stats import get_stats_async
+from utils.metrics import http_request_seconds
+
+logger = logging.getLogger(__name__)
+
+# 执行 Flask 应用（上传等同步接口）的线程数
+DEFAULT_ASGI_WSGI_THREADS = 32
+
+Headers = Dict[str, str]
+
+
+def get_wsgi_threads() -> int:
+    """读取执行同步接口的线程数配置"""
+    try:
+        return max(1, int(os.getenv('ASGI_WSGI_THREADS', DEFAULT_ASGI_WSGI_THREADS)))
+    except (TypeError, ValueError):
+        logger.warning(f"Invalid ASGI_WSGI_THREADS value, using default: {DEFAULT_ASGI_WSGI_THREADS}")
+        return DEFAULT_ASGI_WSGI_THREADS
+
+
+def _create_wsgi_bridge(flask_app: Flask, executor: ThreadPoolExecutor) -> WsgiToAsgi:
+    """将 Flask 应用包装为 ASGI 应用，各请求在线程池中并发执行"""
+
+    class _Instance(WsgiToAsgiInstance):
+        # asgiref 默认在同一个线程中依次执行 WSGI 应用，同步接口之间会互相阻塞
+        run_wsgi_app = SyncToAsync(WsgiToAsgiInstance.__dict__['run_wsgi_app'].func, thread_sensitive=False, executor=executor)
+
+    class _Bridge(WsgiToAsgi):
+        async def __call__(self, scope, receive, send):
+            await _Instance(self.wsgi_application)(scope, receive, send)
+
+    return _Bridge(flask_app)
+
+
+class AsyncResponse:
+    """异步处理函数的响应"""
+
+    def __init__(self, status: int, body: Any = None, headers: Optional[Headers] = None):
+        self.status = status
+        self.headers = dict(headers or {})
+        if body is None:
+            self.body = b''
+        else:
+            # 与 flask-restx 的 JSON 输出格式一致
+            self.body = (json.dumps(body) + '\n').encode('utf-8')
+            self.headers['Content-Type'] = 'application/json'
+
+    async def send(self, send: Callable[[Dict[str, Any]], Awaitable[None]]):
+        headers = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in self.headers.items()]
+        headers.append((b'content-length', str(len(self.body)).encode('latin-1')))
+        await send({'type': 'http.response.start', 'status': self.status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': self.body})
+
+
+async def _none():
+    return None
+
+
+async def get_document(flask_app: Flask, scope: Dict[str, Any], document_id: str) -> Optional[AsyncResponse]:
+    """获取文档信息和内容（与 Document.get 相同的缓存协商和分页）"""
+    with request_context(flask_app, scope):
+        try:
+            args = document_parser.parse_args()
+        except HTTPException:
+            return None
+        if_none_match = request.if_none_match
+    if args['format'] != 'json' or args['section_id'] or args['section_number']:
+        return None
+
+    doc = await get_async_collection(documents.name).find_one({'_id': document_id})
+    if not doc:
+        return None
+
+    # 处理完成的文档内容不再变化，通过ETag协商和读穿透缓存避免重复查询章节和内容
+    is_cacheable = doc.get('status') == DocumentStatus.PROCESSED.value
+    cache = get_document_cache()
+    variant = make_cache_variant(args)
+    headers = {}
+    if is_cacheable:
+        version = document_version(doc)
+        etag = make_etag(document_id, version, variant)
+        headers = cache_headers(etag)
+        if if_none_match.contains(etag):
+            return AsyncResponse(304, headers=headers)
+        cached = cache.get(document_id, variant, version)
+        if cached is not None:
+            return AsyncResponse(200, cached, headers)
+
+    # 后续分页只返回内容块；章节和大纲的查询并发执行，之后按阅读顺序读取内容块
+    section_collection = get_async_collection(document_sections.name)
+    outline_query = get_async_collection(document_outlines.name).find_one({'_id': document_id}) \
+        if is_cacheable else _none()
+    if args['cursor']:
+        sections, outline = [], await outline_query
+    else:
+        sections, outline = await asyncio.gather(
+            section_collection.find({'document_id': document_id}).to_list(None), outline_query)
+        sections = reading_order(sections)
+    if outline is not None:
+        positions = outline_positions(outline)
+    else:
+        # 没有大纲（或文档未处理完成）时按章节记录排列阅读顺序
+        positions = section_positions(sections or await section_collection.find(
+            {'document_id': document_id}, {'parent_id': 1, 'order': 1}).to_list(None))
+
+    # 多取一条用于判断是否还有下一页
+    limit = clamp_page_size(args['limit'])
+    try:
+        plan = ContentReadPlan(document_id, positions, args['cursor'], limit + 1 if limit else None,
+                               include_tables=args['include_tables'])
+    except InvalidCursorError:
+        return None
+    contents_collection = get_async_collection(document_contents.name)
+    projection = build_content_projection(args['omit_table_rows'])
+    contents = []
+    while (query := plan.next_query()) is not None:
+        contents.extend(plan.accept(
+            await contents_collection.find(query.filter, projection).sort(CONTENT_SORT).limit(query.limit).to_list(None)))
+
+    payload = render_document(doc, sections, contents, limit)
+    if is_cacheable:
+        cache.set(document_id, variant, version, payload)
+    return AsyncResponse(200, payload, headers)
+
+
+async def get_document_stats(flask_app: Flask, scope: Dict[str, Any]) -> Optional[AsyncResponse]:
+    """获取文档统计信息"""
+    return AsyncResponse(200, marshal(await get_stats_async(), stats_model))
+
+
+# 由异步处理函数处理的路由（Flask url_map 中的规则 -> 处理函数）
+ASYNC_ROUTES = {
+    '/api/documents/<string:document_id>': get_document,
+    '/api/system/documents/stats': get_document_stats
+}
+
+
+def request_context(flask_app: Flask, scope: Dict[str, Any]):
+    """根据 ASGI 请求构造 Flask 请求上下文，用于复用请求解析器（不执行 Flask 的请求钩子）"""
+    return flask_app.test_request_context(
+        path=scope['path'],
+        query_string=scope.get('query_string', b'').decode('latin-1'),
+        headers=[(name.decode('latin-1'), value.decode('latin-1')) for name, value in scope.get('headers', [])]
+    )
+
+
+class AsgiApp:
+    """ASGI 应用：读取接口由异步处理函数处理，其余请求交给 Flask 应用"""
+
+    def __init__(self, flask_app: Flask):
+        self.flask_app = flask_app
+        self._executor = ThreadPoolExecutor(max_workers=get_wsgi_threads(), thread_name_prefix='wsgi')
+        self.wsgi_app = _create_wsgi_bridge(flask_app, self._executor)
+        self._url_adapter = flask_app.url_map.bind('localhost')
+
+    def _match(self, scope: Dict[str, Any]) -> Tuple[Optional[str], Dict[str, Any]]:
+        if scope['type'] != 'http' or scope['method'] != 'GET':
+            return None, {}
+        if any(name.lower() == b'x-profile' for name, _ in scope.get('headers', [])):
+            # 分阶段耗时分析由 Flask 的请求钩子完成
+            return None, {}
+        try:
+            rule, args = self._url_adapter.match(scope['path'], method='GET', return_rule=True)
+        except HTTPException:
+            return None, {}
+        return (rule.rule, args) if rule.rule in ASYNC_ROUTES else (None, {})
+
+    async def __call__(self, scope: Dict[str, Any], receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+
+        rule, args = self._match(scope)
+        if rule is not None:
+            started = time.perf_counter()
+            response = await ASYNC_ROUTES[rule](self.flask_app, scope, **args)
+            if response is not None:
+                self._add_cors_headers(scope, response)
+                await response.send(send)
+                http_request_seconds.observe(time.perf_counter() - started, method='GET', endpoint=rule,
+                                             status=response.status)
+                return
+        await self.wsgi_app(scope, receive, send)
+
+    @staticmethod
+    def _add_cors_headers(scope: Dict[str, Any], response: AsyncResponse):
+        """与 Flask 应用的 CORS 配置一致（允许任意来源）"""
+        if any(name.lower() == b'origin' for name, _ in scope.get('headers', [])):
+            response.headers['Access-Control-Allow-Origin'] = '*'
+            response.headers['Access-Control-Expose-Headers'] = 'ETag, Server-Timing'
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                close_async_client()
+                self._executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+def create_asgi_app(flask_app: Flask) -> AsgiApp:
+    return AsgiApp(flask_app)
@@ -1,10 +1,33 @@
-from flask import request, send_file, current_app
-from flask_restx import Namespace, Resource, fields
+from flask import request, send_file, current_app, Response, stream_with_context
+from flask_restx import Namespace, Resource, fields, inputs, marshal
 from werkzeug.datastructures import FileStorage
 from werkzeug.utils import secure_filename
 import os
+import json
+import itertools
 from utils.document_processor import DocumentProcessor
+from utils.document_outline import get_outline, content_positions, reading_order
+from utils.document_versions import DocumentUpdateConflict, update_document, list_versions, get_document_version
+from utils.document_query import (
+    InvalidCursorError, SECTION_SORT, DOCUMENT_LIST_SORT, DOCUMENT_LIST_PROJECTION, DEFAULT_LIST_PAGE_SIZE,
+    ContentReadPlan, iter_contents, build_content_projection, build_document_filter,
+    clamp_page_size, encode_cursor, encode_list_cursor
+)
+from utils.ingest_queue import RetryConflict, submit_document, retry_document, get_worker_mode
+from utils.batch_ingest import (
+    BatchFile, InvalidArchiveError, ingest_batch, submit_batch, iter_archive_files, is_supported_file,
+    spool_to_temp_file, get_batch_max_files, get_batch_max_uncompressed_bytes
+)
+from utils.document_cache import get_document_cache, document_version, make_etag
+from utils.search_index import search
+from utils.content_codec import decode_content
+from utils.document_export import (
+    EXPORT_FORMATS, EXPORT_FILE_EXTENSIONS, MAX_EXPORT_BATCH_SIZE, build_export_filter, export_documents
+)
+from utils.extractors import FILE_TYPE_MAP, normalize_file_type
+from utils.metrics import timed
 from database.mongo_client import documents, document_sections, document_contents
+from models.document_models import DocumentStatus
 
 document_ns = Namespace('documents', description='文档处理相关接口')
 
@@ -14,7 +37,8 @@ document_model = document_ns.model('Document', {
     'filename': fields.String(description='文件名'),
     'file_type': fields.String(description='文件类型'),
     'upload_time': fields.DateTime(description='上传时间'),
-    'status': fields.String(description='处理状态')
+    'status': fields.String(description='处理状态'),
+    'version': fields.Integer(description='版本号', default=1)
 })
 
 section_model = document_ns.model('DocumentSection', {
@@ -33,22 +57,150 @@ content_model = document_ns.model('DocumentContent', {
     'section_id': fields.String(description='章节ID'),
     'content_type': fields.String(description='内容类型'),
     'content': fields.Raw(description='内容数据'),
-    'order': fields.Integer(description='排序')
+    'order': fields.Integer(description='排序'),
+    'page': fields.Integer(description='所在页码（仅PDF，从1开始）')
 })
 
 document_response = document_ns.model('DocumentResponse', {
     'document': fields.Nested(document_model),
     'sections': fields.List(fields.Nested(section_model)),
-    'contents': fields.List(fields.Nested(content_model))
+    'contents': fields.List(fields.Nested(content_model)),
+    'next_cursor': fields.String(description='下一页游标，没有更多内容时为空')
+})
+
+document_summary_model = document_ns.model('DocumentSummary', {
+    '_id': fields.String(description='文档ID'),
+    'filename': fields.String(description='文件名'),
+    'file_type': fields.String(description='文件类型'),
+    'upload_time': fields.DateTime(description='上传时间'),
+    'status': fields.String(description='处理状态'),
+    'version': fields.Integer(description='版本号', default=1),
+    'file_size': fields.Integer(description='文件大小（字节）'),
+    'last_modified': fields.DateTime(description='最后更新时间')
+})
+
+document_list_response = document_ns.model('DocumentListResponse', {
+    'documents': fields.List(fields.Nested(document_summary_model)),
+    'next_cursor': fields.String(description='下一页游标，没有更多文档时为空')
 })
 
 upload_response = document_ns.model('UploadResponse', {
     'message': fields.String(description='上传结果消息'),
-    'document_id': fields.String(description='文档ID')
+    'document_id': fields.String(description='文档ID'),
+    'status': fields.String(description='处理状态'),
+    'duplicate': fields.Boolean(description='是否与已上传的文档内容相同（返回已有文档ID）')
 })
 
-# 允许的文件类型
-ALLOWED_EXTENSIONS = {'txt', 'pdf', 'doc', 'docx'}
+batch_result_model = document_ns.model('BatchFileResult', {
+    'filename': fields.String(description='文件名'),
+    'document_id': fields.String(description='文档ID'),
+    'status': fields.String(description='处理状态（不支持的文件类型为 skipped）'),
+    'duplicate': fields.Boolean(description='是否与已上传的文档内容相同（返回已有文档ID）'),
+    'error': fields.String(description='错误信息')
+})
+
+batch_response = document_ns.model('BatchUploadResponse', {
+    'total': fields.Integer(description='文件总数'),
+    'processed': fields.Integer(description='处理成功的文件数'),
+    'queued': fields.Integer(description='已加入后台处理队列的文件数（异步处理）'),
+    'duplicates': fields.Integer(description='与已有文档内容相同的文件数'),
+    'failed': fields.Integer(description='处理失败的文件数'),
+    'skipped': fields.Integer(description='类型不支持而跳过的文件数'),
+    'elapsed_seconds': fields.Float(description='处理耗时（秒）'),
+    'results': fields.List(fields.Nested(batch_result_model), description='按上传顺序排列的逐文件结果')
+})
+
+outline_response = document_ns.model('DocumentOutline', {
+    'document_id': fields.String(description='文档ID'),
+    'version': fields.Integer(description='版本号'),
+    'section_count': fields.Integer(description='章节数'),
+    'content_count': fields.Integer(description='内容块数'),
+    'char_count': fields.Integer(description='字符数'),
+    'sections': fields.Raw(description='章节树：各节点包含 _id、title、level、section_number、'
+                                       'content_count、char_count（本章节）、total_content_count、'
+                                       'total_char_count（含子章节）和 children')
+})
+
+change_counts_model = document_ns.model('VersionChangeCounts', {
+    'inserted': fields.Integer(description='新增数'),
+    'updated': fields.Integer(description='位置变化而更新的记录数'),
+    'removed': fields.Integer(description='删除数'),
+    'unchanged': fields.Integer(description='未改写的记录数')
+})
+
+update_response = document_ns.model('DocumentUpdateResponse', {
+    'document_id': fields.String(description='文档ID'),
+    'version': fields.Integer(description='当前版本号'),
+    'previous_version': fields.Integer(description='更新前的版本号'),
+    'changed': fields.Boolean(description='是否产生了新版本（文件与当前版本相同时为 false）'),
+    'sections': fields.Nested(change_counts_model, description='章节的变更统计'),
+    'contents': fields.Nested(change_counts_model, description='内容块的变更统计')
+})
+
+version_model = document_ns.model('DocumentVersion', {
+    'version': fields.Integer(description='版本号'),
+    'filename': fields.String(description='文件名'),
+    'file_type': fields.String(description='文件类型'),
+    'file_size': fields.Integer(description='文件大小（字节）'),
+    'created_at': fields.DateTime(description='版本创建时间'),
+    'changes': fields.Raw(description='相对上一版本的变更统计（版本1为空）')
+})
+
+versions_response = document_ns.model('DocumentVersionsResponse', {
+    'document_id': fields.String(description='文档ID'),
+    'current_version': fields.Integer(description='当前版本号'),
+    'versions': fields.List(fields.Nested(version_model))
+})
+
+progress_model = document_ns.model('DocumentProgress', {
+    'pages_processed': fields.Integer(description='已处理页数'),
+    'paragraphs_processed': fields.Integer(description='已处理段落数'),
+    'tables_processed': fields.Integer(description='已处理表格数')
+})
+
+status_response = document_ns.model('DocumentStatusResponse', {
+    'document_id': fields.String(description='文档ID', attribute='_id'),
+    'status': fields.String(description='处理状态'),
+    'progress': fields.Nested(progress_model, allow_null=True),
+    'error_message': fields.String(description='错误信息'),
+    'last_modified': fields.DateTime(description='最后更新时间')
+})
+
+retry_response = document_ns.model('RetryResponse', {
+    'document_id': fields.String(description='文档ID'),
+    'status': fields.String(description='处理状态（pending）'),
+    'resume_from_page': fields.Integer(description='从检查点续传时已处理的页数（0 表示重新处理）')
+})
+
+search_hit_model = document_ns.model('SearchHit', {
+    'document_id': fields.String(description='文档ID'),
+    'filename': fields.String(description='文件名'),
+    'section_id': fields.String(description='章节ID'),
+    'section_number': fields.String(description='章节编号'),
+    'section_title': fields.String(description='章节标题'),
+    'content_id': fields.String(description='内容ID'),
+    'score': fields.Float(description='相关度得分'),
+    'snippet': fields.String(description='命中片段')
+})
+
+search_response = document_ns.model('SearchResponse', {
+    'query': fields.String(description='检索词'),
+    'hits': fields.List(fields.Nested(search_hit_model))
+})
+
+similar_request = document_ns.model('SimilarRequest', {
+    'text': fields.String(description='查询文本（与 content_id 二选一）'),
+    'content_id': fields.String(description='以该内容块为查询（结果不包含它本身）'),
+    'limit': fields.Integer(description='返回结果数量（最多100）', default=10),
+    'document_id': fields.String(description='只在指定文档中查找')
+})
+
+similar_response = document_ns.model('SimilarResponse', {
+    'hits': fields.List(fields.Nested(search_hit_model))
+})
+
+# 允许的文件类型（已注册解析器的扩展名；处理时按文件内容识别实际类型）
+ALLOWED_EXTENSIONS = {ext.lstrip('.') for ext in FILE_TYPE_MAP}
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -60,6 +212,11 @@ upload_parser.add_argument('file',
                          location='files',
                          required=True,
                          help='要上传的文档文件')
+upload_parser.add_argument('async',
+                         type=inputs.boolean,
+                         location='args',
+                         default=False,
+                         help='异步处理：保存文件后立即返回202，由后台任务解析文档')
 
 @document_ns.route('/upload')
 class DocumentUpload(Resource):
@@ -67,6 +224,7 @@ class DocumentUpload(Resource):
                     description='上传文档文件',
                     responses={
                         200: ('上传成功', upload_response),
+                        202: ('已接收，等待后台处理', upload_response),
                         400: '无效的请求或文件类型不支持'
                     })
     @document_ns.expect(upload_parser)
@@ -81,40 +239,565 @@ class DocumentUpload(Resource):
         
         if file and allowed_file(file.filename):
             filename = secure_filename(file.filename)
-            file_content = file.read()  # 直接读取文件内容到内存
+            # 以流的方式传递文件内容，较大的文件会转存到磁盘而不是整体读入内存
+            file_stream = file.stream
+
+            # 异步模式：保存原始文件后立即返回，由后台任务处理
+            if args['async']:
+                result = submit_document(filename, file_stream)
+                if result['duplicate']:
+                    return dict(result, message='文件内容与已上传的文档相同'), 200
+                return dict(result, message='文件已接收，正在后台处理'), 202
             
             # 处理文档
-            processor = DocumentProcessor(filename, file_content)  # 修改为传递文件内容而不是文件路径
+            processor = DocumentProcessor(filename, file_stream)
             doc_id = processor.process_and_save()
+
+            if processor.duplicate_of:
+                return {
+                    'message': '文件内容与已上传的文档相同',
+                    'document_id': str(doc_id),
+                    'status': processor.duplicate_of['status'],
+                    'duplicate': True
+                }, 200
             
             return {
                 'message': '文件上传成功',
-                'document_id': str(doc_id)
+                'document_id': str(doc_id),
+                'status': DocumentStatus.PROCESSED.value,
+                'duplicate': False
             }, 200
         
         return {'error': '不支持的文件类型'}, 400
 
+# 文档列表参数
+list_parser = document_ns.parser()
+list_parser.add_argument('status', type=str, location='args',
+                         choices=tuple(status.value for status in DocumentStatus),
+                         help='按处理状态过滤')
+list_parser.add_argument('file_type', type=str, location='args',
+                         help='按文件类型过滤：MIME 类型或扩展名（如 pdf）')
+list_parser.add_argument('uploaded_after', type=inputs.datetime_from_iso8601, location='args',
+                         help='只返回该时间及之后上传的文档（ISO 8601，不带时区时为UTC）')
+list_parser.add_argument('uploaded_before', type=inputs.datetime_from_iso8601, location='args',
+                         help='只返回该时间之前上传的文档（ISO 8601，不带时区时为UTC）')
+list_parser.add_argument('filename_prefix', type=str, location='args',
+                         help='按文件名前缀过滤（区分大小写）')
+list_parser.add_argument('limit', type=int, location='args', default=DEFAULT_LIST_PAGE_SIZE,
+                         help='每页文档数量')
+list_parser.add_argument('cursor', type=str, location='args',
+                         help='分页游标，取自上一页的 next_cursor')
+
+@document_ns.route('', '/')
+class DocumentList(Resource):
+    @document_ns.doc('list_documents',
+                    description='按上传时间倒序列出文档，支持按状态、文件类型、上传时间范围和文件名前缀过滤，游标分页',
+                    responses={
+                        200: ('成功获取文档列表', document_list_response),
+                        400: '无效的分页游标'
+                    })
+    @document_ns.expect(list_parser)
+    @document_ns.marshal_with(document_list_response)
+    def get(self):
+        """列出文档"""
+        args = list_parser.parse_args()
+        try:
+            query = build_document_filter(
+                status=args['status'],
+                file_type=normalize_file_type(args['file_type']) if args['file_type'] else None,
+                uploaded_after=args['uploaded_after'],
+                uploaded_before=args['uploaded_before'],
+                filename_prefix=args['filename_prefix'],
+                cursor=args['cursor']
+            )
+        except InvalidCursorError as e:
+            document_ns.abort(400, str(e))
+
+        # 多取一条用于判断是否还有下一页
+        limit = clamp_page_size(args['limit'])
+        docs = list(documents.find(query, DOCUMENT_LIST_PROJECTION).sort(DOCUMENT_LIST_SORT).limit(limit + 1))
+        next_cursor = None
+        if len(docs) > limit:
+            docs = docs[:limit]
+            next_cursor = encode_list_cursor(docs[-1])
+        return {'documents': docs, 'next_cursor': next_cursor}
+
+# 新版本上传参数
+update_parser = document_ns.parser()
+update_parser.add_argument('file',
+                           type=FileStorage,
+                           location='files',
+                           required=True,
+                           help='文档的新版本文件')
+
+# 批量上传参数
+batch_parser = document_ns.parser()
+batch_parser.add_argument('files',
+                          type=FileStorage,
+                          location='files',
+                          action='append',
+                          help='要上传的文档文件（可重复）')
+batch_parser.add_argument('archive',
+                          type=FileStorage,
+                          location='files',
+                          help='包含多个文档的 zip 压缩包')
+batch_parser.add_argument('async',
+                          type=inputs.boolean,
+                          location='args',
+                          default=False,
+                          help='异步处理：保存文件后立即返回，由后台任务解析文档')
+
+@document_ns.route('/batch')
+class DocumentBatchUpload(Resource):
+    @document_ns.doc('batch_upload_documents',
+                    description='批量上传多个文档文件或一个 zip 压缩包，并发处理并返回逐文件结果',
+                    responses={
+                        200: ('处理完成', batch_response),
+                        400: '没有文件、文件数超过上限或压缩包无效'
+                    })
+    @document_ns.expect(batch_parser)
+    @document_ns.marshal_with(batch_response, code=200)
+    def post(self):
+        """批量上传文档"""
+        args = batch_parser.parse_args()
+        uploads = [file for file in args['files'] or [] if file.filename]
+        archive = args['archive']
+        if not uploads and not (archive and archive.filename):
+            document_ns.abort(400, '没有选择文件')
+
+        max_files = get_batch_max_files()
+        if len(uploads) > max_files:
+            document_ns.abort(400, f'文件数超过上限 {max_files}')
+
+        # 进程池方式下文件内容需要先写入临时文件，才能传给其他进程
+        use_processes = get_worker_mode() == 'process' and not args['async']
+        batch_files = []
+        for file in uploads:
+            filename = secure_filename(file.filename)
+            if use_processes and is_supported_file(filename):
+                batch_files.append(spool_to_temp_file(filename, file.stream))
+            else:
+                batch_files.append(BatchFile(filename, content=file.stream))
+
+        files = iter(batch_files)
+        if archive and archive.filename:
+            try:
+                files = itertools.chain(batch_files, iter_archive_files(
+                    archive.stream,
+                    extract=use_processes,
+                    max_files=max_files - len(batch_files),
+                    max_uncompressed_bytes=get_batch_max_uncompressed_bytes()
+                ))
+            except InvalidArchiveError as e:
+                document_ns.abort(400, str(e))
+
+        if args['async']:
+            return submit_batch(files), 200
+        return ingest_batch(files, mode='process' if use_processes else 'thread'), 200
+
+# 文档读取参数
+document_parser = document_ns.parser()
+document_parser.add_argument('limit', type=int, location='args',
+                             help='每页内容块数量（不传则返回全部内容）')
+document_parser.add_argument('cursor', type=str, location='args',
+                             help='分页游标，取自上一页的 next_cursor')
+document_parser.add_argument('section_id', type=str, location='args',
+                             help='只返回该章节及其子章节的内容')
+document_parser.add_argument('section_number', type=str, location='args',
+                             help='只返回该编号章节及其子章节的内容')
+document_parser.add_argument('omit_table_rows', type=inputs.boolean, location='args', default=False,
+                             help='省略表格的行数据，只返回表头')
+document_parser.add_argument('include_tables', type=inputs.boolean, location='args', default=True,
+                             help='是否返回表格内容块；为 false 时不读取表格，需要时按内容ID单独获取')
+document_parser.add_argument('format', type=str, location='args', default='json',
+                             choices=('json', 'ndjson'),
+                             help='响应格式：json 或逐行输出的 ndjson 流')
+
+def find_section_subtree(document_id, section_id=None, section_number=None):
+    """按章节ID或章节编号查找子树，返回按顺序排列的章节列表"""
+    query = {'document_id': document_id}
+    if section_id:
+        query['_id'] = section_id
+    else:
+        query['section_number'] = section_number
+    root = document_sections.find_one(query, sort=SECTION_SORT)
+    if not root:
+        return None
+
+    # 按层级逐层展开子章节，查询次数等于子树深度
+    children_by_parent = {}
+    parent_ids = [root['_id']]
+    while parent_ids:
+        children = list(document_sections.find(
+            {'document_id': document_id, 'parent_id': {'$in': parent_ids}}
+        ).sort(SECTION_SORT))
+        for child in children:
+            children_by_parent.setdefault(child['parent_id'], []).append(child)
+        parent_ids = [child['_id'] for child in children]
+
+    # 按阅读顺序（先序遍历）排列子树
+    subtree = []
+    stack = [root]
+    while stack:
+        section = stack.pop()
+        subtree.append(section)
+        stack.extend(reversed(children_by_parent.get(section['_id'], [])))
+    return subtree
+
+def make_cache_variant(args):
+    """根据读取参数生成缓存键和ETag的范围标识"""
+    return '|'.join(f"{name}={args[name]}" for name in sorted(args))
+
+def cache_headers(etag):
+    """缓存协商相关的响应头，客户端每次使用前需重新验证"""
+    return {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+
+def render_document(doc, sections, contents, limit):
+    """截断到一页（contents 多取一条时生成下一页游标）、还原内容块并按 document_response 序列化"""
+    next_cursor = None
+    if limit and len(contents) > limit:
+        contents = contents[:limit]
+        next_cursor = encode_cursor(contents[-1])
+    contents = [decode_content(content) for content in contents]
+
+    with timed('response_marshal'):
+        return marshal({
+            'document': doc,
+            'sections': sections,
+            'contents': contents,
+            'next_cursor': next_cursor
+        }, document_response)
+
+def stream_document_ndjson(doc, sections, contents):
+    """逐行输出文档、章节和内容块，内容块按读取计划分批读取并写出"""
+    def dump(record_type, data):
+        return json.dumps({'type': record_type, 'data': data}, ensure_ascii=False) + '\n'
+
+    yield dump('document', marshal(doc, document_model))
+    for section in sections:
+        yield dump('section', marshal(section, section_model))
+    for content in contents:
+        yield dump('content', marshal(decode_content(content), content_model))
+
+# 全文检索参数
+search_parser = document_ns.parser()
+search_parser.add_argument('q', type=str, location='args', required=True,
+                           help='检索词')
+search_parser.add_argument('limit', type=int, location='args', default=20,
+                           help='返回结果数量（最多100）')
+search_parser.add_argument('document_id', type=str, location='args',
+                           help='只在指定文档中检索')
+
+@document_ns.route('/search')
+class DocumentSearch(Resource):
+    @document_ns.doc('search_documents',
+                    description='全文检索文档内容，按相关度返回命中的内容块',
+                    responses={
+                        200: '检索成功',
+                        400: '缺少检索词'
+                    })
+    @document_ns.expect(search_parser)
+    @document_ns.marshal_with(search_response)
+    def get(self):
+        """全文检索文档内容"""
+        args = search_parser.parse_args()
+        query = (args['q'] or '').strip()
+        if not query:
+            document_ns.abort(400, '检索词不能为空')
+
+        limit = max(1, min(args['limit'] or 20, 100))
+        return {
+            'query': query,
+            'hits': search(query, limit=limit, document_id=args['document_id'])
+        }
+
+@document_ns.route('/similar')
+class DocumentSimilar(Resource):
+    @document_ns.doc('find_similar_contents',
+                    description='按向量相似度查找与给定文本或内容块最相似的内容块',
+                    responses={
+                        200: '查找成功',
+                        400: '缺少查询文本或内容块ID',
+                        503: '未启用向量化'
+                    })
+    @document_ns.expect(similar_request)
+    @document_ns.marshal_with(similar_response)
+    def post(self):
+        """查找相似内容块"""
+        payload = request.get_json(silent=True) or {}
+        text = (payload.get('text') or '').strip()
+        content_id = payload.get('content_id')
+        if not text and not content_id:
+            document_ns.abort(400, '需要提供查询文本或内容块ID')
+        try:
+            limit = max(1, min(int(payload.get('limit') or 10), 100))
+        except (TypeError, ValueError):
+            document_ns.abort(400, 'limit 必须是整数')
+
+        # 向量索引依赖 numpy，按需导入以缩短服务冷启动时间
+        from utils.vector_index import find_similar
+        hits = find_similar(text=text, content_id=content_id, limit=limit,
+                            document_id=payload.get('document_id'))
+        if hits is None:
+            document_ns.abort(503, '未启用向量化（EMBEDDING_BACKEND=none）')
+        return {'hits': hits}
+
+# 批量导出参数
+export_parser = document_ns.parser()
+export_parser.add_argument('format', type=str, location='args', default='ndjson',
+                           choices=EXPORT_FORMATS,
+                           help='导出格式：ndjson（逐条记录）或 columnar（按列组织的行组），均为 gzip 压缩')
+export_parser.add_argument('document_id', type=str, location='args', action='append',
+                           help='只导出指定文档（可重复）')
+export_parser.add_argument('file_type', type=str, location='args',
+                           help='按文件类型过滤：MIME 类型或扩展名（如 pdf）')
+export_parser.add_argument('uploaded_after', type=inputs.datetime_from_iso8601, location='args',
+                           help='只导出该时间及之后上传的文档（ISO 8601，不带时区时为UTC）')
+export_parser.add_argument('uploaded_before', type=inputs.datetime_from_iso8601, location='args',
+                           help='只导出该时间之前上传的文档（ISO 8601，不带时区时为UTC）')
+export_parser.add_argument('filename_prefix', type=str, location='args',
+                           help='按文件名前缀过滤（区分大小写）')
+export_parser.add_argument('batch_size', type=int, location='args',
+                           help=f'数据库游标每批读取的记录数（默认为 EXPORT_BATCH_SIZE，最多{MAX_EXPORT_BATCH_SIZE}）')
+
+@document_ns.route('/export')
+class DocumentExport(Resource):
+    @document_ns.doc('export_documents',
+                    description='批量导出处理完成的文档及其章节和内容块，以 gzip 压缩流输出，'
+                                '服务端内存占用与导出的文档数无关',
+                    responses={200: '导出数据（gzip 压缩）'})
+    @document_ns.expect(export_parser)
+    def get(self):
+        """批量导出文档"""
+        args = export_parser.parse_args()
+        query = build_export_filter(
+            document_ids=args['document_id'],
+            file_type=normalize_file_type(args['file_type']) if args['file_type'] else None,
+            uploaded_after=args['uploaded_after'],
+            uploaded_before=args['uploaded_before'],
+            filename_prefix=args['filename_prefix']
+        )
+        filename = 'documents' + EXPORT_FILE_EXTENSIONS[args['format']]
+        return Response(
+            stream_with_context(export_documents(query, args['format'], args['batch_size'])),
+            mimetype='application/gzip',
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
+        )
+
 @document_ns.route('/<string:document_id>')
 @document_ns.param('document_id', '文档ID')
 class Document(Resource):
     @document_ns.doc('get_document',
-                    description='获取文档信息和内容',
+                    description='获取文档信息和内容，支持游标分页、按章节获取和 NDJSON 流式输出',
                     responses={
-                        200: '成功获取文档',
-                        404: '文档不存在'
+                        200: ('成功获取文档', document_response),
+                        304: '文档未修改（If-None-Match 命中）',
+                        400: '无效的分页游标',
+                        404: '文档或章节不存在'
                     })
-    @document_ns.marshal_with(document_response)
+    @document_ns.expect(document_parser)
     def get(self, document_id):
         """获取文档信息和内容"""
+        args = document_parser.parse_args()
+        doc = documents.find_one({'_id': document_id})
+        if not doc:
+            document_ns.abort(404, '文档不存在')
+
+        # 处理完成的文档内容不再变化，通过ETag协商和读穿透缓存避免重复查询章节和内容
+        is_cacheable = doc.get('status') == DocumentStatus.PROCESSED.value
+        cache = get_document_cache()
+        variant = make_cache_variant(args)
+        headers = {}
+        if is_cacheable:
+            version = document_version(doc)
+            etag = make_etag(document_id, version, variant)
+            headers = cache_headers(etag)
+            if request.if_none_match.contains(etag):
+                return Response(status=304, headers=headers)
+
+            if args['format'] == 'json':
+                cached = cache.get(document_id, variant, version)
+                if cached is not None:
+                    return cached, 200, headers
+
+        # 内容块按阅读顺序（章节的阅读顺序，章节内按序号）读取
+        positions = content_positions(document_id, is_cacheable)
+        # 按章节范围获取时只读取该子树
+        if args['section_id'] or args['section_number']:
+            sections = find_section_subtree(document_id, args['section_id'], args['section_number'])
+            if sections is None:
+                document_ns.abort(404, '章节不存在')
+            subtree_ids = {section['_id'] for section in sections}
+            positions = [position for position in positions if position[0] in subtree_ids]
+        elif args['cursor']:
+            # 后续分页只返回内容块
+            sections = []
+        else:
+            sections = reading_order(list(document_sections.find({'document_id': document_id})))
+
+        # 多取一条用于判断是否还有下一页（流式输出不分页）
+        limit = clamp_page_size(args['limit']) if args['format'] == 'json' else None
+        try:
+            plan = ContentReadPlan(document_id, positions, args['cursor'], limit + 1 if limit else None,
+                                   include_tables=args['include_tables'])
+        except InvalidCursorError as e:
+            document_ns.abort(400, str(e))
+        contents = iter_contents(plan, build_content_projection(args['omit_table_rows']))
+
+        if args['format'] == 'ndjson':
+            return Response(
+                stream_with_context(stream_document_ndjson(doc, sections, contents)),
+                mimetype='application/x-ndjson',
+                headers=headers
+            )
+
+        payload = render_document(doc, sections, list(contents), limit)
+        if is_cacheable:
+            cache.set(document_id, variant, version, payload)
+
+        return payload, 200, headers
+
+    @document_ns.doc('update_document',
+                    description='上传文档的新版本：按章节比对，只写入变化的章节和内容块，历史版本仍可读取',
+                    responses={
+                        200: ('更新成功', update_response),
+                        400: '无效的请求或文件类型不支持',
+                        404: '文档不存在',
+                        409: '文档正在处理中，或文件与其他文档内容相同'
+                    })
+    @document_ns.expect(update_parser)
+    @document_ns.marshal_with(update_response)
+    def put(self, document_id):
+        """上传文档的新版本"""
+        args = update_parser.parse_args()
+        file = args['file']
+        if not file or not allowed_file(file.filename):
+            document_ns.abort(400, '不支持的文件类型')
+
+        try:
+            result = update_document(document_id, secure_filename(file.filename), file.stream)
+        except DocumentUpdateConflict as e:
+            document_ns.abort(409, str(e))
+        if result is None:
+            document_ns.abort(404, '文档不存在')
+        return result
+
+@document_ns.route('/<string:document_id>/outline')
+@document_ns.param('document_id', '文档ID')
+class DocumentOutline(Resource):
+    @document_ns.doc('get_document_outline',
+                    description='获取文档的章节树（入库时生成），包含各章节的内容块数和字符数',
+                    responses={
+                        200: ('成功获取文档大纲', outline_response),
+                        404: '文档不存在'
+                    })
+    @document_ns.marshal_with(outline_response)
+    def get(self, document_id):
+        """获取文档大纲"""
+        outline = get_outline(document_id)
+        if outline is None:
+            document_ns.abort(404, '文档不存在')
+        return outline
+
+@document_ns.route('/<string:document_id>/versions')
+@document_ns.param('document_id', '文档ID')
+class DocumentVersions(Resource):
+    @document_ns.doc('list_document_versions',
+                    description='列出文档的各个版本',
+                    responses={
+                        200: ('成功获取版本列表', versions_response),
+                        404: '文档不存在'
+                    })
+    @document_ns.marshal_with(versions_response)
+    def get(self, document_id):
+        """列出文档的各个版本"""
         doc = documents.find_one({'_id': document_id})
         if not doc:
             document_ns.abort(404, '文档不存在')
-        
-        sections = list(document_sections.find({'document_id': document_id}).sort('order', 1))
-        contents = list(document_contents.find({'document_id': document_id}).sort('order', 1))
-        
         return {
-            'document': doc,
-            'sections': sections,
-            'contents': contents
-        } 
\ No newline at end of file
+            'document_id': document_id,
+            'current_version': doc.get('version', 1),
+            'versions': list_versions(doc)
+        }
+
+@document_ns.route('/<string:document_id>/versions/<int:version>')
+@document_ns.param('document_id', '文档ID')
+@document_ns.param('version', '版本号')
+class DocumentVersion(Resource):
+    @document_ns.doc('get_document_version',
+                    description='获取文档指定版本的章节和内容',
+                    responses={
+                        200: ('成功获取文档版本', document_response),
+                        404: '文档或版本不存在'
+                    })
+    @document_ns.marshal_with(document_response)
+    def get(self, document_id, version):
+        """获取文档的指定版本"""
+        doc = documents.find_one({'_id': document_id})
+        if not doc:
+            document_ns.abort(404, '文档不存在')
+        snapshot = get_document_version(doc, version)
+        if snapshot is None:
+            document_ns.abort(404, '版本不存在')
+        snapshot['contents'] = [decode_content(content) for content in snapshot['contents']]
+        return snapshot
+
+@document_ns.route('/<string:document_id>/retry')
+@document_ns.param('document_id', '文档ID')
+class DocumentRetry(Resource):
+    @document_ns.doc('retry_document',
+                    description='重新处理失败的异步上传文档：PDF从最后一个检查点继续，其他文档删除已写入的记录后重新处理',
+                    responses={
+                        202: ('已重新加入处理队列', retry_response),
+                        404: '文档不存在',
+                        409: '文档不是处理失败状态，或原始文件未保留'
+                    })
+    @document_ns.marshal_with(retry_response, code=202)
+    def post(self, document_id):
+        """重试处理失败的文档"""
+        try:
+            result = retry_document(document_id)
+        except RetryConflict as e:
+            document_ns.abort(409, str(e))
+        if result is None:
+            document_ns.abort(404, '文档不存在')
+        return result, 202
+
+@document_ns.route('/<string:document_id>/contents/<string:content_id>')
+@document_ns.param('document_id', '文档ID')
+@document_ns.param('content_id', '内容ID')
+class DocumentContentItem(Resource):
+    @document_ns.doc('get_document_content',
+                    description='获取单个内容块（例如读取文档时未返回的表格）',
+                    responses={
+                        200: '成功获取内容块',
+                        404: '内容块不存在'
+                    })
+    @document_ns.marshal_with(content_model)
+    def get(self, document_id, content_id):
+        """获取单个内容块"""
+        content = document_contents.find_one({'_id': content_id, 'document_id': document_id})
+        if not content:
+            document_ns.abort(404, '内容块不存在')
+        return decode_content(content)
+
+@document_ns.route('/<string:document_id>/status')
+@document_ns.param('document_id', '文档ID')
+class DocumentProcessingStatus(Resource):
+    @document_ns.doc('get_document_status',
+                    description='获取文档处理状态和进度',
+                    responses={
+                        200: '成功获取处理状态',
+                        404: '文档不存在'
+                    })
+    @document_ns.marshal_with(status_response)
+    def get(self, document_id):
+        """获取文档处理状态和进度"""
+        doc = documents.find_one(
+            {'_id': document_id},
+            {'status': 1, 'progress': 1, 'error_message': 1, 'last_modified': 1}
+        )
+        if not doc:
+            document_ns.abort(404, '文档不存在')
+
+        return doc
\ No newline at end of file
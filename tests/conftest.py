@@ -0,0 +1,49 @@
+"""
+测试公共夹具：每个测试使用独立的内存版MongoDB替身（benchmarks/memory_mongo.py），不需要运行 mongod
+"""
+import io
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+os.environ.setdefault('MONGODB_DB_NAME', 'test')
+# 在测试进程内解析文档，不启动解析子进程
+os.environ['EXTRACT_ISOLATION'] = 'false'
+# 不启动后台维护线程，测试直接调用维护和清理函数
+os.environ['INGEST_SWEEP_INTERVAL'] = '0'
+
+from benchmarks.memory_mongo import MemoryClient  # noqa: E402
+from database import mongo_client  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def memory_mongo(monkeypatch):
+    client = MemoryClient()
+    monkeypatch.setattr(mongo_client, '_client', client)
+    return client
+
+
+@pytest.fixture
+def app_client():
+    from app import app
+    app.config['TESTING'] = True
+    return app.test_client()
+
+
+def make_nested_docx(outline) -> bytes:
+    """按 (标题层级, 文本) 列表生成Word文档，层级为 0 的是正文段落"""
+    from docx import Document as DocxDocument
+
+    doc = DocxDocument()
+    for level, text in outline:
+        if level:
+            doc.add_heading(text, level=level)
+        else:
+            doc.add_paragraph(text)
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
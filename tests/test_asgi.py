@@ -0,0 +1,60 @@
+"""
+ASGI 服务模式的冒烟测试（依赖 requirements-asgi.txt，未安装时跳过）
+"""
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip('motor')
+pytest.importorskip('asgiref')
+
+from asgi import application  # noqa: E402
+from benchmarks.memory_mongo import AsyncMemoryClient  # noqa: E402
+from database import async_mongo_client  # noqa: E402
+from routes.async_routes import AsgiApp  # noqa: E402
+from utils.document_processor import DocumentProcessor  # noqa: E402
+from tests.conftest import make_nested_docx  # noqa: E402
+
+
+def _get(application, path):
+    """以 ASGI 协议发送一个 GET 请求，返回状态码和响应体"""
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode('ascii'), 'query_string': b'',
+        'root_path': '', 'headers': [], 'server': ('testserver', 80), 'client': ('127.0.0.1', 50000)
+    }
+    asyncio.run(application(scope, receive, send))
+    return messages[0]['status'], b''.join(message.get('body', b'') for message in messages[1:])
+
+
+def test_asgi_application_serves_flask_routes():
+    assert isinstance(application, AsgiApp)
+    status, body = _get(application, '/health')
+    assert status == 200
+    assert json.loads(body)['status'] == 'healthy'
+
+
+def test_uvicorn_loads_application():
+    uvicorn = pytest.importorskip('uvicorn')
+    config = uvicorn.Config('asgi:application', lifespan='on')
+    config.load()
+    assert config.loaded
+
+
+def test_async_document_route_matches_flask(app_client, memory_mongo, monkeypatch):
+    monkeypatch.setattr(async_mongo_client, '_async_client', AsyncMemoryClient(memory_mongo))
+    outline = [(1, 'Overview'), (0, 'alpha bravo'), (2, 'Detail'), (0, 'charlie delta')]
+    document_id = DocumentProcessor('a.docx', make_nested_docx(outline)).process_and_save()
+
+    status, body = _get(application, f'/api/documents/{document_id}')
+    assert status == 200
+    assert json.loads(body) == app_client.get(f'/api/documents/{document_id}').get_json()
@@ -0,0 +1,53 @@
+"""
+文档读取缓存：LRU 淘汰、按文档版本失效，以及ETag的生成
+"""
+from datetime import datetime
+
+import pytest
+
+from utils import document_cache
+from utils.document_cache import CacheBackend, DocumentCache, LRUCacheBackend, document_version, make_etag
+
+
+def test_cache_backend_is_abstract():
+    with pytest.raises(TypeError):
+        CacheBackend()
+
+
+def test_lru_backend_evicts_least_recently_used():
+    backend = LRUCacheBackend()
+    backend.set('a', 'v1', 'x' * 100)
+    # 容量为两个条目
+    backend.max_bytes = backend.stats()['size_bytes'] * 2
+    backend.set('b', 'v1', 'x' * 100)
+    assert backend.get('a') == ('v1', 'x' * 100)
+    backend.set('c', 'v1', 'x' * 100)
+    assert backend.get('b') is None
+    assert backend.get('a') is not None and backend.get('c') is not None
+    assert backend.stats()['evictions'] == 1
+
+    # 超过总容量的单个条目不缓存
+    backend.set('d', 'v1', 'x' * 1000)
+    assert backend.get('d') is None
+
+
+def test_stale_entries_are_invalidated():
+    cache = DocumentCache(LRUCacheBackend())
+    cache.set('doc', 'all', 'v1', {'contents': []})
+    assert cache.get('doc', 'all', 'v1') == {'contents': []}
+    assert cache.get('doc', 'all', 'v2') is None
+    assert cache.get('doc', 'all', 'v1') is None
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_etag_depends_on_document_version_and_variant(monkeypatch):
+    doc = {'status': 'processed', 'last_modified': datetime(2024, 1, 1)}
+    version = document_version(doc)
+    etag = make_etag('doc', version, 'all')
+    assert make_etag('doc', version, 'all') == etag
+    assert make_etag('doc', version, 'page=2') != etag
+    assert make_etag('doc', document_version(dict(doc, last_modified=datetime(2024, 1, 2))), 'all') != etag
+
+    # 响应格式变化后旧的ETag不再匹配
+    monkeypatch.setattr(document_cache, 'RESPONSE_REVISION', document_cache.RESPONSE_REVISION + 1)
+    assert make_etag('doc', document_version(doc), 'all') != etag
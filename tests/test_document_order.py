@@ -0,0 +1,91 @@
+"""
+章节和内容块序号的回归测试：序号在处理器内分配后，order / section_number 与按数据库查询分配时一致
+"""
+from benchmarks.ingest_benchmark import make_pdf
+from database.mongo_client import document_sections, document_contents
+from utils import pdf_extractor
+from utils.document_processor import DocumentProcessor
+from tests.conftest import make_nested_docx
+
+NESTED_OUTLINE = [
+    (0, 'preface'),
+    (1, 'Intro'), (0, 'a'), (0, 'b'),
+    (2, 'Scope'), (0, 'c'),
+    (3, 'Details'), (0, 'd'),
+    (3, 'More'), (0, 'e'),
+    (2, 'Terms'), (0, 'f'),
+    (1, 'Usage'), (0, 'g'),
+    (2, 'Install'), (0, 'h'),
+]
+
+
+def _process(outline):
+    processor = DocumentProcessor('nested.docx', make_nested_docx(outline), build_embeddings=False)
+    document_id = processor.process_and_save()
+    sections = {section['_id']: section for section in document_sections.find({'document_id': document_id})}
+    contents = list(document_contents.find({'document_id': document_id}))
+    return sections, contents
+
+
+def test_nested_heading_orders_and_numbers():
+    sections, _ = _process(NESTED_OUTLINE)
+    by_title = {section['title']: section for section in sections.values()}
+
+    actual = {
+        title: (section['level'], section['order'], section['section_number'],
+                sections[section['parent_id']]['title'] if section['parent_id'] else None)
+        for title, section in by_title.items()
+    }
+    assert actual == {
+        # 标题之前的段落放在默认章节中，默认章节的编号沿用其序号
+        '未分类内容': (0, 10, '10', None),
+        'Intro': (1, 20, '2', None),
+        'Scope': (2, 10, '2.1', 'Intro'),
+        'Details': (3, 10, '2.1.1', 'Scope'),
+        'More': (3, 20, '2.1.2', 'Scope'),
+        'Terms': (2, 20, '2.2', 'Intro'),
+        'Usage': (1, 30, '3', None),
+        'Install': (2, 10, '3.1', 'Usage'),
+    }
+
+
+def test_content_orders_restart_in_each_section():
+    sections, contents = _process(NESTED_OUTLINE)
+
+    actual = sorted((sections[content['section_id']]['title'], content['order'], content['content']['text'])
+                    for content in contents)
+    assert actual == [
+        ('Details', 10, 'd'),
+        ('Install', 10, 'h'),
+        ('Intro', 10, 'a'),
+        ('Intro', 20, 'b'),
+        ('More', 10, 'e'),
+        ('Scope', 10, 'c'),
+        ('Terms', 10, 'f'),
+        ('Usage', 10, 'g'),
+        ('未分类内容', 10, 'preface'),
+    ]
+
+
+def test_heading_level_jump_keeps_existing_numbering():
+    """跳级的标题（一级标题后直接出现三级标题）：层级栈按级数逐个弹出，之后的二级标题成为顶层章节，与原有编号规则一致"""
+    sections, _ = _process([(1, 'Top'), (3, 'Deep'), (0, 'x'), (2, 'Mid')])
+    by_title = {section['title']: section for section in sections.values()}
+
+    assert (by_title['Top']['order'], by_title['Top']['section_number']) == (10, '1')
+    assert (by_title['Deep']['order'], by_title['Deep']['section_number']) == (10, '1.1')
+    assert by_title['Deep']['parent_id'] == by_title['Top']['_id']
+    assert (by_title['Mid']['order'], by_title['Mid']['section_number']) == (20, '2')
+    assert by_title['Mid']['parent_id'] is None
+
+
+def test_blank_pdf_pages_keep_a_content_block(monkeypatch):
+    monkeypatch.setattr(pdf_extractor, 'iter_pdf_pages', lambda source, **options: iter(['alpha', ' \n', 'bravo']))
+    processor = DocumentProcessor('scan.pdf', make_pdf(0, 3), build_embeddings=False)
+    document_id = processor.process_and_save()
+
+    contents = sorted(document_contents.find({'document_id': document_id}), key=lambda content: content['order'])
+    assert [(content['page'], content['content']['text']) for content in contents] == [
+        (1, 'alpha'), (2, ''), (3, 'bravo')
+    ]
+    assert processor.progress['pages_processed'] == 3
@@ -0,0 +1,160 @@
+"""
+内容块分页：游标的编码和解析、读取计划按阅读顺序分批读取，以及 GET /api/documents/<id> 的分页和流式输出；
+文档列表的游标分页
+"""
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from database.mongo_client import document_contents, documents
+from utils.document_processor import DocumentProcessor
+from utils.document_query import (
+    ContentReadPlan, InvalidCursorError, decode_cursor, decode_list_cursor, encode_cursor, encode_list_cursor,
+    iter_contents
+)
+from tests.conftest import make_nested_docx
+
+OUTLINE = [(1, 'One'), (0, 'p1'), (0, 'p2'), (2, 'One.A'), (0, 'p3'), (3, 'One.A.i'), (0, 'p4'), (0, 'p5'),
+           (2, 'One.B'), (0, 'p6'), (1, 'Two'), (1, 'Three'), (0, 'p7'), (2, 'Three.A'), (0, 'p8')]
+TEXTS = [text for level, text in OUTLINE if not level]
+
+
+def test_cursor_round_trip():
+    content = {'_id': 'c-1', 'section_id': 's-1', 'order': 20}
+    assert decode_cursor(encode_cursor(content)) == ('s-1', 20, 'c-1')
+
+
+@pytest.mark.parametrize('cursor', ['', '20:c-1', 's-1:x:c-1', ':20:c-1', 's-1:20:', 's:1:2:3'])
+def test_invalid_cursor(cursor):
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor)
+
+
+def _insert_contents(layout):
+    """layout 为按阅读顺序排列的 (章节ID, 内容块数)；序号在每个章节内从10开始"""
+    for section_id, count in layout:
+        for n in range(count):
+            document_contents.insert_one({
+                '_id': f'{section_id}-{n:02d}', 'document_id': 'doc', 'section_id': section_id,
+                'order': (n + 1) * 10, 'content_type': 'text'
+            })
+    return [f'{section_id}-{n:02d}' for section_id, count in layout for n in range(count)]
+
+
+def _read_pages(positions, limit, batch):
+    ids, cursor = [], None
+    while True:
+        plan = ContentReadPlan('doc', positions, cursor, limit + 1, batch=batch)
+        page = list(iter_contents(plan))
+        ids.extend(content['_id'] for content in page[:limit])
+        if len(page) <= limit:
+            return ids
+        cursor = encode_cursor(page[limit - 1])
+
+
+# 章节ID的字典序与阅读顺序相反，按 (order, _id) 或章节ID排序都不能得到阅读顺序
+LAYOUT = [('s9', 3), ('s8', 0), ('s7', 1), ('s6', 12), ('s5', 2), ('s4', 2), ('s3', 5)]
+
+
+@pytest.mark.parametrize('counts', [
+    'exact',
+    'unknown',
+    # 大纲中的内容块数与实际不一致（例如文档处理中）
+    'stale',
+])
+@pytest.mark.parametrize('limit, batch', [(1, 100), (3, 4), (7, 5), (50, 100)])
+def test_pages_concatenate_to_reading_order(counts, limit, batch):
+    expected = _insert_contents(LAYOUT)
+    positions = {
+        'exact': LAYOUT,
+        'unknown': [(section_id, None) for section_id, _ in LAYOUT],
+        'stale': [(section_id, max(count - 1, 0)) for section_id, count in LAYOUT],
+    }[counts]
+
+    assert [content['_id'] for content in iter_contents(ContentReadPlan('doc', positions, batch=batch))] == expected
+    assert _read_pages(positions, limit, batch) == expected
+
+
+def test_cursor_of_removed_section_is_rejected():
+    _insert_contents(LAYOUT)
+    with pytest.raises(InvalidCursorError):
+        ContentReadPlan('doc', LAYOUT[1:], encode_cursor({'_id': 's9-00', 'section_id': 's9', 'order': 10}))
+
+
+@pytest.fixture
+def document_id():
+    return DocumentProcessor('nested.docx', make_nested_docx(OUTLINE)).process_and_save()
+
+
+def _texts(contents):
+    return [content['content']['text'] for content in contents]
+
+
+def test_get_document_pages_in_reading_order(app_client, document_id):
+    full = app_client.get(f'/api/documents/{document_id}').get_json()
+    assert _texts(full['contents']) == TEXTS
+    assert [section['title'] for section in full['sections']] == [text for level, text in OUTLINE if level]
+    assert full['next_cursor'] is None
+
+    texts, cursor = [], None
+    while True:
+        query = f'?limit=3&cursor={cursor}' if cursor else '?limit=3'
+        page = app_client.get(f'/api/documents/{document_id}{query}').get_json()
+        texts.extend(_texts(page['contents']))
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+    assert texts == TEXTS
+
+
+def test_get_document_ndjson_in_reading_order(app_client, document_id):
+    response = app_client.get(f'/api/documents/{document_id}?format=ndjson')
+    records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert _texts(record['data'] for record in records if record['type'] == 'content') == TEXTS
+
+
+def test_get_document_section_scope(app_client, document_id):
+    page = app_client.get(f'/api/documents/{document_id}?section_number=1.1').get_json()
+    assert [section['title'] for section in page['sections']] == ['One.A', 'One.A.i']
+    assert _texts(page['contents']) == ['p3', 'p4', 'p5']
+
+
+def test_get_document_invalid_cursor(app_client, document_id):
+    assert app_client.get(f'/api/documents/{document_id}?limit=2&cursor=bad').status_code == 400
+    stale = encode_cursor({'_id': 'c', 'section_id': 'missing', 'order': 10})
+    assert app_client.get(f'/api/documents/{document_id}?limit=2&cursor={stale}').status_code == 400
+
+
+def test_list_cursor_round_trip():
+    # MongoDB 的日期精度为毫秒，游标按毫秒编码
+    upload_time = datetime(2024, 5, 6, 7, 8, 9, 123000)
+    assert decode_list_cursor(encode_list_cursor({'_id': 'doc-1', 'upload_time': upload_time})) \
+        == (upload_time, 'doc-1')
+
+
+@pytest.mark.parametrize('cursor', ['', '123', '123:', 'x:doc-1', f'{10 ** 20}:doc-1'])
+def test_invalid_list_cursor(cursor):
+    with pytest.raises(InvalidCursorError):
+        decode_list_cursor(cursor)
+
+
+def test_list_documents_pages_by_upload_time_and_id(app_client):
+    base = datetime(2024, 1, 1)
+    # 上传时间相同的文档按ID倒序，翻页时不重复也不遗漏
+    for i in range(7):
+        documents.insert_one({'_id': f'doc-{i}', 'filename': f'{i}.docx', 'file_type': 'docx',
+                              'status': 'processed', 'upload_time': base + timedelta(seconds=i // 3)})
+    expected = sorted(documents.find({}), key=lambda doc: (doc['upload_time'], doc['_id']),
+                      reverse=True)
+
+    ids, cursor = [], None
+    while True:
+        query = f'?limit=2&cursor={cursor}' if cursor else '?limit=2'
+        page = app_client.get(f'/api/documents{query}').get_json()
+        ids.extend(doc['_id'] for doc in page['documents'])
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+    assert ids == [doc['_id'] for doc in expected]
+    assert app_client.get('/api/documents?cursor=bad').status_code == 400
@@ -0,0 +1,37 @@
+"""
+统计计数器：入库和版本更新时按增量维护
+"""
+from database.mongo_client import document_contents, document_sections, documents, system_stats
+from utils.document_processor import DocumentProcessor
+from utils.document_stats import STATS_ID
+from utils.document_versions import update_document
+from tests.conftest import make_nested_docx
+
+
+def _counters():
+    return system_stats.find_one({'_id': STATS_ID})
+
+
+def _assert_matches_collections(counters):
+    assert counters['total_documents'] == documents.count_documents({})
+    assert counters['total_sections'] == document_sections.count_documents({})
+    assert counters['total_contents'] == document_contents.count_documents({})
+    assert counters['contents_by_type'] == {'text': document_contents.count_documents({'content_type': 'text'})}
+
+
+def test_counters_follow_ingest_and_update():
+    content = make_nested_docx([(1, 'One'), (0, 'alpha'), (0, 'bravo'), (1, 'Two'), (0, 'charlie')])
+    document_id = DocumentProcessor('a.docx', content).process_and_save()
+
+    counters = _counters()
+    _assert_matches_collections(counters)
+    assert counters['documents_by_status'] == {'processing': 0, 'processed': 1}
+    assert counters['bytes_ingested'] == len(content)
+
+    updated = make_nested_docx([(1, 'One'), (0, 'alpha'), (1, 'Three'), (0, 'delta'), (0, 'echo'), (0, 'golf')])
+    update_document(document_id, 'a.docx', updated)
+
+    counters = _counters()
+    _assert_matches_collections(counters)
+    assert counters['documents_by_status'] == {'processing': 0, 'processed': 1}
+    assert counters['bytes_ingested'] == len(content) + len(updated)
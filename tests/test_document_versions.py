@@ -0,0 +1,112 @@
+"""
+文档版本：新旧版本的对齐、内容块序号的分配和历史版本的还原
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from database.mongo_client import documents, document_contents, document_sections
+from models.document_models import DocumentStatus
+from utils.content_codec import decode_content
+from utils.document_processor import DocumentProcessor
+from utils.document_versions import ORDER_STEP, _align, _assign_orders, get_document_version, update_document
+from utils.ingest_runs import IngestRunState, sweep
+from tests.conftest import make_nested_docx
+
+V1 = [(1, 'Overview'), (0, 'alpha'), (0, 'bravo'), (2, 'Scope'), (0, 'charlie'),
+      (1, 'Legacy'), (0, 'delta'), (1, 'Appendix'), (0, 'echo')]
+# 修改一个段落、在章节开头插入段落、删除 Legacy 章节、新增 Glossary 章节
+V2 = [(1, 'Overview'), (0, 'zero'), (0, 'alpha'), (0, 'bravo changed'), (2, 'Scope'), (0, 'charlie'),
+      (1, 'Appendix'), (0, 'echo'), (1, 'Glossary'), (0, 'foxtrot')]
+
+
+@pytest.mark.parametrize('old_orders, expected', [
+    ([10, 20, 30], [10, 20, 30]),
+    # 插入到开头、中间和末尾
+    ([None, 10, 20], [5, 10, 20]),
+    ([10, None, None, 40], [10, 20, 30, 40]),
+    ([10, 20, None, None], [10, 20, 30, 40]),
+    ([None, None], [ORDER_STEP, 2 * ORDER_STEP]),
+    # 空隙不足时顺延，之后的内容块不再沿用原序号
+    ([10, None, 11, 12], [10, 20, 30, 40]),
+    # 移到前面的内容块之后的序号不能沿用
+    ([30, 10, 20], [30, 40, 50]),
+])
+def test_assign_orders(old_orders, expected):
+    assert _assign_orders(old_orders) == expected
+
+
+@pytest.mark.parametrize('old_orders', [
+    [None, 1, None, 2, None],
+    [50, None, 51, None, 10, None],
+    [None] * 5 + [3, 4],
+])
+def test_assign_orders_strictly_increasing(old_orders):
+    orders = _assign_orders(old_orders)
+    assert len(orders) == len(old_orders)
+    assert all(a < b for a, b in zip(orders, orders[1:]))
+    assert orders[0] >= 1
+
+
+def test_align_pairs_replaced_items_with_same_level():
+    old = [(1, 'A'), (1, 'B'), (2, 'C'), (1, 'D')]
+    new = [(1, 'A'), (1, 'B2'), (2, 'C'), (1, 'E')]
+    same_level = lambda o, n: o[0] == n[0]  # noqa: E731
+
+    assert _align(old, new) == ({0: 0, 2: 2}, [1, 3])
+    assert _align(old, new, pair_replaced=same_level) == ({0: 0, 1: 1, 2: 2, 3: 3}, [])
+    # 删除和插入的元素没有对应
+    assert _align(old, [(1, 'A'), (2, 'C'), (1, 'X'), (1, 'D')]) == ({0: 0, 1: 2, 3: 3}, [1])
+
+
+def _snapshot(document_id, version):
+    snapshot = get_document_version(documents.find_one({'_id': document_id}), version)
+    sections = [section['title'] for section in snapshot['sections']]
+    texts = [decode_content(content)['content']['text'] for content in snapshot['contents']]
+    return snapshot, sections, texts
+
+
+def _outline_text(outline):
+    return ([text for level, text in outline if level], [text for level, text in outline if not level])
+
+
+def test_get_document_version_restores_previous_version():
+    document_id = DocumentProcessor('a.docx', make_nested_docx(V1)).process_and_save()
+    result = update_document(document_id, 'b.docx', make_nested_docx(V2))
+    assert result['version'] == 2
+    assert result['sections'] == {'inserted': 1, 'updated': 1, 'removed': 1, 'unchanged': 2}
+
+    snapshot, sections, texts = _snapshot(document_id, 1)
+    assert (sections, texts) == _outline_text(V1)
+    assert snapshot['document']['version'] == 1
+    assert snapshot['document']['filename'] == 'a.docx'
+
+    snapshot, sections, texts = _snapshot(document_id, 2)
+    assert (sections, texts) == _outline_text(V2)
+    assert snapshot['document']['filename'] == 'b.docx'
+
+    doc = documents.find_one({'_id': document_id})
+    assert get_document_version(doc, 0) is None
+    assert get_document_version(doc, 3) is None
+
+
+def test_update_clears_failed_ingest_run_before_sweep():
+    document_id = DocumentProcessor('a.docx', make_nested_docx(V1)).process_and_save()
+    run_id = documents.find_one({'_id': document_id})['run_id']
+    # 重新处理失败后留下的运行：记录与当前内容共用 run_id，过期后会被清理
+    documents.update_one({'_id': document_id}, {'$set': {
+        'status': DocumentStatus.ERROR.value,
+        'ingest_run': {'_id': run_id, 'attempt': 2, 'resumable': False, 'state': IngestRunState.FAILED.value,
+                       'expires_at': datetime.utcnow(), 'checkpoint': None}
+    }})
+
+    update_document(document_id, 'b.docx', make_nested_docx(V2))
+    assert 'ingest_run' not in documents.find_one({'_id': document_id})
+    sections = document_sections.count_documents({'document_id': document_id})
+    contents = document_contents.count_documents({'document_id': document_id})
+
+    assert sweep(datetime.utcnow() + timedelta(hours=2))['collected'] == 0
+    assert document_sections.count_documents({'document_id': document_id}) == sections
+    assert document_contents.count_documents({'document_id': document_id}) == contents
+    snapshot, section_titles, texts = _snapshot(document_id, 2)
+    assert (section_titles, texts) == _outline_text(V2)
@@ -0,0 +1,64 @@
+"""
+隔离的解析进程池：在 spawn 启动的工作进程中解析，超时、内存超限和进程退出后重新启动工作进程
+"""
+import os
+import time
+
+import pytest
+
+from database.mongo_client import document_sections
+from utils import extractor_pool
+from utils.document_processor import DocumentProcessor
+from utils.extractor_pool import ExtractionError, ExtractionTimeout, ExtractorPool
+from utils.extractors import _docx_blocks
+from tests.conftest import make_nested_docx
+
+OUTLINE = [(1, 'Overview'), (0, 'alpha bravo'), (2, 'Detail'), (0, 'charlie delta')]
+
+
+@pytest.fixture(scope='module')
+def pool():
+    pool = ExtractorPool(size=1, timeout=30, memory_limit_mb=512)
+    yield pool
+    pool.close()
+
+
+def test_stream_parses_in_worker_process(pool):
+    assert list(pool.stream(_docx_blocks, make_nested_docx(OUTLINE))) == [
+        {'type': 'heading', 'level': 1, 'text': 'Overview'},
+        {'type': 'paragraph', 'text': 'alpha bravo'},
+        {'type': 'heading', 'level': 2, 'text': 'Detail'},
+        {'type': 'paragraph', 'text': 'charlie delta'},
+    ]
+    assert pool.run(os.getpid) != os.getpid()
+
+
+@pytest.mark.skipif(os.name != 'posix', reason='RLIMIT_AS 仅在 POSIX 系统上可用')
+def test_memory_limit_fails_task_and_restarts_worker(pool):
+    with pytest.raises(ExtractionError, match='内存上限'):
+        pool.run(bytearray, 2 * 1024 ** 3)
+    assert pool.run(len, 'abc') == 3
+
+
+def test_timeout_kills_worker(pool):
+    pid = pool.run(os.getpid)
+    with pytest.raises(ExtractionTimeout):
+        pool.run(time.sleep, 30, timeout=0.5)
+    assert pool.run(os.getpid) != pid
+
+
+def test_worker_crash_fails_task_and_restarts_worker(pool):
+    with pytest.raises(ExtractionError, match='异常退出'):
+        pool.run(os._exit, 3)
+    assert pool.run(len, 'abc') == 3
+
+
+def test_processor_uses_isolated_pool(pool, monkeypatch):
+    monkeypatch.setenv('EXTRACT_ISOLATION', 'true')
+    monkeypatch.setattr(extractor_pool, '_pool', pool)
+    monkeypatch.setattr(extractor_pool, '_pool_pid', os.getpid())
+
+    document_id = DocumentProcessor('nested.docx', make_nested_docx(OUTLINE)).process_and_save()
+
+    titles = [section['title'] for section in document_sections.find({'document_id': document_id})]
+    assert titles == ['Overview', 'Detail']
@@ -0,0 +1,114 @@
+"""
+解析器注册表：按文件内容识别类型、扩展名映射，以及 Markdown / HTML 的解析
+"""
+import io
+import zipfile
+
+import pytest
+
+from database.mongo_client import document_contents, document_sections
+from utils import extractors
+from utils.document_processor import DocumentProcessor
+from utils.extractors import (
+    DOC_PLACEHOLDER, DOC_TYPE, DOCX_TYPE, HTML_TYPE, MARKDOWN_TYPE, OCTET_STREAM, OLE_SIGNATURE, PDF_TYPE, TEXT_TYPE,
+    Extractor, _html_blocks, _markdown_blocks, get_extractor, get_file_type, normalize_file_type,
+    register_extractor, sniff_file_type
+)
+from utils.upload_source import UploadSource
+from tests.conftest import make_nested_docx
+
+
+def _zip(name):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr(name, 'data')
+    return buffer.getvalue()
+
+
+@pytest.fixture(params=['magic', 'signatures'])
+def sniffer(request, monkeypatch):
+    if request.param == 'signatures':
+        monkeypatch.setattr(extractors, '_magic', False)
+    elif not extractors._magic_mime(b'%PDF-1.4'):
+        pytest.skip('python-magic is unavailable')
+
+
+@pytest.mark.parametrize('content, filename, expected', [
+    (b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n', 'a.pdf', PDF_TYPE),
+    # 按内容识别，不依赖扩展名
+    (make_nested_docx([(1, 'Title'), (0, 'text')]), 'report.pdf', DOCX_TYPE),
+    (_zip('data.csv'), 'a.docx', 'application/zip'),
+    (OLE_SIGNATURE + b'\x00' * 504, 'legacy.doc', DOC_TYPE),
+    ('纯文本内容\n'.encode('utf-8'), 'notes.txt', TEXT_TYPE),
+    (b'# Title\n\ntext\n', 'README.md', MARKDOWN_TYPE),
+    (b'<!DOCTYPE html><html><body><p>x</p></body></html>', 'page.txt', HTML_TYPE),
+    (b'<p>fragment</p>', 'page.htm', HTML_TYPE),
+    (b'\x00\x01\x02\x03' * 64, 'a.txt', OCTET_STREAM),
+])
+def test_sniff_file_type(sniffer, content, filename, expected):
+    with UploadSource(content) as source:
+        assert sniff_file_type(source, filename) == expected
+
+
+def test_file_type_mapping():
+    assert get_file_type('A.PDF') == PDF_TYPE
+    assert get_file_type('notes.markdown') == MARKDOWN_TYPE
+    assert get_file_type('archive.tar.gz') == OCTET_STREAM
+    assert normalize_file_type('docx') == DOCX_TYPE
+    assert normalize_file_type('.HTML') == HTML_TYPE
+    assert normalize_file_type(PDF_TYPE) == PDF_TYPE
+
+
+def test_markdown_blocks():
+    markdown = (b'# Title\n\nPara one\nline two\n\n## Sub\n\n| a | b |\n|---|---|\n| 1 | 2 |\n\n'
+                b'```\ncode # not heading\n```\nSetext\n---\n')
+    assert list(_markdown_blocks(markdown)) == [
+        {'type': 'heading', 'level': 1, 'text': 'Title'},
+        {'type': 'paragraph', 'text': 'Para one\nline two'},
+        {'type': 'heading', 'level': 2, 'text': 'Sub'},
+        {'type': 'table', 'rows': [['a', 'b'], ['1', '2']]},
+        {'type': 'paragraph', 'text': 'code # not heading'},
+        {'type': 'heading', 'level': 2, 'text': 'Setext'},
+    ]
+
+
+def test_html_blocks_skip_scripts_and_keep_tables():
+    html = ('<!doctype html><html><head><meta charset="gbk"><title>x</title><style>p{}</style></head>'
+            '<body><h1>标题</h1><p>Hello <b>world</b><br>next</p><script>bad()</script>'
+            '<table><tr><th>a</th><th>b</th></tr><tr><td>1</td><td>2</td></tr></table></body></html>')
+    assert list(_html_blocks(html.encode('gbk'))) == [
+        {'type': 'heading', 'level': 1, 'text': '标题'},
+        {'type': 'paragraph', 'text': 'Hello world\nnext'},
+        {'type': 'table', 'rows': [['a', 'b'], ['1', '2']]},
+    ]
+
+
+def test_registered_extractor_is_used_by_processor(monkeypatch):
+    monkeypatch.setattr(extractors, 'EXTRACTORS', dict(extractors.EXTRACTORS))
+    monkeypatch.setattr(extractors, 'FILE_TYPE_MAP', dict(extractors.FILE_TYPE_MAP))
+
+    def extract_csv(source, **options):
+        with source.open() as stream:
+            rows = [line.decode('utf-8').split(',') for line in stream.read().splitlines()]
+        yield {'type': 'heading', 'level': 1, 'text': 'Data'}
+        yield {'type': 'table', 'rows': rows}
+
+    # 内置签名表将 CSV 识别为纯文本，注册替换纯文本的解析器
+    register_extractor(Extractor('csv', 'CSV', TEXT_TYPE, ('.csv',), extract_csv))
+    assert get_extractor(TEXT_TYPE).name == 'csv'
+    assert get_file_type('data.csv') == TEXT_TYPE
+
+    document_id = DocumentProcessor('data.csv', b'name,size\nalpha,1\n').process_and_save()
+    assert [section['title'] for section in document_sections.find({'document_id': document_id})] == ['Data']
+    assert document_contents.find_one({'document_id': document_id})['content_type'] == 'table'
+
+
+def test_doc_without_converter_stores_placeholder(monkeypatch):
+    monkeypatch.setattr(extractors, 'get_doc_converter', lambda: None)
+
+    processor = DocumentProcessor('legacy.doc', OLE_SIGNATURE + b'\x00' * 504)
+    document_id = processor.process_and_save()
+
+    assert processor.status == 'processed'
+    contents = list(document_contents.find({'document_id': document_id}))
+    assert [content['content']['text'] for content in contents] == [DOC_PLACEHOLDER]
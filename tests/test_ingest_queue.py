@@ -0,0 +1,165 @@
+"""
+异步上传：入队、后台任务处理、处理状态、失败重试和中断任务的恢复（通过 Flask 测试客户端调用接口）
+"""
+import io
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+
+import pytest
+
+from database.mongo_client import documents
+from models.document_models import DocumentStatus
+from utils import ingest_queue
+from utils.document_processor import DocumentProcessor
+from utils.ingest_queue import run_ingest_job
+from utils.ingest_runs import get_stale_seconds, sweep
+from tests.conftest import make_nested_docx
+
+CONTENT = make_nested_docx([(1, 'Queued'), (0, 'alpha bravo'), (2, 'Detail'), (0, 'charlie delta')])
+
+
+class _MemoryFiles:
+    """原始文件存储（GridFS）的内存替身"""
+
+    def __init__(self):
+        self.files = {}
+
+    def put(self, data, _id, filename):
+        self.files[_id] = data if isinstance(data, bytes) else data.read()
+
+    def get(self, file_id):
+        return io.BytesIO(self.files[file_id])
+
+    def exists(self, file_id):
+        return file_id in self.files
+
+    def delete(self, file_id):
+        self.files.pop(file_id, None)
+
+
+@pytest.fixture(autouse=True)
+def queue(monkeypatch):
+    # 由测试直接执行后台任务
+    monkeypatch.setenv('INGEST_WORKER_MODE', 'external')
+    files = _MemoryFiles()
+    monkeypatch.setattr(ingest_queue, 'document_files', files)
+    return files
+
+
+def _upload(app_client, content=CONTENT, query='?async=true'):
+    return app_client.post(f'/api/documents/upload{query}',
+                           data={'file': (io.BytesIO(content), 'queued.docx')},
+                           content_type='multipart/form-data')
+
+
+def _status(app_client, document_id):
+    return app_client.get(f'/api/documents/{document_id}/status').get_json()
+
+
+def test_async_upload_is_processed_by_job(app_client, queue):
+    response = _upload(app_client)
+    assert response.status_code == 202
+    document_id = response.get_json()['document_id']
+    assert response.get_json()['status'] == DocumentStatus.PENDING.value
+    assert _status(app_client, document_id)['status'] == DocumentStatus.PENDING.value
+
+    # 处理完成前上传相同内容也检测为重复
+    duplicate = _upload(app_client).get_json()
+    assert duplicate['duplicate'] and duplicate['document_id'] == document_id
+
+    assert run_ingest_job(document_id)
+    # 任务只会被领取一次
+    assert not run_ingest_job(document_id)
+    status = _status(app_client, document_id)
+    assert status['status'] == DocumentStatus.PROCESSED.value
+    assert status['progress']['paragraphs_processed'] == 2
+    assert not queue.exists(document_id)
+
+    contents = app_client.get(f'/api/documents/{document_id}').get_json()['contents']
+    assert [content['content']['text'] for content in contents] == ['alpha bravo', 'charlie delta']
+
+
+def test_failed_job_can_be_retried(app_client, queue, monkeypatch):
+    document_id = _upload(app_client).get_json()['document_id']
+    parse = DocumentProcessor.parse
+
+    def failing_parse(self):
+        raise Exception('boom')
+
+    monkeypatch.setattr(DocumentProcessor, 'parse', failing_parse)
+    assert not run_ingest_job(document_id)
+    status = _status(app_client, document_id)
+    assert status['status'] == DocumentStatus.ERROR.value
+    assert 'boom' in status['error_message']
+    # 原始文件保留以便重试；失败的文档不再作为重复
+    assert queue.exists(document_id)
+    assert 'content_hash' not in documents.find_one({'_id': document_id})
+
+    monkeypatch.setattr(DocumentProcessor, 'parse', parse)
+    response = app_client.post(f'/api/documents/{document_id}/retry')
+    assert response.status_code == 202
+    assert response.get_json() == {'document_id': document_id, 'status': DocumentStatus.PENDING.value,
+                                   'resume_from_page': 0}
+    assert app_client.post(f'/api/documents/{document_id}/retry').status_code == 409
+
+    assert run_ingest_job(document_id)
+    assert _status(app_client, document_id)['status'] == DocumentStatus.PROCESSED.value
+    assert _upload(app_client).get_json()['duplicate']
+
+
+def test_synchronous_upload_and_unknown_documents(app_client):
+    response = _upload(app_client, query='')
+    assert response.status_code == 200
+    assert response.get_json()['status'] == DocumentStatus.PROCESSED.value
+    assert app_client.get('/api/documents/missing/status').status_code == 404
+    assert app_client.post('/api/documents/missing/retry').status_code == 404
+
+
+def test_sweep_releases_job_claimed_by_exited_worker(app_client):
+    document_id = _upload(app_client).get_json()['document_id']
+    assert ingest_queue._claim_job({'_id': document_id})
+
+    # 领取后处理进程退出，没有开始入库运行
+    claimed_at = documents.find_one({'_id': document_id})['claimed_at']
+    assert sweep(claimed_at + timedelta(seconds=10))['released'] == 0
+    assert sweep(claimed_at + timedelta(seconds=get_stale_seconds() + 1))['released'] == 1
+    doc = documents.find_one({'_id': document_id})
+    assert doc['status'] == DocumentStatus.PENDING.value
+    assert 'claimed_at' not in doc
+
+    assert run_ingest_job(document_id)
+    doc = documents.find_one({'_id': document_id})
+    assert doc['status'] == DocumentStatus.PROCESSED.value
+    assert 'claimed_at' not in doc
+
+
+class _RecordingExecutor:
+    """记录提交的任务，由测试决定何时完成"""
+
+    def __init__(self):
+        self.futures = {}
+
+    def submit(self, fn, document_id):
+        future = Future()
+        self.futures[document_id] = future
+        return future
+
+
+def test_pending_documents_are_resubmitted_once(app_client, monkeypatch):
+    executor = _RecordingExecutor()
+    monkeypatch.setattr(ingest_queue, 'get_executor', lambda: executor)
+    first = _upload(app_client).get_json()['document_id']
+    second = _upload(app_client, make_nested_docx([(0, 'echo foxtrot')])).get_json()['document_id']
+
+    # 进程重启后重新提交全部pending文档，已提交且未完成的不重复提交
+    assert ingest_queue.resubmit_pending() == 2
+    assert ingest_queue.resubmit_pending() == 0
+    assert set(executor.futures) == {first, second}
+
+    # 任务完成后，等待超过超时时间仍为pending的文档由后台维护重新提交
+    executor.futures.pop(first).set_result(False)
+    now = datetime.utcnow()
+    assert ingest_queue.run_maintenance(now)['resubmitted'] == 0
+    later = now + timedelta(seconds=get_stale_seconds() + 1)
+    assert ingest_queue.run_maintenance(later)['resubmitted'] == 1
+    assert set(executor.futures) == {first, second}
@@ -0,0 +1,116 @@
+"""
+入库运行：心跳超时运行的清理、失败运行记录的回收，以及重试时恢复内容哈希
+"""
+import hashlib
+from datetime import datetime, timedelta
+
+import pytest
+
+from database.mongo_client import documents, document_contents, ensure_indexes
+from models.document_models import DocumentStatus
+from utils import ingest_runs
+from utils.document_processor import DocumentProcessor
+from utils.ingest_runs import IngestRunState, sweep
+from tests.conftest import make_nested_docx
+
+OUTLINE = [(1, 'Overview'), (0, 'alpha bravo charlie'), (2, 'Detail'), (0, 'delta echo foxtrot')]
+
+
+@pytest.fixture(autouse=True)
+def indexes():
+    ensure_indexes()
+
+
+def _insert_stale_run(document_id, heartbeat_at, content_hash='stale-hash'):
+    documents.insert_one({
+        '_id': document_id,
+        'filename': 'stale.docx',
+        'status': DocumentStatus.PROCESSING.value,
+        'content_hash': content_hash,
+        'ingest_run': {
+            '_id': 'run-1', 'attempt': 1, 'resumable': False, 'state': IngestRunState.RUNNING.value,
+            'started_at': heartbeat_at, 'heartbeat_at': heartbeat_at, 'checkpoint': None
+        }
+    })
+    document_contents.insert_one({'_id': f'{document_id}-content', 'document_id': document_id, 'run_id': 'run-1', 'run_segment': 0})
+
+
+def test_sweep_abandons_stale_run_and_collects_its_records():
+    now = datetime.utcnow()
+    _insert_stale_run('stale', now - timedelta(seconds=ingest_runs.DEFAULT_STALE_SECONDS + 1))
+    _insert_stale_run('alive', now - timedelta(seconds=10), content_hash='alive-hash')
+
+    assert sweep(now) == {'released': 0, 'abandoned': 1, 'collected': 1}
+
+    stale = documents.find_one({'_id': 'stale'})
+    assert stale['status'] == DocumentStatus.ERROR.value
+    assert stale['error_message'] == ingest_runs.ABANDONED_MESSAGE
+    assert 'content_hash' not in stale
+    # 不可续传的运行没有保留期，记录在同一次清理中被删除
+    assert 'ingest_run' not in stale
+    assert document_contents.count_documents({'document_id': 'stale'}) == 0
+
+    alive = documents.find_one({'_id': 'alive'})
+    assert alive['status'] == DocumentStatus.PROCESSING.value
+    assert alive['ingest_run']['state'] == IngestRunState.RUNNING.value
+    assert document_contents.count_documents({'document_id': 'alive'}) == 1
+
+
+def test_sweep_handles_one_batch_per_pass():
+    now = datetime.utcnow()
+    stale_at = now - timedelta(seconds=ingest_runs.DEFAULT_STALE_SECONDS + 1)
+    for index in range(3):
+        _insert_stale_run(f'stale-{index}', stale_at, content_hash=f'hash-{index}')
+
+    assert sweep(now, batch_size=2) == {'released': 0, 'abandoned': 2, 'collected': 2}
+    assert sweep(now, batch_size=2) == {'released': 0, 'abandoned': 1, 'collected': 1}
+    assert sweep(now, batch_size=2) == {'released': 0, 'abandoned': 0, 'collected': 0}
+    assert document_contents.count_documents({}) == 0
+
+
+def test_synchronous_upload_does_not_sweep():
+    _insert_stale_run('stale', datetime.utcnow() - timedelta(days=1))
+
+    DocumentProcessor('a.docx', make_nested_docx(OUTLINE)).process_and_save()
+
+    # 清理由后台维护线程和 worker 执行，不在上传请求中执行
+    assert documents.find_one({'_id': 'stale'})['status'] == DocumentStatus.PROCESSING.value
+
+
+def _failed_queued_document(document_id, filename='a.docx'):
+    """处理失败后被重试领取的异步上传文档：内容哈希已在失败时移除"""
+    documents.insert_one({
+        '_id': document_id,
+        'filename': filename,
+        'status': DocumentStatus.PROCESSING.value,
+        'error_message': '处理文档时出错'
+    })
+
+
+def test_retry_restores_content_hash():
+    content = make_nested_docx(OUTLINE)
+    _failed_queued_document('queued')
+
+    DocumentProcessor('a.docx', content, document_id='queued', resumable=True).process_and_save()
+
+    doc = documents.find_one({'_id': 'queued'})
+    assert doc['status'] == DocumentStatus.PROCESSED.value
+    assert doc['content_hash'] == hashlib.sha256(content).hexdigest()
+    # 相同内容的上传检测为重复
+    processor = DocumentProcessor('b.docx', content)
+    assert processor.process_and_save() == 'queued'
+    assert processor.duplicate_of['_id'] == 'queued'
+
+
+def test_retry_fails_when_same_content_was_uploaded_meanwhile():
+    content = make_nested_docx(OUTLINE)
+    _failed_queued_document('queued')
+    existing = DocumentProcessor('b.docx', content).process_and_save()
+
+    with pytest.raises(Exception, match=existing):
+        DocumentProcessor('a.docx', content, document_id='queued', resumable=True).process_and_save()
+
+    doc = documents.find_one({'_id': 'queued'})
+    assert doc['status'] == DocumentStatus.ERROR.value
+    assert 'content_hash' not in doc
+    assert documents.find_one({'_id': existing})['content_hash'] == hashlib.sha256(content).hexdigest()
@@ -0,0 +1,60 @@
+"""
+全文检索：分词、倒排记录和 BM25 检索
+"""
+import pytest
+
+from database.mongo_client import documents
+from models.document_models import DocumentStatus
+from utils.document_processor import DocumentProcessor
+from utils.search_index import build_postings, content_text, search, tokenize
+from tests.conftest import make_nested_docx
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('Hello, World! v2 API_key', ['hello', 'world', 'v2', 'api', 'key']),
+    # 中日韩文本按相邻二元组切分，单字保留
+    ('数据库索引', ['数据', '据库', '库索', '索引']),
+    ('是 MongoDB 的', ['是', 'mongodb', '的']),
+    ('向量search检索', ['向量', 'search', '检索']),
+    ('', []),
+    ('-- !! --', []),
+])
+def test_tokenize(text, expected):
+    assert tokenize(text) == expected
+
+
+def test_table_text_and_postings():
+    content = {
+        '_id': 'c-1', 'document_id': 'doc', 'section_id': 's-1', 'content_type': 'table',
+        'content': {'headers': ['Name', 'Name'], 'rows': [['alpha', ''], ['alpha', 'beta']]}
+    }
+    assert content_text(content) == 'Name\nName\nalpha\nalpha\nbeta'
+    postings = {posting['term']: posting for posting in build_postings(content)}
+    assert {term: posting['tf'] for term, posting in postings.items()} == {'name': 2, 'alpha': 2, 'beta': 1}
+    assert all(posting['length'] == 5 and posting['content_id'] == 'c-1' for posting in postings.values())
+    assert build_postings(dict(content, content_type='text', content={'text': '  '})) == []
+
+
+def _ingest(filename, paragraphs):
+    return DocumentProcessor(filename, make_nested_docx([(1, 'Heading')] + [(0, p) for p in paragraphs])) \
+        .process_and_save()
+
+
+def test_search_ranks_by_bm25_and_filters_documents():
+    first = _ingest('a.docx', ['kiwi kiwi kiwi mango', 'plain text only'])
+    second = _ingest('b.docx', ['kiwi and other fruit, 猕猴桃'])
+
+    hits = search('KIWI')
+    assert [hit['document_id'] for hit in hits] == [first, second]
+    assert hits[0]['score'] > hits[1]['score']
+    assert hits[0]['filename'] == 'a.docx' and hits[0]['section_title'] == 'Heading'
+    assert 'kiwi' in hits[0]['snippet']
+
+    assert [hit['document_id'] for hit in search('kiwi', document_id=second)] == [second]
+    assert [hit['document_id'] for hit in search('猕猴')] == [second]
+    assert search('durian') == []
+    assert search('!!') == []
+
+    # 未处理完成的文档不出现在结果中
+    documents.update_one({'_id': first}, {'$set': {'status': DocumentStatus.PROCESSING.value}})
+    assert [hit['document_id'] for hit in search('kiwi')] == [second]
@@ -0,0 +1,214 @@
+"""
+向量索引：精确和近似检索、按文档增量更新、向量编码，以及版本更新替换相同数量的内容块后相似内容检索使用新的向量
+"""
+import threading
+
+import numpy as np
+import pytest
+
+from database.mongo_client import content_embeddings, document_contents
+from utils import vector_index
+from utils.document_processor import DocumentProcessor
+from utils.document_versions import update_document
+from utils.embeddings import Embedder, HashingEmbedder, decode_vector, encode_vector, get_embedder, normalize_rows
+from tests.conftest import make_nested_docx
+
+
+def _outline(paragraph):
+    return [(1, 'Overview'), (0, 'alpha bravo charlie delta'), (0, paragraph),
+            (1, 'Appendix'), (0, 'echo foxtrot golf hotel')]
+
+
+@pytest.fixture(autouse=True)
+def fresh_holder(monkeypatch):
+    monkeypatch.setattr(vector_index, '_holder', vector_index._IndexHolder())
+
+
+def _random_index(count=300, dimension=16, **options):
+    rng = np.random.default_rng(1)
+    vectors = normalize_rows(rng.standard_normal((count, dimension)).astype(np.float32))
+    index = vector_index.VectorIndex(dimension, **options)
+    ids = [f'c{i}' for i in range(count)]
+    index.build(ids, [f'd{i % 3}' for i in range(count)], ['s'] * count, vectors)
+    return index, ids, vectors
+
+
+def _exact_top(vectors, ids, query, k, rows=None):
+    rows = np.arange(len(ids)) if rows is None else rows
+    scores = vectors[rows] @ query
+    return [ids[rows[i]] for i in np.argsort(-scores, kind='stable')[:k]]
+
+
+def test_flat_search_is_exact():
+    index, ids, vectors = _random_index()
+    queries = vectors[:5] + 0.1
+    results = index.search(queries, 7)
+    for query, result in zip(queries, results):
+        assert [content_id for content_id, _ in result] == _exact_top(vectors, ids, query, 7)
+        scores = [score for _, score in result]
+        assert scores == sorted(scores, reverse=True)
+
+
+def test_search_filters_document_and_excluded_ids():
+    index, ids, vectors = _random_index()
+    query = vectors[3]
+    rows = np.arange(0, len(ids), 3)
+    assert [c for c, _ in index.search(query, 5, document_id='d0')[0]] == _exact_top(vectors, ids, query, 5, rows)
+    assert index.search(query, 5, document_id='missing') == [[]]
+
+    result = index.search(query, 5, exclude_ids=['c3'])[0]
+    assert 'c3' not in dict(result)
+    assert [c for c, _ in result] == _exact_top(vectors, ids, query, 6)[1:]
+    assert index.search(query, 0) == [[]]
+    assert vector_index.VectorIndex(16).search(query, 5) == [[]]
+
+
+def test_ivf_probing_all_lists_matches_flat():
+    flat, ids, vectors = _random_index()
+    ivf, _, _ = _random_index(mode='ivf', n_lists=8, n_probe=8)
+    query = vectors[10]
+    assert ivf.search(query, 10) == flat.search(query, 10)
+    # 只检索部分簇时结果近似，但向量本身所在的簇总会被检索
+    partial, _, _ = _random_index(mode='ivf', n_lists=8, n_probe=1)
+    assert partial.search(query, 1)[0][0][0] == 'c10'
+
+
+def test_quantized_index_keeps_ranking_close():
+    index, ids, vectors = _random_index(quantize=True)
+    assert index._matrix.dtype == np.int8
+    np.testing.assert_allclose(index.vector('c4'), vectors[4], atol=0.02)
+    assert index.search(vectors[4], 1)[0][0][0] == 'c4'
+    assert index.vector('missing') is None
+
+
+@pytest.mark.parametrize('options', [{}, {'quantize': True}, {'mode': 'ivf', 'n_lists': 8, 'n_probe': 8}])
+def test_replace_documents_matches_rebuilt_index(options):
+    index, ids, vectors = _random_index(**options)
+    rng = np.random.default_rng(2)
+    new_vectors = normalize_rows(rng.standard_normal((4, 16)).astype(np.float32))
+    # d0 的向量被替换，d1 被移除，d3 是新文档
+    updated = index.replace_documents({
+        'd0': (['n0', 'n1'], ['s', 's'], new_vectors[:2]),
+        'd1': ([], [], np.zeros((0, 16), dtype=np.float32)),
+        'd3': (['n2', 'n3'], ['s', 's'], new_vectors[2:]),
+    })
+    assert len(index) == 300 and 'n0' not in index.ids
+
+    kept = [row for row in range(300) if row % 3 == 2]
+    expected = vector_index.VectorIndex(16, **options)
+    expected.build([ids[row] for row in kept] + ['n0', 'n1', 'n2', 'n3'],
+                   ['d2'] * len(kept) + ['d0', 'd0', 'd3', 'd3'], ['s'] * (len(kept) + 4),
+                   np.concatenate([vectors[kept], new_vectors]))
+    assert updated.ids == expected.ids
+    for query in [new_vectors[0], new_vectors[3], vectors[2]]:
+        assert updated.search(query, 5) == expected.search(query, 5)
+    assert [c for c, _ in updated.search(new_vectors[2], 5, document_id='d3')[0]] == ['n2', 'n3']
+    assert updated.search(vectors[1], 5, document_id='d1') == [[]]
+
+
+def test_vector_codec_and_hashing_embedder():
+    vector = np.array([0.5, -1.25, 3.0], dtype=np.float32)
+    np.testing.assert_array_equal(decode_vector(bytes(encode_vector(vector))), vector)
+
+    embedder = HashingEmbedder(64)
+    vectors = embedder.embed(['alpha beta beta', 'alpha beta beta', ''])
+    assert vectors.shape == (3, 64)
+    np.testing.assert_allclose(np.linalg.norm(vectors[:2], axis=1), 1.0, rtol=1e-6)
+    np.testing.assert_array_equal(vectors[0], vectors[1])
+    assert not vectors[2].any()
+    with pytest.raises(ValueError):
+        HashingEmbedder(0)
+    with pytest.raises(TypeError):
+        Embedder()
+
+
+def test_find_similar_by_content_excludes_itself():
+    document_id = DocumentProcessor('v.docx', make_nested_docx(_outline('india juliet kilo lima'))).process_and_save()
+    content_id = _content_id(document_id, 'india juliet kilo lima')
+    hits = vector_index.find_similar(content_id=content_id)
+    assert hits and content_id not in {hit['content_id'] for hit in hits}
+    assert vector_index.find_similar(content_id='missing') == []
+
+
+def _content_id(document_id, text):
+    return document_contents.find_one({'document_id': document_id, 'content.text': text})['_id']
+
+
+def test_same_size_update_replaces_vectors_in_loaded_index(monkeypatch):
+    # 不依赖定期检查：更新提交后本进程立即重新加载
+    monkeypatch.setenv('VECTOR_INDEX_REFRESH_SECONDS', '3600')
+    document_id = DocumentProcessor('v.docx', make_nested_docx(_outline('india juliet kilo lima'))).process_and_save()
+    old_id = _content_id(document_id, 'india juliet kilo lima')
+    assert vector_index.find_similar(text='india juliet kilo lima', limit=1)[0]['content_id'] == old_id
+    count = content_embeddings.count_documents({})
+
+    result = update_document(document_id, 'v.docx', make_nested_docx(_outline('zulu yankee xray whiskey')))
+    assert result['contents']['inserted'] == result['contents']['removed'] == 1
+    assert content_embeddings.count_documents({}) == count
+
+    new_id = _content_id(document_id, 'zulu yankee xray whiskey')
+    hits = vector_index.find_similar(text='zulu yankee xray whiskey', limit=10)
+    assert hits[0]['content_id'] == new_id
+    assert old_id not in {hit['content_id'] for hit in hits}
+
+
+def test_other_holders_reload_when_generation_changes(monkeypatch):
+    """其他进程的索引在定期检查时发现版本号变化（向量数不变）后重新加载"""
+    monkeypatch.setenv('VECTOR_INDEX_REFRESH_SECONDS', '0')
+    DocumentProcessor('v.docx', make_nested_docx(_outline('india juliet kilo lima'))).process_and_save()
+    embedder = get_embedder()
+    holder = vector_index._IndexHolder()
+    loaded = holder.get(embedder)
+    assert holder.get(embedder) is loaded
+
+    vector_index.notify_embeddings_changed()
+    assert holder.get(embedder) is not loaded
+
+
+def test_other_holders_update_changed_documents_only(monkeypatch):
+    monkeypatch.setenv('VECTOR_INDEX_REFRESH_SECONDS', '0')
+    DocumentProcessor('v.docx', make_nested_docx(_outline('india juliet kilo lima'))).process_and_save()
+    embedder = get_embedder()
+    holder = vector_index._IndexHolder()
+    loaded = holder.get(embedder)
+
+    def full_load(embedder):
+        raise AssertionError('不应全量加载')
+
+    monkeypatch.setattr(vector_index, 'load_vector_index', full_load)
+    document_id = DocumentProcessor('w.docx', make_nested_docx(_outline('mike november oscar papa'))).process_and_save()
+    updated = holder.get(embedder)
+    assert updated is not loaded
+    assert len(updated) == content_embeddings.count_documents({})
+    new_id = _content_id(document_id, 'mike november oscar papa')
+    query = embedder.embed(['mike november oscar papa'])[0]
+    assert updated.search(query, 1)[0][0][0] == new_id
+
+
+def test_refresh_does_not_block_readers(monkeypatch):
+    monkeypatch.setenv('VECTOR_INDEX_REFRESH_SECONDS', '0')
+    DocumentProcessor('v.docx', make_nested_docx(_outline('india juliet kilo lima'))).process_and_save()
+    embedder = get_embedder()
+    holder = vector_index._IndexHolder()
+    loaded = holder.get(embedder)
+
+    started, release = threading.Event(), threading.Event()
+    refresh = vector_index._IndexHolder._refresh
+
+    def slow_refresh(*args):
+        started.set()
+        release.wait(5)
+        return refresh(*args)
+
+    monkeypatch.setattr(vector_index._IndexHolder, '_refresh', staticmethod(slow_refresh))
+    vector_index.notify_embeddings_changed()
+    refreshing = threading.Thread(target=holder.get, args=(embedder,))
+    refreshing.start()
+    try:
+        assert started.wait(5)
+        # 刷新期间其他线程直接使用当前索引
+        assert holder.get(embedder) is loaded
+    finally:
+        release.set()
+        refreshing.join(5)
+    assert holder.get(embedder) is not loaded
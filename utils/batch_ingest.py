@@ -0,0 +1,299 @@
+import os
+import time
+import shutil
+import logging
+import tempfile
+import threading
+import zipfile
+import multiprocessing
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Union
+
+from models.document_models import DocumentStatus
+from utils.bulk_writer import BulkWriter
+from utils.document_processor import DocumentProcessor
+from utils.extractors import get_file_type
+from utils.ingest_queue import submit_document
+
+logger = logging.getLogger(__name__)
+
+# 批量处理方式：thread 在当前进程的线程池中处理；process 在派生的进程池中处理，可利用多核解析文档
+BATCH_MODES = ('thread', 'process')
+# 每组文件由一个工作线程/进程依次处理并共用批量写入缓冲区
+DEFAULT_BATCH_GROUP_SIZE = 16
+# 压缩包的文件数和解压后总大小上限，防止压缩炸弹
+DEFAULT_BATCH_MAX_FILES = 1000
+DEFAULT_BATCH_MAX_UNCOMPRESSED_BYTES = 1024 * 1024 * 1024  # 1GB
+# 压缩包中忽略的系统目录
+IGNORED_ARCHIVE_PREFIXES = ('__MACOSX/',)
+SKIPPED_STATUS = 'skipped'
+
+
+class InvalidArchiveError(ValueError):
+    """压缩包无法读取或超出限制"""
+
+
+class BatchFile:
+    """批量上传中的一个文件
+
+    content 为文件内容（字节串或文件流，只能用于线程池方式）；path 为本地文件路径，
+    temporary 为真时处理完成后删除该文件（从压缩包中解出的临时文件）。
+    """
+
+    def __init__(self, filename: str, content: Union[bytes, BinaryIO, None] = None,
+                 path: Optional[str] = None, temporary: bool = False):
+        self.filename = filename
+        self.content = content
+        self.path = path
+        self.temporary = temporary
+
+
+def _get_env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        logger.warning(f"Invalid {name} value, using default: {default}")
+        return default
+
+
+def get_batch_max_workers() -> int:
+    """读取批量处理的并发数配置（默认为CPU核数）"""
+    return max(1, _get_env_int('BATCH_MAX_WORKERS', os.cpu_count() or 1))
+
+
+def get_batch_group_size() -> int:
+    """读取每组文件数配置"""
+    return max(1, _get_env_int('BATCH_GROUP_SIZE', DEFAULT_BATCH_GROUP_SIZE))
+
+
+def get_batch_max_files() -> int:
+    """读取单次批量上传的文件数上限配置"""
+    return _get_env_int('BATCH_MAX_FILES', DEFAULT_BATCH_MAX_FILES)
+
+
+def get_batch_max_uncompressed_bytes() -> int:
+    """读取压缩包解压后总大小上限配置"""
+    return _get_env_int('BATCH_MAX_UNCOMPRESSED_BYTES', DEFAULT_BATCH_MAX_UNCOMPRESSED_BYTES)
+
+
+def is_supported_file(filename: str) -> bool:
+    """是否为可以处理的文档类型"""
+    return get_file_type(filename) != 'application/octet-stream'
+
+
+def spool_to_temp_file(filename: str, stream: BinaryIO) -> BatchFile:
+    """将文件流写入临时文件（配置了 UPLOAD_FOLDER 时写入该目录），用于进程池方式"""
+    upload_folder = os.getenv('UPLOAD_FOLDER')
+    if upload_folder:
+        os.makedirs(upload_folder, exist_ok=True)
+    with stream, tempfile.NamedTemporaryFile(prefix='batch-', dir=upload_folder or None, delete=False) as target:
+        shutil.copyfileobj(stream, target)
+    return BatchFile(filename, path=target.name, temporary=True)
+
+
+def iter_archive_files(archive_file: Union[str, BinaryIO], extract: bool = False,
+                       max_files: Optional[int] = None,
+                       max_uncompressed_bytes: Optional[int] = None) -> Iterator[BatchFile]:
+    """按顺序产出 zip 压缩包中的文件
+
+    extract 为假时产出可直接读取的压缩包内文件流（线程池方式）；为真时逐个解出到临时文件（进程池方式）。
+    文件数和解压后总大小在调用时按压缩包目录检查，超出限制时立即抛出 InvalidArchiveError。
+    """
+    try:
+        archive = zipfile.ZipFile(archive_file)
+    except (zipfile.BadZipFile, OSError) as e:
+        raise InvalidArchiveError(f"无法读取压缩包: {str(e)}")
+
+    entries = [
+        info for info in archive.infolist()
+        if not info.is_dir() and not info.filename.startswith(IGNORED_ARCHIVE_PREFIXES)
+    ]
+    if max_files is not None and len(entries) > max_files:
+        archive.close()
+        raise InvalidArchiveError(f"压缩包中的文件数超过上限 {max_files}")
+    total_size = sum(info.file_size for info in entries)
+    if max_uncompressed_bytes is not None and total_size > max_uncompressed_bytes:
+        archive.close()
+        raise InvalidArchiveError(f"压缩包解压后的大小超过上限 {max_uncompressed_bytes} 字节")
+    return _iter_archive_entries(archive, entries, extract)
+
+
+def _iter_archive_entries(archive: zipfile.ZipFile, entries: List[zipfile.ZipInfo],
+                          extract: bool) -> Iterator[BatchFile]:
+    # 已打开的压缩包内文件流持有对压缩包的引用，关闭压缩包不影响仍在处理的文件
+    with archive:
+        for info in entries:
+            filename = os.path.basename(info.filename)
+            if not is_supported_file(filename):
+                yield BatchFile(info.filename)
+            elif extract:
+                yield spool_to_temp_file(filename, archive.open(info))
+            else:
+                yield BatchFile(filename, content=archive.open(info))
+
+
+def iter_path_files(paths: Iterable[str], extract_archives: bool = False) -> Iterator[BatchFile]:
+    """按顺序产出本地路径中的文件：目录递归展开，.zip 文件展开为其中的文件"""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, filenames in os.walk(path):
+                dirs.sort()
+                yield from iter_path_files(
+                    (os.path.join(root, filename) for filename in sorted(filenames)),
+                    extract_archives
+                )
+        elif path.lower().endswith('.zip'):
+            yield from iter_archive_files(path, extract=extract_archives)
+        else:
+            yield BatchFile(os.path.basename(path), path=path)
+
+
+def _result(filename: str, **fields) -> Dict[str, Any]:
+    return dict({'filename': filename, 'document_id': None, 'status': None,
+                 'duplicate': False, 'error': None}, **fields)
+
+
+def _start_file(batch_file: BatchFile, writer: BulkWriter) -> Union[DocumentProcessor, Dict[str, Any]]:
+    """处理一个文件；记录仍在共用缓冲区中时返回处理器，已有结论（跳过、重复、失败）时返回结果"""
+    if not is_supported_file(batch_file.filename):
+        return _result(batch_file.filename, status=SKIPPED_STATUS, error='不支持的文件类型')
+
+    processor = None
+    stream = None
+    try:
+        content = batch_file.content
+        if batch_file.path:
+            content = stream = open(batch_file.path, 'rb')
+        processor = DocumentProcessor(batch_file.filename, content, writer=writer)
+        document_id = processor.process_and_save()
+        if processor.duplicate_of:
+            return _result(batch_file.filename, document_id=str(document_id),
+                           status=processor.duplicate_of['status'], duplicate=True)
+        return processor
+    except Exception as e:
+        logger.error(f"Batch ingest of {batch_file.filename} failed: {e}")
+        return _result(batch_file.filename,
+                       document_id=processor.document_id if processor else None,
+                       status=DocumentStatus.ERROR.value, error=str(e))
+    finally:
+        if stream is not None:
+            stream.close()
+        elif hasattr(batch_file.content, 'close'):
+            batch_file.content.close()
+        if batch_file.temporary:
+            try:
+                os.unlink(batch_file.path)
+            except FileNotFoundError:
+                pass
+
+
+def ingest_group(batch_files: List[BatchFile]) -> List[Dict[str, Any]]:
+    """依次处理一组文件，返回各文件的结果
+
+    组内文档共用一个批量写入缓冲区，多个小文档的章节、内容和索引记录合并为少量批次写入；
+    各文档在其记录全部写入后才标记为处理完成，写入失败时标记为处理失败。
+    """
+    writer = BulkWriter()
+    started = [_start_file(batch_file, writer) for batch_file in batch_files]
+    try:
+        writer.flush()
+    except Exception as e:
+        # 受影响文档的失败状态已在刷新回调中记录
+        logger.error(f"Batch group write failed: {e}")
+
+    results = []
+    for batch_file, item in zip(batch_files, started):
+        if isinstance(item, dict):
+            results.append(item)
+        else:
+            results.append(_result(batch_file.filename, document_id=item.document_id,
+                                   status=item.status, error=item.error_message))
+    return results
+
+
+def _iter_groups(files: Iterable[BatchFile], group_size: int) -> Iterator[List[BatchFile]]:
+    group: List[BatchFile] = []
+    for batch_file in files:
+        group.append(batch_file)
+        if len(group) >= group_size:
+            yield group
+            group = []
+    if group:
+        yield group
+
+
+def _init_batch_process():
+    # 每个批量处理进程依次处理文件，未配置时只为其保留一个解析进程，避免进程数成倍增长
+    os.environ.setdefault('EXTRACT_WORKERS', '1')
+
+
+def ingest_batch(files: Iterable[BatchFile], max_workers: Optional[int] = None,
+                 mode: str = 'thread', group_size: Optional[int] = None) -> Dict[str, Any]:
+    """按组并发处理一批文件，返回汇总数和按输入顺序排列的逐文件结果清单
+
+    每组（BATCH_GROUP_SIZE 个文件）由一个工作线程或进程依次处理，组内文档合并批量写入；
+    同时在处理中（包括已读取、等待处理）的组数不超过并发数的两倍，
+    使解出的临时文件和缓冲的上传内容不会随批次大小增长。
+    """
+    if mode not in BATCH_MODES:
+        raise ValueError(f"不支持的批量处理方式: {mode}")
+    max_workers = max_workers or get_batch_max_workers()
+    group_size = group_size or get_batch_group_size()
+    started = time.perf_counter()
+
+    if mode == 'process':
+        # 使用spawn避免在持有数据库连接的进程中fork
+        executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_batch_process
+        )
+    else:
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='batch-ingest')
+
+    slots = threading.BoundedSemaphore(max_workers * 2)
+    futures: List[Future] = []
+    with executor:
+        for group in _iter_groups(files, group_size):
+            slots.acquire()
+            future = executor.submit(ingest_group, group)
+            future.add_done_callback(lambda _: slots.release())
+            futures.append(future)
+
+    return _summarize([result for future in futures for result in future.result()], started)
+
+
+def submit_batch(files: Iterable[BatchFile]) -> Dict[str, Any]:
+    """将一批文件逐个保存并加入后台处理队列，返回与 ingest_batch 相同格式的结果清单"""
+    started = time.perf_counter()
+    results = []
+    for batch_file in files:
+        if not is_supported_file(batch_file.filename):
+            results.append(_result(batch_file.filename, status=SKIPPED_STATUS, error='不支持的文件类型'))
+            continue
+        content = batch_file.content if batch_file.content is not None else open(batch_file.path, 'rb')
+        try:
+            results.append(_result(batch_file.filename, **submit_document(batch_file.filename, content)))
+        finally:
+            if hasattr(content, 'close'):
+                content.close()
+            if batch_file.temporary:
+                os.unlink(batch_file.path)
+    return _summarize(results, started)
+
+
+def _summarize(results: List[Dict[str, Any]], started: float) -> Dict[str, Any]:
+    summary = {
+        'total': len(results),
+        'processed': sum(1 for r in results if r['status'] == DocumentStatus.PROCESSED.value and not r['duplicate']),
+        'queued': sum(1 for r in results if r['status'] == DocumentStatus.PENDING.value and not r['duplicate']),
+        'duplicates': sum(1 for r in results if r['duplicate']),
+        'failed': sum(1 for r in results if r['status'] == DocumentStatus.ERROR.value),
+        'skipped': sum(1 for r in results if r['status'] == SKIPPED_STATUS),
+        'elapsed_seconds': round(time.perf_counter() - started, 3),
+        'results': results
+    }
+    logger.info(f"Batch finished: {summary['processed']} processed, {summary['queued']} queued, "
+                f"{summary['duplicates']} duplicates, "
+                f"{summary['failed']} failed, {summary['skipped']} skipped in {summary['elapsed_seconds']}s")
+    return summary
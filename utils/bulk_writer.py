@@ -0,0 +1,112 @@
+from typing import Any, Callable, Dict, List, Optional
+from pymongo.collection import Collection
+from utils.metrics import timed
+
+# 默认批量写入参数
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_MAX_BUFFER_BYTES = 8 * 1024 * 1024  # 8MB
+
+
+def estimate_size(value: Any) -> int:
+    """粗略估算文档占用的字节数（避免为计数而重复进行BSON编码）"""
+    if isinstance(value, str):
+        return len(value) * 2 + 8
+    if isinstance(value, (bytes, bytearray)):
+        return len(value) + 8
+    if isinstance(value, dict):
+        return sum(len(k) + estimate_size(v) for k, v in value.items()) + 8
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_size(v) for v in value) + 8
+    return 16
+
+
+class BulkWriter:
+    """批量写入缓冲区
+
+    章节和内容先在内存中累积，再按集合分块通过有序 insert_many 写入，
+    从而将逐条 insert_one 的大量往返合并为少量批次。
+    批量上传时同一组的多个文档共用一个缓冲区，各文档的记录合并写入。
+    """
+
+    def __init__(self,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 max_buffer_bytes: int = DEFAULT_MAX_BUFFER_BYTES,
+                 on_flush: Optional[Callable[[], None]] = None):
+        if batch_size < 1:
+            raise ValueError("batch_size 必须大于0")
+        self.batch_size = batch_size
+        self.max_buffer_bytes = max_buffer_bytes
+        # 每次刷新完成后的回调（例如上报处理进度）
+        self.on_flush = on_flush
+        # 保持集合首次写入的顺序（章节先于内容写入，保证父记录先落库）
+        self._buffers: Dict[str, List[Dict[str, Any]]] = {}
+        self._collections: Dict[str, Collection] = {}
+        self._buffered_count = 0
+        self._buffered_bytes = 0
+        self.round_trips = 0
+        # 当前缓冲区中的记录写入后需要执行的回调
+        self._flush_callbacks: List[Callable[[Optional[Exception]], None]] = []
+
+    def add(self, collection: Collection, doc: Dict[str, Any]):
+        """添加一条待写入记录，达到批量大小或内存上限时自动刷新"""
+        name = collection.name
+        if name not in self._buffers:
+            self._buffers[name] = []
+            self._collections[name] = collection
+        self._buffers[name].append(doc)
+        self._buffered_count += 1
+        self._buffered_bytes += estimate_size(doc)
+
+        if self._buffered_count >= self.batch_size or self._buffered_bytes >= self.max_buffer_bytes:
+            self.flush()
+
+    def flush(self):
+        """将缓冲区中的记录按集合分块写入数据库"""
+        callbacks = self._flush_callbacks
+        self._flush_callbacks = []
+        if not self._buffered_count:
+            for callback in callbacks:
+                callback(None)
+            return
+
+        try:
+            with timed('db_write'):
+                for name, docs in self._buffers.items():
+                    collection = self._collections[name]
+                    for start in range(0, len(docs), self.batch_size):
+                        collection.insert_many(docs[start:start + self.batch_size], ordered=True)
+                        self.round_trips += 1
+        except Exception as e:
+            self.clear()
+            for callback in callbacks:
+                callback(e)
+            raise
+
+        self.clear()
+        if self.on_flush:
+            self.on_flush()
+        for callback in callbacks:
+            callback(None)
+
+    def after_flush(self, callback: Callable[[Optional[Exception]], None]):
+        """登记在缓冲区中现有记录写入后执行的回调；写入失败时以异常作为参数调用"""
+        self._flush_callbacks.append(callback)
+
+    def clear(self):
+        """丢弃缓冲区中的记录"""
+        for docs in self._buffers.values():
+            docs.clear()
+        self._buffered_count = 0
+        self._buffered_bytes = 0
+
+    def discard(self, document_id: str):
+        """只丢弃缓冲区中属于指定文档的记录（共用缓冲区时其他文档的记录不受影响）"""
+        for docs in self._buffers.values():
+            kept = []
+            for doc in docs:
+                if doc.get('document_id') == document_id:
+                    self._buffered_count -= 1
+                    self._buffered_bytes -= estimate_size(doc)
+                else:
+                    kept.append(doc)
+            docs[:] = kept
\ No newline at end of file
@@ -0,0 +1,188 @@
+"""
+内容块的紧凑存储格式
+
+开启后（CONTENT_ENCODING=compact）：
+- 表格按列存储：content = {'headers': [...], 'layout': 'columnar', 'columns': [[第1列各行], ...]}，
+  行长度不一（合并单元格）时较短的行以 None 补齐
+- 序列化后超过 CONTENT_COMPRESS_THRESHOLD 字节的文本和表格数据压缩后存为二进制：
+  文本为 {'compression': 'zlib', 'packed_text': Binary}，
+  表格为 {'headers': [...], 'layout': 'columnar', 'compression': 'zlib', 'packed_columns': Binary}
+  表头始终不压缩，省略表格行数据的读取仍可返回表头
+- 压缩算法优先使用 zstd（需安装 zstandard），未安装时使用 zlib
+
+读取时由 decode_content 还原为原始格式（{'text': ...} 或 {'headers': ..., 'rows': ...}），
+未编码的旧数据原样返回，两种格式可以共存。
+"""
+import os
+import json
+import zlib
+import logging
+from typing import Any, Dict, List, Optional
+
+from bson import Binary
+
+from models.document_models import ContentType
+
+logger = logging.getLogger(__name__)
+
+CONTENT_ENCODINGS = ('raw', 'compact')
+DEFAULT_CONTENT_ENCODING = 'raw'
+DEFAULT_COMPRESS_THRESHOLD = 4096
+COMPRESSIONS = ('zstd', 'zlib')
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+COLUMNAR_LAYOUT = 'columnar'
+
+
+def _load_zstd():
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        return None
+
+
+_zstd = _load_zstd()
+
+
+def get_content_encoding() -> str:
+    """读取内容块存储格式配置（raw 或 compact）"""
+    encoding = os.getenv('CONTENT_ENCODING', DEFAULT_CONTENT_ENCODING)
+    if encoding not in CONTENT_ENCODINGS:
+        logger.warning(f"Invalid CONTENT_ENCODING value, using default: {DEFAULT_CONTENT_ENCODING}")
+        return DEFAULT_CONTENT_ENCODING
+    return encoding
+
+
+def get_compress_threshold() -> int:
+    """读取压缩阈值配置（字节）"""
+    try:
+        return int(os.getenv('CONTENT_COMPRESS_THRESHOLD', DEFAULT_COMPRESS_THRESHOLD))
+    except (TypeError, ValueError):
+        logger.warning(f"Invalid CONTENT_COMPRESS_THRESHOLD value, using default: {DEFAULT_COMPRESS_THRESHOLD}")
+        return DEFAULT_COMPRESS_THRESHOLD
+
+
+def get_compression() -> str:
+    """读取压缩算法配置；未安装 zstandard 时使用 zlib"""
+    default = 'zstd' if _zstd is not None else 'zlib'
+    compression = os.getenv('CONTENT_COMPRESSION', default)
+    if compression not in COMPRESSIONS:
+        logger.warning(f"Invalid CONTENT_COMPRESSION value, using default: {default}")
+        return default
+    if compression == 'zstd' and _zstd is None:
+        logger.warning("zstandard is not installed, using zlib")
+        return 'zlib'
+    return compression
+
+
+def compress(data: bytes, compression: str) -> bytes:
+    if compression == 'zstd':
+        return _zstd.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return zlib.compress(data, ZLIB_LEVEL)
+
+
+def decompress(data: bytes, compression: str) -> bytes:
+    if compression == 'zstd':
+        if _zstd is None:
+            raise RuntimeError("读取 zstd 压缩的内容需要安装 zstandard")
+        return _zstd.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def rows_to_columns(rows: List[List[str]]) -> List[List[Optional[str]]]:
+    """行转列，较短的行以 None 补齐"""
+    width = max((len(row) for row in rows), default=0)
+    return [[row[column] if column < len(row) else None for row in rows] for column in range(width)]
+
+
+def columns_to_rows(columns: List[List[Optional[str]]]) -> List[List[str]]:
+    """列转行，去掉补齐用的 None"""
+    rows = []
+    for row in zip(*columns):
+        row = list(row)
+        while row and row[-1] is None:
+            row.pop()
+        rows.append(row)
+    return rows
+
+
+class ContentCodec:
+    """按配置将内容块编码为紧凑格式（写入时使用）"""
+
+    def __init__(self, encoding: Optional[str] = None, threshold: Optional[int] = None,
+                 compression: Optional[str] = None):
+        self.encoding = encoding or get_content_encoding()
+        if self.encoding not in CONTENT_ENCODINGS:
+            raise ValueError(f"不支持的内容存储格式: {self.encoding}")
+        self.threshold = threshold if threshold is not None else get_compress_threshold()
+        self.compression = compression or get_compression()
+
+    @property
+    def is_compact(self) -> bool:
+        return self.encoding == 'compact'
+
+    def encode(self, content_data: Dict[str, Any]) -> Dict[str, Any]:
+        """返回用于存储的内容块（不修改传入的记录）；raw 格式原样返回"""
+        if not self.is_compact:
+            return content_data
+        content = content_data.get('content') or {}
+        content_type = content_data.get('content_type')
+        if content_type == ContentType.TABLE.value and 'rows' in content:
+            encoded = self._encode_table(content)
+        elif content_type == ContentType.TEXT.value and 'text' in content:
+            encoded = self._encode_text(content)
+        else:
+            return content_data
+        return dict(content_data, content=encoded)
+
+    def _encode_text(self, content: Dict[str, Any]) -> Dict[str, Any]:
+        data = content['text'].encode('utf-8')
+        packed = self._compress_if_large(data)
+        if packed is None:
+            return content
+        return {'compression': self.compression, 'packed_text': Binary(packed)}
+
+    def _encode_table(self, content: Dict[str, Any]) -> Dict[str, Any]:
+        columns = rows_to_columns(content['rows'])
+        if not columns and content['rows']:
+            # 只有空行的表格按列存储会丢失行数
+            return content
+        encoded = {'headers': content.get('headers') or [], 'layout': COLUMNAR_LAYOUT}
+        data = json.dumps(columns, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        packed = self._compress_if_large(data)
+        if packed is None:
+            encoded['columns'] = columns
+        else:
+            encoded['compression'] = self.compression
+            encoded['packed_columns'] = Binary(packed)
+        return encoded
+
+    def _compress_if_large(self, data: bytes) -> Optional[bytes]:
+        """超过阈值且压缩后更小时返回压缩数据"""
+        if len(data) <= self.threshold:
+            return None
+        packed = compress(data, self.compression)
+        return packed if len(packed) < len(data) else None
+
+
+def decode_content(content_data: Dict[str, Any]) -> Dict[str, Any]:
+    """返回还原为原始格式的内容块（未编码时原样返回）；省略了行数据的表格只还原表头"""
+    content = content_data.get('content')
+    if not isinstance(content, dict):
+        return content_data
+
+    if 'packed_text' in content:
+        decoded = {
+            'text': decompress(bytes(content['packed_text']), content['compression']).decode('utf-8')
+        }
+    elif content.get('layout') == COLUMNAR_LAYOUT:
+        decoded = {'headers': content.get('headers') or []}
+        if 'packed_columns' in content:
+            columns = json.loads(decompress(bytes(content['packed_columns']), content['compression']))
+            decoded['rows'] = columns_to_rows(columns)
+        elif 'columns' in content:
+            decoded['rows'] = columns_to_rows(content['columns'])
+    else:
+        return content_data
+    return dict(content_data, content=decoded)
@@ -0,0 +1,174 @@
+import os
+import hashlib
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from utils.bulk_writer import estimate_size
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_MAX_BYTES = 64 * 1024 * 1024  # 64MB
+# 文档读取响应的格式版本，计入文档版本（document_version），升级后客户端的旧ETag和共享缓存中的旧条目随之失效。
+# 同一文档版本和请求范围的响应因代码修改而变化时（返回的字段、内容块顺序或编码）加1；
+# 文档数据的变化由 last_modified 体现，不需要修改。
+# 1: 初版；2: 内容块按阅读顺序返回
+RESPONSE_REVISION = 2
+
+
+class CacheBackend(ABC):
+    """缓存后端接口，可替换为进程间共享的实现（例如Redis）"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Tuple[str, Any]]:
+        """返回 (版本, 数据)，不存在时返回None"""
+
+    @abstractmethod
+    def set(self, key: str, version: str, value: Any):
+        """写入条目"""
+
+    @abstractmethod
+    def delete(self, key: str):
+        """删除条目"""
+
+    def stats(self) -> Dict[str, int]:
+        return {}
+
+
+class LRUCacheBackend(CacheBackend):
+    """进程内LRU缓存，按估算的占用字节数淘汰最久未使用的条目"""
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: 'OrderedDict[str, Tuple[str, Any, int]]' = OrderedDict()
+        self._size = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0], entry[1]
+
+    def set(self, key: str, version: str, value: Any):
+        size = estimate_size(value)
+        # 超过总容量的单个条目不缓存
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (version, value, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry[2]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'size_bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'evictions': self._evictions
+            }
+
+
+class DocumentCache:
+    """已处理文档的读穿透缓存
+
+    以文档ID和请求范围（章节、分页、投影参数）为键；每个条目记录写入时的文档版本
+    （处理状态和最后修改时间），读取时版本不一致即视为失效。
+    """
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(document_id: str, variant: str) -> str:
+        return f"{document_id}:{variant}"
+
+    def get(self, document_id: str, variant: str, version: str) -> Optional[Any]:
+        """读取缓存，版本不一致的条目会被删除"""
+        key = self.make_key(document_id, variant)
+        entry = self.backend.get(key)
+        if entry is not None and entry[0] != version:
+            self.backend.delete(key)
+            self._count('invalidations')
+            entry = None
+
+        if entry is None:
+            self._count('misses')
+            return None
+
+        self._count('hits')
+        return entry[1]
+
+    def set(self, document_id: str, variant: str, version: str, value: Any):
+        self.backend.set(self.make_key(document_id, variant), version, value)
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self) -> Dict[str, Any]:
+        """命中/未命中计数和后端占用情况"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'hit_rate': (self.hits / total) if total else 0.0,
+            **self.backend.stats()
+        }
+
+
+def document_version(doc: Dict[str, Any]) -> str:
+    """根据响应格式版本、处理状态和最后修改时间生成文档版本"""
+    last_modified = doc.get('last_modified')
+    return f"{RESPONSE_REVISION}:{doc.get('status')}:{last_modified.isoformat() if last_modified else ''}"
+
+
+def make_etag(document_id: str, version: str, variant: str) -> str:
+    """由文档版本和请求范围生成响应的ETag（不含引号）"""
+    return hashlib.sha1(f"{document_id}|{version}|{variant}".encode('utf-8')).hexdigest()
+
+
+def _create_default_cache() -> DocumentCache:
+    try:
+        max_bytes = int(os.getenv('DOCUMENT_CACHE_MAX_BYTES', DEFAULT_CACHE_MAX_BYTES))
+    except (TypeError, ValueError):
+        logger.warning(f"Invalid DOCUMENT_CACHE_MAX_BYTES value, using default: {DEFAULT_CACHE_MAX_BYTES}")
+        max_bytes = DEFAULT_CACHE_MAX_BYTES
+    return DocumentCache(LRUCacheBackend(max_bytes))
+
+
+document_cache = _create_default_cache()
+
+
+def set_cache_backend(backend: CacheBackend):
+    """替换缓存后端（例如在多进程部署中使用共享缓存）"""
+    global document_cache
+    document_cache = DocumentCache(backend)
+
+
+def get_document_cache() -> DocumentCache:
+    return document_cache
\ No newline at end of file
@@ -0,0 +1,208 @@
+"""
+文档批量导出
+
+按文档ID顺序读取处理完成的文档，每 EXPORT_DOCUMENT_CHUNK 个文档一组，每组用一次查询读取这一组文档的章节和大纲；
+各文档的内容块按阅读顺序（与 GET /api/documents/<id> 相同，见 ContentReadPlan）分批读取，逐条写入 gzip 压缩流。
+不在内存中保存文档的内容块列表，内存占用只与游标批大小（EXPORT_BATCH_SIZE）和单个文档的章节数有关，
+与导出的文档数和文档大小无关。
+
+导出格式：
+- ndjson：每行一条记录 {"type": "document"|"section"|"content", "data": {...}}，记录格式和顺序与
+  GET /api/documents/<id>?format=ndjson 相同，同一文档的记录连续输出（文档、章节、内容块）
+- columnar：按列组织的行组。首行为各表的列名 {"format": "columnar", "version": 1, "tables": {...}}，
+  之后每行为一个表的一组记录 {"table": "contents", "rows": n, "columns": {"_id": [...], ...}}，每组最多 batch_size 行；
+  内容块的文本和表格拆分为 text、headers、rows 三列，分析任务可以只读取需要的列
+"""
+import os
+import json
+import zlib
+import logging
+import itertools
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from models.document_models import DocumentStatus
+from database.mongo_client import documents, document_sections, document_outlines
+from utils.content_codec import decode_content
+from utils.document_outline import outline_positions, section_positions, reading_order
+from utils.document_query import ContentReadPlan, build_document_filter, iter_contents
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ('ndjson', 'columnar')
+EXPORT_FILE_EXTENSIONS = {'ndjson': '.ndjson.gz', 'columnar': '.columnar.jsonl.gz'}
+DEFAULT_EXPORT_BATCH_SIZE = 1000
+MAX_EXPORT_BATCH_SIZE = 10000
+# 每组文档的数量：每组读取一次章节和大纲
+EXPORT_DOCUMENT_CHUNK = 100
+EXPORT_COMPRESS_LEVEL = 6
+COLUMNAR_VERSION = 1
+
+DOCUMENT_FIELDS = ('_id', 'filename', 'file_type', 'upload_time', 'status', 'version', 'file_size', 'last_modified')
+SECTION_FIELDS = ('_id', 'document_id', 'title', 'level', 'parent_id', 'order', 'section_number')
+CONTENT_FIELDS = ('_id', 'document_id', 'section_id', 'content_type', 'content', 'order', 'page')
+# columnar 格式中内容块的列：content 拆分为 text（文本）、headers 和 rows（表格）
+CONTENT_COLUMNS = ('_id', 'document_id', 'section_id', 'content_type', 'order', 'page', 'text', 'headers', 'rows')
+
+RECORD_FIELDS = {'document': DOCUMENT_FIELDS, 'section': SECTION_FIELDS, 'content': CONTENT_FIELDS}
+COLUMNAR_TABLES = {'document': 'documents', 'section': 'sections', 'content': 'contents'}
+
+
+def get_export_batch_size() -> int:
+    try:
+        return clamp_batch_size(int(os.getenv('EXPORT_BATCH_SIZE', DEFAULT_EXPORT_BATCH_SIZE)))
+    except (TypeError, ValueError):
+        logger.warning(f"Invalid EXPORT_BATCH_SIZE value, using default: {DEFAULT_EXPORT_BATCH_SIZE}")
+        return DEFAULT_EXPORT_BATCH_SIZE
+
+
+def clamp_batch_size(batch_size: int) -> int:
+    return max(1, min(batch_size, MAX_EXPORT_BATCH_SIZE))
+
+
+def build_export_filter(document_ids: Optional[List[str]] = None, **filters) -> Dict[str, Any]:
+    """构造导出的文档查询条件：只导出处理完成的文档，可按文档ID和文档列表的过滤条件选择"""
+    query = build_document_filter(status=DocumentStatus.PROCESSED.value, **filters)
+    if document_ids:
+        query['_id'] = {'$in': list(document_ids)}
+    return query
+
+
+class _DocumentGroups:
+    """按 document_id 排序的游标，依次取出各文档的记录"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._next = next(cursor, None)
+
+    def take(self, document_id: str) -> Iterator[Dict[str, Any]]:
+        while self._next is not None and self._next['document_id'] <= document_id:
+            record, self._next = self._next, next(self._cursor, None)
+            if record['document_id'] == document_id:
+                yield record
+
+    def close(self):
+        self._cursor.close()
+
+
+def _projection(fields: Iterable[str]) -> Dict[str, int]:
+    return {field: 1 for field in fields}
+
+
+def iter_export_records(query: Dict[str, Any], batch_size: int) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """按文档ID顺序逐条产出 (记录类型, 记录)：每个文档依次为文档信息、章节和内容块（按阅读顺序，已还原为原始格式）"""
+    # 按 _id 索引顺序读取，避免数据库按过滤条件使用其他索引后在内存中排序全部文档
+    doc_cursor = documents.find(query, _projection(DOCUMENT_FIELDS)).sort('_id', 1) \
+        .hint([('_id', 1)]).batch_size(batch_size)
+    try:
+        while True:
+            chunk = list(itertools.islice(doc_cursor, EXPORT_DOCUMENT_CHUNK))
+            if not chunk:
+                return
+            chunk_filter = {'$in': [doc['_id'] for doc in chunk]}
+            outlines = {
+                outline['_id']: outline
+                for outline in document_outlines.find({'_id': chunk_filter}, {'sections': 1})
+            }
+            sections = _DocumentGroups(
+                document_sections.find({'document_id': chunk_filter}, _projection(SECTION_FIELDS))
+                .sort('document_id', 1).batch_size(batch_size)
+            )
+            try:
+                for doc in chunk:
+                    yield 'document', doc
+                    doc_sections = reading_order(list(sections.take(doc['_id'])))
+                    for section in doc_sections:
+                        yield 'section', section
+                    outline = outlines.pop(doc['_id'], None)
+                    positions = outline_positions(outline) if outline else section_positions(doc_sections)
+                    plan = ContentReadPlan(doc['_id'], positions, batch=batch_size)
+                    for content in iter_contents(plan, _projection(CONTENT_FIELDS)):
+                        yield 'content', decode_content(content)
+            finally:
+                sections.close()
+    finally:
+        doc_cursor.close()
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _dump(data: Dict[str, Any]) -> str:
+    return json.dumps(data, ensure_ascii=False, default=_json_default) + '\n'
+
+
+def _record_fields(record_type: str, record: Dict[str, Any]) -> Dict[str, Any]:
+    """按记录类型的字段输出，缺少的字段为 None（与接口的序列化结果一致）"""
+    data = {field: record.get(field) for field in RECORD_FIELDS[record_type]}
+    if record_type == 'document' and data['version'] is None:
+        data['version'] = 1
+    return data
+
+
+def _ndjson_lines(records: Iterable[Tuple[str, Dict[str, Any]]]) -> Iterator[str]:
+    for record_type, record in records:
+        yield _dump({'type': record_type, 'data': _record_fields(record_type, record)})
+
+
+def _columnar_row(record_type: str, record: Dict[str, Any]) -> Dict[str, Any]:
+    data = _record_fields(record_type, record)
+    if record_type == 'content':
+        content = data.pop('content') or {}
+        data['text'] = content.get('text')
+        data['headers'] = content.get('headers')
+        data['rows'] = content.get('rows')
+    return data
+
+
+def _columnar_lines(records: Iterable[Tuple[str, Dict[str, Any]]], batch_size: int) -> Iterator[str]:
+    """将记录按表累积为行组，某个表累积到 batch_size 行时输出一组"""
+    columns = {'document': DOCUMENT_FIELDS, 'section': SECTION_FIELDS, 'content': CONTENT_COLUMNS}
+    yield _dump({
+        'format': 'columnar',
+        'version': COLUMNAR_VERSION,
+        'tables': {COLUMNAR_TABLES[record_type]: list(names) for record_type, names in columns.items()}
+    })
+
+    groups: Dict[str, List[Dict[str, Any]]] = {record_type: [] for record_type in columns}
+
+    def row_group(record_type: str) -> str:
+        rows = groups[record_type]
+        groups[record_type] = []
+        return _dump({
+            'table': COLUMNAR_TABLES[record_type],
+            'rows': len(rows),
+            'columns': {name: [row[name] for row in rows] for name in columns[record_type]}
+        })
+
+    for record_type, record in records:
+        groups[record_type].append(_columnar_row(record_type, record))
+        if len(groups[record_type]) >= batch_size:
+            yield row_group(record_type)
+    for record_type in columns:
+        if groups[record_type]:
+            yield row_group(record_type)
+
+
+def _gzip(lines: Iterable[str]) -> Iterator[bytes]:
+    """增量压缩为 gzip 流，压缩器累积到一定数据量后才输出"""
+    compressor = zlib.compressobj(EXPORT_COMPRESS_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for line in lines:
+        data = compressor.compress(line.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_documents(query: Dict[str, Any], export_format: str = 'ndjson',
+                     batch_size: Optional[int] = None) -> Iterator[bytes]:
+    """导出符合条件的文档，逐块产出 gzip 压缩的导出数据"""
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式: {export_format}")
+    batch_size = clamp_batch_size(batch_size) if batch_size else get_export_batch_size()
+    records = iter_export_records(query, batch_size)
+    if export_format == 'columnar':
+        return _gzip(_columnar_lines(records, batch_size))
+    return _gzip(_ndjson_lines(records))
@@ -0,0 +1,170 @@
+"""
+文档大纲（章节树）
+
+入库时在内存中累计各章节的内容块数和字符数，处理完成后将整棵章节树写入 document_outlines
+（每个文档一条记录，_id 为文档ID），读取大纲只需一次按 _id 的查询，不需要读取全部章节再按 parent_id 重建层级。
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from models.document_models import DocumentStatus
+from database.mongo_client import documents, document_sections, document_contents, document_outlines
+from utils.search_index import content_text
+
+
+def reading_order(sections: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """将章节按阅读顺序（父章节在前，兄弟章节按序号）排列，与入库时产出章节的顺序一致"""
+    children: Dict[Optional[str], List[Dict[str, Any]]] = {}
+    for section in sorted(sections, key=lambda s: (s['order'], s['_id'])):
+        children.setdefault(section.get('parent_id'), []).append(section)
+
+    ordered = []
+    stack = list(reversed(children.get(None, [])))
+    while stack:
+        section = stack.pop()
+        ordered.append(section)
+        stack.extend(reversed(children.get(section['_id'], [])))
+    # 父章节已不存在的章节排在最后
+    visited = {section['_id'] for section in ordered}
+    ordered.extend(section for section in sections if section['_id'] not in visited)
+    return ordered
+
+
+class OutlineBuilder:
+    """按阅读顺序登记章节和内容块，生成大纲记录"""
+
+    def __init__(self):
+        self.sections: List[Dict[str, Any]] = []
+        self.content_counts: Dict[str, int] = {}
+        self.char_counts: Dict[str, int] = {}
+
+    def add_section(self, section: Dict[str, Any]):
+        self.sections.append({
+            field: section.get(field)
+            for field in ('_id', 'parent_id', 'title', 'level', 'order', 'section_number')
+        })
+
+    def add_content(self, content: Dict[str, Any]):
+        section_id = content['section_id']
+        self.content_counts[section_id] = self.content_counts.get(section_id, 0) + 1
+        self.char_counts[section_id] = self.char_counts.get(section_id, 0) + len(content_text(content))
+
+    def checkpoint(self) -> Dict[str, Any]:
+        """已登记的章节和计数（保存在入库检查点中）"""
+        return {
+            'sections': list(self.sections),
+            'content_counts': dict(self.content_counts),
+            'char_counts': dict(self.char_counts)
+        }
+
+    @classmethod
+    def restore(cls, state: Dict[str, Any]) -> 'OutlineBuilder':
+        """从入库检查点恢复"""
+        builder = cls()
+        builder.sections = list(state['sections'])
+        builder.content_counts = dict(state['content_counts'])
+        builder.char_counts = dict(state['char_counts'])
+        return builder
+
+    def build(self, document_id: str, version: int = 1,
+              id_map: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """生成大纲记录；id_map 将登记时的章节ID映射为实际保存的章节ID（版本更新时沿用旧章节ID）"""
+        id_map = id_map or {}
+        nodes: Dict[str, Dict[str, Any]] = {}
+        roots = []
+        for section in self.sections:
+            content_count = self.content_counts.get(section['_id'], 0)
+            char_count = self.char_counts.get(section['_id'], 0)
+            node = {
+                '_id': id_map.get(section['_id'], section['_id']),
+                'title': section['title'],
+                'level': section['level'],
+                'section_number': section['section_number'],
+                'content_count': content_count,
+                'char_count': char_count,
+                'total_content_count': content_count,
+                'total_char_count': char_count,
+                'children': []
+            }
+            nodes[section['_id']] = node
+            parent = nodes.get(section['parent_id'])
+            (parent['children'] if parent else roots).append(node)
+
+        # 子章节总在父章节之后登记，倒序累加即可得到各子树的合计
+        for section in reversed(self.sections):
+            parent = nodes.get(section['parent_id'])
+            if parent:
+                node = nodes[section['_id']]
+                parent['total_content_count'] += node['total_content_count']
+                parent['total_char_count'] += node['total_char_count']
+
+        return {
+            '_id': document_id,
+            'document_id': document_id,
+            'version': version,
+            'section_count': len(self.sections),
+            'content_count': sum(self.content_counts.values()),
+            'char_count': sum(self.char_counts.values()),
+            'sections': roots,
+            'updated_at': datetime.utcnow()
+        }
+
+
+def save_outline(outline: Dict[str, Any]):
+    """写入（替换）文档的大纲记录"""
+    document_outlines.replace_one({'_id': outline['_id']}, outline, upsert=True)
+
+
+def rebuild_outline(document_id: str, version: int = 1) -> Dict[str, Any]:
+    """按已保存的章节和内容块重建大纲（用于大纲功能上线前入库的文档）"""
+    builder = OutlineBuilder()
+    for section in reading_order(list(document_sections.find({'document_id': document_id}))):
+        builder.add_section(section)
+    for content in document_contents.find({'document_id': document_id},
+                                          {'section_id': 1, 'content_type': 1, 'content': 1}):
+        builder.add_content(content)
+    return builder.build(document_id, version)
+
+
+def outline_positions(outline: Dict[str, Any]) -> List[Tuple[str, int]]:
+    """按阅读顺序（先序遍历章节树）列出各章节的 (章节ID, 内容块数)"""
+    positions = []
+    stack = list(reversed(outline['sections']))
+    while stack:
+        node = stack.pop()
+        positions.append((node['_id'], node['content_count']))
+        stack.extend(reversed(node['children']))
+    return positions
+
+
+def section_positions(sections: List[Dict[str, Any]]) -> List[Tuple[str, Optional[int]]]:
+    """没有大纲时按章节记录排列阅读顺序，内容块数未知"""
+    return [(section['_id'], None) for section in reading_order(sections)]
+
+
+def content_positions(document_id: str, processed: bool) -> List[Tuple[str, Optional[int]]]:
+    """按阅读顺序列出文档各章节的 (章节ID, 内容块数)，用于按阅读顺序读取内容块
+
+    处理完成的文档使用大纲（一次按 _id 的查询）；处理中或处理失败的文档的大纲可能不是最新的，按章节记录排列。
+    """
+    outline = get_outline(document_id) if processed else None
+    if outline is not None:
+        return outline_positions(outline)
+    return section_positions(list(document_sections.find({'document_id': document_id}, {'parent_id': 1, 'order': 1})))
+
+
+def get_outline(document_id: str) -> Optional[Dict[str, Any]]:
+    """获取文档大纲（一次按 _id 的查询）；文档不存在时返回 None
+
+    大纲记录不存在时（大纲功能上线前入库、或尚未处理完成的文档）按已保存的数据重建，处理完成的文档同时保存重建结果。
+    """
+    outline = document_outlines.find_one({'_id': document_id})
+    if outline is not None:
+        return outline
+
+    doc = documents.find_one({'_id': document_id}, {'status': 1, 'version': 1})
+    if not doc:
+        return None
+    outline = rebuild_outline(document_id, doc.get('version', 1))
+    if doc.get('status') == DocumentStatus.PROCESSED.value:
+        save_outline(outline)
+    return outline
@@ -1,99 +1,328 @@
-import os
-from docx import Document as DocxDocument
-from PyPDF2 import PdfReader
 from datetime import datetime
+from collections import Counter
 import uuid
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, BinaryIO, Iterable, Optional, Union
+from pymongo.errors import DuplicateKeyError
 from models.document_models import Document, DocumentSection, DocumentContent, ContentType, DocumentStatus
-from database.mongo_client import documents, document_sections, document_contents
+from database.mongo_client import documents, document_sections, document_contents, search_postings, content_embeddings
+from utils.bulk_writer import BulkWriter, DEFAULT_BATCH_SIZE, DEFAULT_MAX_BUFFER_BYTES
+from utils.upload_source import UploadSource
+from utils.text_chunker import TextChunker
+from utils.content_codec import ContentCodec
+from utils.extractors import get_extractor, sniff_file_type
+from utils.search_index import build_postings, update_term_frequencies, content_text
+from utils.document_stats import record_document_created, record_status_change
+from utils.document_outline import OutlineBuilder, save_outline
+from utils.ingest_runs import IngestRun, start_run, get_checkpoint_pages
+from utils.metrics import timed, timed_iter, documents_processed
+import itertools
 import re
-from io import BytesIO
+
+def find_duplicate_document(content_hash: str) -> Optional[Dict[str, Any]]:
+    """查找内容哈希相同且未处理失败的文档"""
+    return documents.find_one(
+        {'content_hash': content_hash, 'status': {'$ne': DocumentStatus.ERROR.value}},
+        {'status': 1}
+    )
 
 class DocumentProcessor:
-    def __init__(self, filename: str, file_content: bytes):
+    def __init__(self, filename: str, file_content: Union[bytes, BinaryIO],
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 max_buffer_bytes: int = DEFAULT_MAX_BUFFER_BYTES,
+                 document_id: str = None,
+                 track_progress: bool = False,
+                 pdf_workers: int = None,
+                 spool_threshold: int = None,
+                 build_search_index: bool = True,
+                 chunker: Optional[TextChunker] = None,
+                 build_embeddings: bool = True,
+                 embedder=None,
+                 writer: Optional[BulkWriter] = None,
+                 codec: Optional[ContentCodec] = None,
+                 resumable: bool = False,
+                 previous_run: Optional[Dict[str, Any]] = None):
         self.filename = filename
-        self.file_content = file_content
+        # 文件内容可以是字节串或文件流，较大的文件流会转存到磁盘临时文件
+        self.source = UploadSource(file_content, spool_threshold=spool_threshold)
         self.file_type = self._get_file_type()
-        self.document_id = str(uuid.uuid4())
+        # 传入document_id表示文档记录已由上传队列创建（状态为pending）
+        self.is_queued = document_id is not None
+        self.document_id = document_id or str(uuid.uuid4())
+        # 内容与已有文档相同时，记录已有文档（_id 和 status），不再重复处理
+        self.duplicate_of: Optional[Dict[str, Any]] = None
+        # 处理进度，track_progress开启时在每次批量写入后同步到文档记录
+        self.track_progress = track_progress
+        # PDF并行提取的进程数，None表示使用 PDF_EXTRACT_WORKERS 配置
+        self.pdf_workers = pdf_workers
+        # 文本内容按大小切分为多个内容块（默认使用 CHUNK_* 配置）
+        self.chunker = chunker or TextChunker()
+        # 内容块的存储格式（默认使用 CONTENT_ENCODING 配置），索引和向量仍基于原始内容计算
+        self.codec = codec or ContentCodec()
+        self.progress = {
+            'pages_processed': 0,
+            'paragraphs_processed': 0,
+            'tables_processed': 0
+        }
+        # 入库时同步构建全文检索倒排索引，倒排记录与内容一起批量写入
+        self.build_search_index = build_search_index
+        self._term_frequencies = Counter()
+        # 入库时计算内容块的向量（EMBEDDING_BACKEND=none 时不计算），按批写入 content_embeddings
+        self.embedder = None
+        if build_embeddings:
+            # numpy 较重，按需导入以缩短服务冷启动时间
+            from utils.embeddings import get_embedder, EMBEDDING_BATCH_SIZE
+            self.embedder = embedder or get_embedder()
+            self.embedding_batch_size = EMBEDDING_BATCH_SIZE
+        self._pending_embeddings: List[Dict[str, Any]] = []
+        # 章节树及各章节的内容块数、字符数，处理完成后保存为文档大纲
+        self.outline = OutlineBuilder()
+        # 已生成的章节数和各类型内容块数，用于维护统计计数器
+        self._section_count = 0
+        self._content_type_counts = Counter()
+        # 处理结果：processed 或 error（共用缓冲区时在缓冲区刷新后才确定）
+        self.status: Optional[str] = None
+        self.error_message: Optional[str] = None
+        # 章节与内容通过批量写入缓冲区落库；批量上传时同一组的处理器共用调用方传入的缓冲区，
+        # 由调用方负责刷新
+        self.shares_writer = writer is not None
+        self.writer = writer or BulkWriter(
+            batch_size=batch_size,
+            max_buffer_bytes=max_buffer_bytes,
+            on_flush=self._report_progress if track_progress else None
+        )
+        # 处理器独占正在构建的文档，序号在本地分配，无需查询数据库
+        self._section_orders: Dict[str, int] = {}
+        self._content_orders: Dict[str, int] = {}
+        # 入库运行：写入的记录带有 run_id，处理完成时通过一次状态更新发布。
+        # resumable 表示原始文件已保留（异步上传），PDF按页提交检查点，重试时从检查点继续；
+        # previous_run 为文档记录中上一次运行的状态
+        self.resumable = resumable
+        self.previous_run = previous_run
+        self.run: Optional[IngestRun] = None
+        self.checkpoint_pages = get_checkpoint_pages() if resumable and not self.shares_writer else 0
+        self._resume_section: Optional[Dict[str, Any]] = None
         
     def _get_file_type(self) -> str:
-        """根据文件扩展名判断文件类型"""
-        ext = os.path.splitext(self.filename)[1].lower()
-        type_map = {
-            '.pdf': 'application/pdf',
-            '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-            '.doc': 'application/msword',
-            '.txt': 'text/plain'
-        }
-        return type_map.get(ext, 'application/octet-stream')
+        """根据文件内容的特征字节判断文件类型（不依赖扩展名）"""
+        return sniff_file_type(self.source, self.filename)
 
+    @timed('process_and_save')
     def process_and_save(self) -> str:
         """处理文档并保存到MongoDB"""
         try:
-            # 创建文档记录
-            doc = Document(self.filename, self.file_type)
-            doc.data['_id'] = self.document_id
-            doc.data['status'] = DocumentStatus.PROCESSING.value
-            documents.insert_one(doc.data)
+            # 创建文档记录（队列任务的记录已在领取时标记为processing，重复检测也已在入队时完成）
+            if not self.is_queued:
+                self.duplicate_of = find_duplicate_document(self.source.sha256)
+                if self.duplicate_of:
+                    return self.duplicate_of['_id']
+
+                self.run = IngestRun(self.document_id, resumable=self.resumable)
+                doc = Document(self.filename, self.file_type)
+                doc.data['_id'] = self.document_id
+                doc.data['status'] = DocumentStatus.PROCESSING.value
+                doc.data['content_hash'] = self.source.sha256
+                doc.data['file_size'] = self.source.size
+                doc.data['ingest_run'] = self.run.record()
+                try:
+                    documents.insert_one(doc.data)
+                except DuplicateKeyError:
+                    # 相同内容的文件被并发上传
+                    self.duplicate_of = find_duplicate_document(self.source.sha256)
+                    if not self.duplicate_of:
+                        raise
+                    return self.duplicate_of['_id']
+                record_document_created(DocumentStatus.PROCESSING.value, self.source.size)
 
             try:
-                # 处理文档内容
-                if self.file_type == 'application/pdf':
-                    self._process_pdf()
-                elif self.file_type == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document':
-                    self._process_docx()
-                elif self.file_type == 'application/msword':
-                    # 对于 .doc 文件，创建一个默认章节并添加提示信息
-                    section = self._create_default_section()
-                    content = DocumentContent(
-                        self.document_id,
-                        section['_id'],
-                        ContentType.TEXT
-                    )
-                    content.set_text_content("注意：暂不支持直接处理 .doc 格式文件，请将文件转换为 .docx 格式后重新上传。")
-                    content.data['_id'] = str(uuid.uuid4())
-                    content.data['order'] = 10
-                    document_contents.insert_one(content.data)
+                if self.is_queued:
+                    self._start_queued_run()
+                self.parse()
+                self._flush_embeddings()
+                if self.shares_writer:
+                    # 共用的缓冲区由调用方统一刷新，本文档的记录写入后再更新文档状态
+                    self.writer.after_flush(self._on_records_written)
                 else:
-                    self._process_text()
-
-                # 更新文档状态
-                documents.update_one(
-                    {'_id': self.document_id},
-                    {'$set': {
-                        'status': DocumentStatus.PROCESSED.value,
-                        'last_modified': datetime.utcnow()
-                    }}
-                )
+                    # 写入缓冲区中剩余的章节、内容和向量
+                    self.writer.flush()
+                    self._mark_processed()
 
             except Exception as e:
-                # 更新错误状态
-                documents.update_one(
-                    {'_id': self.document_id},
-                    {'$set': {
-                        'status': DocumentStatus.ERROR.value,
-                        'error_message': str(e)
-                    }}
-                )
+                self._pending_embeddings.clear()
+                self.writer.discard(self.document_id)
+                self._mark_error(e)
                 raise
 
             return self.document_id
 
         except Exception as e:
             raise Exception(f"处理文档时出错: {str(e)}")
+        finally:
+            self.source.close()
 
-    def _process_docx(self):
-        """处理Word文档"""
+    def _start_queued_run(self):
+        """为队列任务开始入库运行（可以续传时从上一次运行的检查点恢复处理状态）"""
+        self.run = start_run(self.document_id, self.previous_run, self.resumable)
         try:
-            doc = DocxDocument(BytesIO(self.file_content))
-            current_section = None
-            section_stack = []
-            last_level = 0
-
-            for paragraph in doc.paragraphs:
-                # 检查是否是章节标题
-                if paragraph.style.name.startswith('Heading'):
-                    level = int(paragraph.style.name.replace('Heading ', ''))
+            # 处理失败时移除了内容哈希，重试时恢复，使相同内容的上传仍能检测为重复；
+            # 领取时间（claimed_at）由运行的心跳接替
+            documents.update_one({'_id': self.document_id}, {
+                '$set': {
+                    'ingest_run': self.run.record(),
+                    'content_hash': self.source.sha256
+                },
+                '$unset': {'claimed_at': ''}
+            })
+        except DuplicateKeyError:
+            # 失败期间已上传了相同内容的文档：本次重试作为重复文档处理失败
+            documents.update_one({'_id': self.document_id}, {
+                '$set': {'ingest_run': self.run.record()},
+                '$unset': {'claimed_at': ''}
+            })
+            duplicate = find_duplicate_document(self.source.sha256)
+            raise Exception(f"相同内容的文档已存在: {duplicate['_id'] if duplicate else self.source.sha256}")
+        if self.run.checkpoint:
+            self._restore_checkpoint(self.run.checkpoint)
+
+    def _restore_checkpoint(self, checkpoint: Dict[str, Any]):
+        """恢复检查点时的处理状态，检查点之前的记录已经写入"""
+        self.progress = dict(checkpoint['progress'])
+        self._section_orders = {parent_id: order for parent_id, order in checkpoint['section_orders']}
+        self._content_orders = {section_id: order for section_id, order in checkpoint['content_orders']}
+        self._section_count = checkpoint['section_count']
+        self._content_type_counts = Counter(checkpoint['content_type_counts'])
+        self.outline = OutlineBuilder.restore(checkpoint['outline'])
+        if checkpoint['section_id']:
+            self._resume_section = {'_id': checkpoint['section_id']}
+        if self.build_search_index:
+            # 已写入的倒排记录的词频，发布时与后续页面的词频一起累加
+            self._term_frequencies = Counter(
+                posting['term'] for posting in search_postings.find(
+                    {'document_id': self.document_id, 'run_id': self.run.id}, {'term': 1, '_id': 0})
+            )
+
+    def _commit_checkpoint(self, current_section: Dict[str, Any]):
+        """写入已处理页面的全部记录后提交检查点"""
+        self._flush_embeddings()
+        self.writer.flush()
+        self.run.commit_checkpoint({
+            'pages': self.progress['pages_processed'],
+            'progress': dict(self.progress),
+            'section_id': current_section['_id'],
+            'section_orders': [[parent_id, order] for parent_id, order in self._section_orders.items()],
+            'content_orders': [[section_id, order] for section_id, order in self._content_orders.items()],
+            'section_count': self._section_count,
+            'content_type_counts': dict(self._content_type_counts),
+            'outline': self.outline.checkpoint()
+        }, {'progress': self.progress})
+
+    def parse(self):
+        """按文件类型选择解析器处理文档内容，章节和内容块加入写入缓冲区"""
+        extractor = get_extractor(self.file_type)
+        if extractor is None:
+            raise Exception(f"不支持的文件类型: {self.file_type}")
+        options = {'pdf_workers': self.pdf_workers}
+        if self._resume_section:
+            # 从检查点续传：跳过已处理的页面
+            options['start_page'] = self.progress['pages_processed']
+        with timed(f'process.{extractor.name}'):
+            try:
+                self._process_blocks(extractor.extract(self.source, **options), self._resume_section)
+            except Exception as e:
+                raise Exception(f"处理{extractor.label}文档时出错: {str(e)}")
+
+    def _mark_processed(self):
+        """文档的记录全部写入后发布（更新文档状态），再更新检索词频、文档大纲和统计"""
+        update = {'$set': {
+            'status': DocumentStatus.PROCESSED.value,
+            'file_type': self.file_type,
+            'progress': self.progress,
+            'last_modified': datetime.utcnow()
+        }}
+        query = {'_id': self.document_id}
+        if self.run:
+            # 只有仍由本次运行处理的文档才能发布（心跳超时被标记为中断后不再发布）
+            query = self.run.query()
+            update['$set']['run_id'] = self.run.id
+            update['$unset'] = {'ingest_run': ''}
+        if not documents.update_one(query, update).matched_count:
+            raise Exception("入库运行已中断（心跳超时），请重试")
+
+        if self._term_frequencies:
+            with timed('search_index'):
+                update_term_frequencies(self._term_frequencies)
+        save_outline(self.outline.build(self.document_id))
+        if self.embedder is not None:
+            from utils.vector_index import notify_embeddings_changed
+            notify_embeddings_changed([self.document_id])
+
+        record_status_change(
+            DocumentStatus.PROCESSING.value,
+            DocumentStatus.PROCESSED.value,
+            sections=self._section_count,
+            contents=self._content_type_counts
+        )
+        documents_processed.inc(file_type=self.file_type, status=DocumentStatus.PROCESSED.value)
+        self.status = DocumentStatus.PROCESSED.value
+
+    def _mark_error(self, error: Exception):
+        """将文档标记为处理失败；已写入的记录由清理任务按运行删除"""
+        self.status = DocumentStatus.ERROR.value
+        self.error_message = str(error)
+        fields = {
+            'status': DocumentStatus.ERROR.value,
+            'file_type': self.file_type,
+            'progress': self.progress,
+            'error_message': str(error)
+        }
+        query = {'_id': self.document_id}
+        if self.run:
+            query = self.run.query()
+            fields.update(self.run.failure_fields())
+        result = documents.update_one(
+            query,
+            # 移除内容哈希，使相同文件可以重新上传处理
+            {'$set': fields, '$unset': {'content_hash': ''}}
+        )
+        if not result.matched_count:
+            # 运行已被清理任务标记为中断，状态和统计已更新
+            if self.run:
+                self.run.release()
+            return
+        record_status_change(DocumentStatus.PROCESSING.value, DocumentStatus.ERROR.value)
+        documents_processed.inc(file_type=self.file_type, status=DocumentStatus.ERROR.value)
+
+    def _on_records_written(self, error: Optional[Exception]):
+        """共用缓冲区刷新后的回调"""
+        if error is not None:
+            self._mark_error(error)
+            return
+        try:
+            self._mark_processed()
+        except Exception as e:
+            self._mark_error(e)
+
+    def _process_blocks(self, blocks: Iterable[Dict[str, Any]], current_section: Optional[Dict[str, Any]] = None):
+        """按文档顺序处理解析器产出的块：标题建立章节层级，段落、表格和页面文本归属于所在位置的章节
+
+        current_section 为从检查点续传时页面文本所属的章节。
+        """
+        section_stack = []
+        last_level = 0
+
+        # 计时包含等待解析进程产出下一块的时间；相邻的连续文本片段合并后分块
+        blocks = timed_iter(blocks, 'extract')
+        for is_text, group in itertools.groupby(blocks, key=lambda block: block['type'] == 'text'):
+            if is_text:
+                if not current_section:
+                    current_section = self._create_default_section()
+                self.progress['paragraphs_processed'] += self._save_text_chunks(
+                    current_section['_id'], self.chunker.chunk_stream(block['text'] for block in group))
+                continue
+
+            for block in group:
+                # 章节标题
+                if block['type'] == 'heading':
+                    level = block['level']
                     
                     # 处理章节层级
                     while section_stack and last_level >= level:
@@ -104,7 +333,7 @@ class DocumentProcessor:
                     parent_id = section_stack[-1]['_id'] if section_stack else None
                     section = DocumentSection(
                         self.document_id,
-                        paragraph.text,
+                        block['text'],
                         level,
                         parent_id
                     )
@@ -113,61 +342,57 @@ class DocumentProcessor:
                     section.data['section_number'] = self._generate_section_number(section_stack, section.data['order'])
                     
                     # 保存章节
-                    document_sections.insert_one(section.data)
+                    self._save_section(section.data)
                     current_section = section.data
                     section_stack.append(current_section)
                     last_level = level
                 
                 # 处理段落内容
-                elif paragraph.text.strip():
+                elif block['type'] == 'paragraph':
+                    if not block['text'].strip():
+                        continue
                     if not current_section:
                         # 如果没有章节，创建默认章节
                         current_section = self._create_default_section()
                     
-                    # 创建文本内容
+                    # 创建文本内容（超长段落切分为多个内容块）
+                    self._save_text_chunks(current_section['_id'], self.chunker.chunk_text(block['text']))
+                    self.progress['paragraphs_processed'] += 1
+
+                # 处理表格（归属于表格所在位置的章节）
+                elif block['type'] == 'table':
+                    if not current_section:
+                        current_section = self._create_default_section()
+
+                    # 第一行作为表头
+                    rows = block['rows']
+                    headers = rows[0] if rows else []
+
+                    # 创建表格内容
                     content = DocumentContent(
                         self.document_id,
                         current_section['_id'],
-                        ContentType.TEXT
+                        ContentType.TABLE
                     )
-                    content.set_text_content(paragraph.text)
+                    content.set_table_content(headers, rows[1:])
                     content.data['_id'] = str(uuid.uuid4())
                     content.data['order'] = self._get_next_content_order(current_section['_id'])
                     
                     # 保存内容
-                    document_contents.insert_one(content.data)
+                    self._save_content(content.data)
+                    self.progress['tables_processed'] += 1
 
-            # 处理表格
-            for table in doc.tables:
-                if not current_section:
-                    current_section = self._create_default_section()
-
-                headers = []
-                rows = []
-                
-                # 提取表格数据
-                for i, row in enumerate(table.rows):
-                    row_data = [cell.text for cell in row.cells]
-                    if i == 0:
-                        headers = row_data
-                    else:
-                        rows.append(row_data)
-
-                # 创建表格内容
-                content = DocumentContent(
-                    self.document_id,
-                    current_section['_id'],
-                    ContentType.TABLE
-                )
-                content.set_table_content(headers, rows)
-                content.data['_id'] = str(uuid.uuid4())
-                content.data['order'] = self._get_next_content_order(current_section['_id'])
-                
-                # 保存内容
-                document_contents.insert_one(content.data)
-
-        except Exception as e:
-            raise Exception(f"处理Word文档时出错: {str(e)}")
+                # 处理页面文本：每页切分为若干内容块，并记录所在页码
+                elif block['type'] == 'page':
+                    if not current_section:
+                        current_section = self._create_default_section()
+                    self.progress['pages_processed'] += 1
+                    page = {'page': self.progress['pages_processed']}
+                    if not self._save_text_chunks(current_section['_id'], self.chunker.chunk_text(block['text']), page):
+                        # 空白页保存一个空内容块，保留页面边界
+                        self._save_text_chunks(current_section['_id'], [''], page)
+                    if self.checkpoint_pages and self.progress['pages_processed'] % self.checkpoint_pages == 0:
+                        self._commit_checkpoint(current_section)
 
     def _create_default_section(self) -> Dict[str, Any]:
         """创建默认章节"""
@@ -179,24 +404,95 @@ class DocumentProcessor:
         section.data['_id'] = str(uuid.uuid4())
         section.data['order'] = self._get_next_section_order(None)
         section.data['section_number'] = str(section.data['order'])
-        document_sections.insert_one(section.data)
+        self._save_section(section.data)
         return section.data
 
-    def _get_next_section_order(self, parent_id: str = None) -> int:
-        """获取下一个章节序号"""
-        last_section = document_sections.find_one(
-            {'document_id': self.document_id, 'parent_id': parent_id},
-            sort=[('order', -1)]
+    def _save_text_chunks(self, section_id: str, chunks: Iterable[str],
+                          extra_fields: Optional[Dict[str, Any]] = None) -> int:
+        """将文本分块依次保存为内容块，返回保存的块数"""
+        count = 0
+        for chunk in chunks:
+            content = DocumentContent(
+                self.document_id,
+                section_id,
+                ContentType.TEXT
+            )
+            content.set_text_content(chunk)
+            content.data['_id'] = str(uuid.uuid4())
+            content.data['order'] = self._get_next_content_order(section_id)
+            if extra_fields:
+                content.data.update(extra_fields)
+            self._save_content(content.data)
+            count += 1
+        return count
+
+    def _report_progress(self):
+        """将当前处理进度写入文档记录（同时更新运行心跳）"""
+        if self.run:
+            self.run.heartbeat({'progress': self.progress})
+            return
+        documents.update_one(
+            {'_id': self.document_id},
+            {'$set': {'progress': self.progress}}
         )
-        return (last_section['order'] + 10) if last_section else 10
+
+    def _write(self, collection, record: Dict[str, Any]):
+        """将记录（带上运行ID）加入批量写入缓冲区"""
+        if self.run:
+            self.run.tag(record)
+        self.writer.add(collection, record)
+
+    def _save_section(self, section_data: Dict[str, Any]):
+        """将章节加入批量写入缓冲区"""
+        self._write(document_sections, section_data)
+        self.outline.add_section(section_data)
+        self._section_count += 1
+
+    def _save_content(self, content_data: Dict[str, Any]):
+        """将内容（及其倒排记录）加入批量写入缓冲区"""
+        self._write(document_contents, self.codec.encode(content_data))
+        self._content_type_counts[content_data['content_type']] += 1
+        self.outline.add_content(content_data)
+        if self.run and self.run.heartbeat_due():
+            self.run.heartbeat()
+        if self.embedder is not None:
+            self._pending_embeddings.append(content_data)
+            if len(self._pending_embeddings) >= self.embedding_batch_size:
+                self._flush_embeddings()
+        if not self.build_search_index:
+            return
+
+        for posting in build_postings(content_data):
+            self._write(search_postings, posting)
+            self._term_frequencies[posting['term']] += 1
+
+    def _flush_embeddings(self):
+        """为缓冲的内容块批量计算向量，并加入批量写入缓冲区"""
+        if not self._pending_embeddings:
+            return
+        from utils.embeddings import build_embedding_records
+
+        contents = self._pending_embeddings
+        self._pending_embeddings = []
+        with timed('embedding'):
+            records = build_embedding_records(
+                self.embedder, contents, [content_text(content) for content in contents])
+        for record in records:
+            self._write(content_embeddings, record)
+
+    def _get_next_section_order(self, parent_id: str = None) -> int:
+        """获取下一个章节序号（按父章节计数，步长为10）"""
+        with timed('order_allocation'):
+            order = self._section_orders.get(parent_id, 0) + 10
+            self._section_orders[parent_id] = order
+        return order
 
     def _get_next_content_order(self, section_id: str) -> int:
-        """获取下一个内容序号"""
-        last_content = document_contents.find_one(
-            {'section_id': section_id},
-            sort=[('order', -1)]
-        )
-        return (last_content['order'] + 10) if last_content else 10
+        """获取下一个内容序号（按章节计数，步长为10）"""
+        with timed('order_allocation'):
+            order = self._content_orders.get(section_id, 0) + 10
+            self._content_orders[section_id] = order
+        return order
 
     def _generate_section_number(self, section_stack: List[Dict[str, Any]], order: int) -> str:
         """生成章节编号"""
@@ -205,40 +501,3 @@ class DocumentProcessor:
         
         parent_number = section_stack[-1]['section_number']
         return f"{parent_number}.{order // 10}"
-
-    def _process_pdf(self):
-        """处理PDF文档"""
-        try:
-            reader = PdfReader(BytesIO(self.file_content))
-            section = self._create_default_section()
-            
-            for i, page in enumerate(reader.pages):
-                content = DocumentContent(
-                    self.document_id,
-                    section['_id'],
-                    ContentType.TEXT
-                )
-                content.set_text_content(page.extract_text())
-                content.data['_id'] = str(uuid.uuid4())
-                content.data['order'] = (i + 1) * 10
-                document_contents.insert_one(content.data)
-        except Exception as e:
-            raise Exception(f"处理PDF文档时出错: {str(e)}")
-
-    def _process_text(self):
-        """处理文本文档"""
-        try:
-            section = self._create_default_section()
-            text_content = self.file_content.decode('utf-8')
-            
-            content = DocumentContent(
-                self.document_id,
-                section['_id'],
-                ContentType.TEXT
-            )
-            content.set_text_content(text_content)
-            content.data['_id'] = str(uuid.uuid4())
-            content.data['order'] = 10
-            document_contents.insert_one(content.data)
-        except Exception as e:
-            raise Exception(f"处理文本文档时出错: {str(e)}") 
\ No newline at end of file
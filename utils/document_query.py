@@ -0,0 +1,239 @@
+"""
+文档读取的查询构造工具（游标分页、章节范围、字段投影、文档列表过滤）
+"""
+import re
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from models.document_models import ContentType
+from database.mongo_client import document_contents
+
+# 单页内容块数量上限
+MAX_PAGE_SIZE = 1000
+# 文档列表的默认每页数量
+DEFAULT_LIST_PAGE_SIZE = 50
+
+# 同一父章节下的章节、同一章节内的内容块的顺序（order 按父章节/章节分别编号，文档内的阅读顺序见 ContentReadPlan）
+SECTION_SORT = [('order', 1), ('_id', 1)]
+CONTENT_SORT = [('order', 1), ('_id', 1)]
+# 文档列表按上传时间倒序，_id 保证同一时间上传的文档顺序稳定
+DOCUMENT_LIST_SORT = [('upload_time', -1), ('_id', -1)]
+# 文档列表只读取摘要字段（不读取处理进度、错误信息等）
+DOCUMENT_LIST_PROJECTION = {
+    'filename': 1, 'file_type': 1, 'upload_time': 1, 'status': 1,
+    'version': 1, 'file_size': 1, 'last_modified': 1
+}
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+class InvalidCursorError(ValueError):
+    """分页游标格式错误"""
+
+
+def encode_cursor(content: Dict[str, Any]) -> str:
+    """根据一页中最后一个内容块生成下一页游标，格式为 '<章节ID>:<order>:<内容ID>'"""
+    return f"{content['section_id']}:{content['order']}:{content['_id']}"
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int, str]:
+    """解析分页游标，返回（章节ID, order, 内容ID）"""
+    parts = cursor.split(':')
+    if len(parts) != 3 or not parts[0] or not parts[2]:
+        raise InvalidCursorError('无效的分页游标')
+    try:
+        return parts[0], int(parts[1]), parts[2]
+    except ValueError:
+        raise InvalidCursorError('无效的分页游标')
+
+
+def build_content_filter(document_id: str,
+                         section_ids: Optional[List[str]] = None,
+                         after: Optional[Tuple[int, str]] = None,
+                         include_tables: bool = True) -> Dict[str, Any]:
+    """构造内容块查询条件：按文档、章节范围过滤，从章节内的位置 after=(order, 内容ID) 之后继续；可排除表格内容块"""
+    query: Dict[str, Any] = {'document_id': document_id}
+    if section_ids is not None:
+        query['section_id'] = section_ids[0] if len(section_ids) == 1 else {'$in': section_ids}
+    if not include_tables:
+        query['content_type'] = {'$ne': ContentType.TABLE.value}
+    if after:
+        order, content_id = after
+        query['$or'] = [
+            {'order': {'$gt': order}},
+            {'order': order, '_id': {'$gt': content_id}}
+        ]
+    return query
+
+
+class ContentQuery(NamedTuple):
+    """一次内容块查询：按 CONTENT_SORT 排序，limit 为 0 时不限制数量"""
+    filter: Dict[str, Any]
+    limit: int
+
+
+class ContentReadPlan:
+    """按阅读顺序读取内容块的查询计划
+
+    order 只在章节内有序（每个章节从10开始编号），阅读顺序为章节的阅读顺序（父章节在前，兄弟章节按序号），
+    章节内按 (order, _id)。sections 为按阅读顺序排列的 (章节ID, 内容块数) 列表，内容块数取自文档大纲，未知时为 None。
+
+    内容块数已知且合计不超过一批的相邻章节合并为一次查询，返回后在内存中按阅读位置排序；
+    其余章节单独查询，在章节内按索引顺序分批读取。每次查询最多读取 batch 条，同步和异步接口以相同方式执行：
+
+        while (query := plan.next_query()) is not None:
+            contents.extend(plan.accept(find(query.filter).sort(CONTENT_SORT).limit(query.limit)))
+    """
+
+    def __init__(self, document_id: str, sections: List[Tuple[str, Optional[int]]],
+                 cursor: Optional[str] = None, limit: Optional[int] = None,
+                 include_tables: bool = True, batch: int = MAX_PAGE_SIZE):
+        self.document_id = document_id
+        self.sections = sections
+        self.include_tables = include_tables
+        self.batch = batch
+        # 还需读取的内容块数，None 表示读取全部
+        self.remaining = limit
+        self._index = 0
+        self._after: Optional[Tuple[int, str]] = None
+        self._group: List[str] = []
+        self._query: Optional[ContentQuery] = None
+        if cursor:
+            section_id, order, content_id = decode_cursor(cursor)
+            positions = [i for i, (sid, _) in enumerate(sections) if sid == section_id]
+            if not positions:
+                # 游标所在的章节已不存在（文档已更新）
+                raise InvalidCursorError('分页游标已失效，请重新读取')
+            self._index = positions[0]
+            self._after = (order, content_id)
+
+    def next_query(self) -> Optional[ContentQuery]:
+        """下一次查询；已读取足够数量或全部章节时返回 None"""
+        if self.remaining is not None and self.remaining <= 0:
+            return None
+        budget = min(self.remaining, self.batch) if self.remaining is not None else self.batch
+        if self._index >= len(self.sections):
+            return None
+
+        section_id, count = self.sections[self._index]
+        if self._after is not None or count is None or count >= budget:
+            self._group = [section_id]
+            self._query = ContentQuery(
+                build_content_filter(self.document_id, self._group, self._after, self.include_tables), budget)
+            return self._query
+
+        self._group, total = [], 0
+        for section_id, count in self.sections[self._index:]:
+            if count is None or total + count > budget:
+                break
+            # 内容块数为0的章节也加入查询条件，大纲与实际不一致时不会漏读
+            self._group.append(section_id)
+            total += count
+        self._query = ContentQuery(
+            build_content_filter(self.document_id, self._group, include_tables=self.include_tables), 0)
+        return self._query
+
+    def accept(self, rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """接收 next_query 的查询结果，返回按阅读顺序排列的内容块"""
+        rows = list(rows)
+        query = self._query
+        if len(self._group) > 1:
+            ranks = {section_id: rank for rank, section_id in enumerate(self._group)}
+            rows.sort(key=lambda content: (ranks[content['section_id']], content['order'], content['_id']))
+
+        if query.limit and len(rows) >= query.limit:
+            # 章节可能还有内容块，下次从最后一条之后继续
+            self._after = (rows[-1]['order'], rows[-1]['_id'])
+        else:
+            self._index += len(self._group)
+            self._after = None
+        if self.remaining is not None:
+            # 大纲中的内容块数与实际不一致时多读取的部分不返回，由下一页游标继续
+            rows = rows[:self.remaining]
+            self.remaining -= len(rows)
+        return rows
+
+
+def iter_contents(plan: ContentReadPlan, projection: Optional[Dict[str, int]] = None) -> Iterator[Dict[str, Any]]:
+    """执行读取计划，按阅读顺序逐条返回内容块"""
+    while True:
+        query = plan.next_query()
+        if query is None:
+            return
+        yield from plan.accept(
+            document_contents.find(query.filter, projection).sort(CONTENT_SORT).limit(query.limit))
+
+
+def build_content_projection(omit_table_rows: bool = False) -> Optional[Dict[str, int]]:
+    """构造内容块字段投影，可省略体积较大的表格行数据（包括紧凑格式的列数据）"""
+    if omit_table_rows:
+        return {'content.rows': 0, 'content.columns': 0, 'content.packed_columns': 0}
+    return None
+
+
+def clamp_page_size(limit: Optional[int]) -> Optional[int]:
+    """限制单页大小，None 表示不分页"""
+    if limit is None:
+        return None
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def encode_list_cursor(doc: Dict[str, Any]) -> str:
+    """根据文档列表一页中最后一个文档生成下一页游标，格式为 '<上传时间毫秒数>:<文档ID>'"""
+    # MongoDB 的日期精度为毫秒
+    millis = (doc['upload_time'] - _EPOCH) // timedelta(milliseconds=1)
+    return f"{millis}:{doc['_id']}"
+
+
+def decode_list_cursor(cursor: str) -> Tuple[datetime, str]:
+    """解析文档列表的分页游标"""
+    millis, sep, document_id = cursor.partition(':')
+    if not sep or not document_id:
+        raise InvalidCursorError('无效的分页游标')
+    try:
+        return _EPOCH + timedelta(milliseconds=int(millis)), document_id
+    except (ValueError, OverflowError):
+        raise InvalidCursorError('无效的分页游标')
+
+
+def build_document_filter(status: Optional[str] = None,
+                          file_type: Optional[str] = None,
+                          uploaded_after: Optional[datetime] = None,
+                          uploaded_before: Optional[datetime] = None,
+                          filename_prefix: Optional[str] = None,
+                          cursor: Optional[str] = None) -> Dict[str, Any]:
+    """构造文档列表查询条件：按状态、文件类型、上传时间范围 [after, before) 和文件名前缀过滤，并从游标之后继续
+
+    等值条件与排序字段组成复合索引的前缀，查询按索引顺序读取，不需要内存排序。
+    """
+    query: Dict[str, Any] = {}
+    if status:
+        query['status'] = status
+    if file_type:
+        query['file_type'] = file_type
+    if filename_prefix:
+        # 以 ^ 开头且区分大小写的正则可以使用 filename 索引做范围扫描
+        query['filename'] = {'$regex': '^' + re.escape(filename_prefix)}
+
+    upload_time: Dict[str, datetime] = {}
+    if uploaded_after:
+        upload_time['$gte'] = _to_utc(uploaded_after)
+    if uploaded_before:
+        upload_time['$lt'] = _to_utc(uploaded_before)
+    if upload_time:
+        query['upload_time'] = upload_time
+
+    if cursor:
+        last_time, last_id = decode_list_cursor(cursor)
+        keyset = {'$or': [
+            {'upload_time': {'$lt': last_time}},
+            {'upload_time': last_time, '_id': {'$lt': last_id}}
+        ]}
+        query = {'$and': [query, keyset]} if query else keyset
+    return query
+
+
+def _to_utc(value: datetime) -> datetime:
+    """上传时间以不带时区的UTC时间保存，带时区的参数先转换为UTC"""
+    if value.tzinfo is not None:
+        value = (value - value.utcoffset()).replace(tzinfo=None)
+    return value
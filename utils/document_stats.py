@@ -0,0 +1,193 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional
+from database.mongo_client import documents, document_sections, document_contents, system_stats
+
+logger = logging.getLogger(__name__)
+
+# 统计计数器文档的ID
+STATS_ID = 'documents'
+DEFAULT_STATS_CACHE_TTL = 10.0
+
+_cache: Dict[str, Any] = {'expires_at': 0.0, 'value': None}
+_cache_lock = threading.Lock()
+
+
+def _get_cache_ttl() -> float:
+    try:
+        return float(os.getenv('STATS_CACHE_TTL', DEFAULT_STATS_CACHE_TTL))
+    except (TypeError, ValueError):
+        logger.warning(f"Invalid STATS_CACHE_TTL value, using default: {DEFAULT_STATS_CACHE_TTL}")
+        return DEFAULT_STATS_CACHE_TTL
+
+
+def _increment(increments: Dict[str, int]):
+    """以 $inc 原子地累加计数器（计数器文档不存在时自动创建）"""
+    increments = {field: value for field, value in increments.items() if value}
+    if not increments:
+        return
+    system_stats.update_one(
+        {'_id': STATS_ID},
+        {'$inc': increments, '$set': {'updated_at': datetime.utcnow()}},
+        upsert=True
+    )
+
+
+def record_document_created(status: str, file_size: int = 0):
+    """新建文档记录"""
+    _increment({
+        'total_documents': 1,
+        f'documents_by_status.{status}': 1,
+        'bytes_ingested': file_size
+    })
+
+
+def _add_content_increments(increments: Dict[str, int], contents: Optional[Dict[str, int]]):
+    """累加各类型内容块数的变化量（可为负数）及内容块总数"""
+    for content_type, count in (contents or {}).items():
+        increments['total_contents'] = increments.get('total_contents', 0) + count
+        increments[f'contents_by_type.{content_type}'] = count
+
+
+def record_status_change(from_status: str,
+                         to_status: str,
+                         sections: int = 0,
+                         contents: Optional[Dict[str, int]] = None):
+    """文档状态变化；处理完成时同时累加章节数和各类型的内容块数"""
+    increments = {
+        f'documents_by_status.{from_status}': -1,
+        f'documents_by_status.{to_status}': 1,
+        'total_sections': sections
+    }
+    _add_content_increments(increments, contents)
+    _increment(increments)
+
+
+def record_document_updated(sections: int = 0,
+                            contents: Optional[Dict[str, int]] = None,
+                            file_size: int = 0):
+    """文档更新为新版本：累加章节数、各类型内容块数的变化量（可为负数）和新版本的文件大小"""
+    increments = {
+        'total_sections': sections,
+        'bytes_ingested': file_size
+    }
+    _add_content_increments(increments, contents)
+    _increment(increments)
+
+
+def _estimated_stats() -> Dict[str, Any]:
+    """计数器尚未初始化时，使用集合元数据估算总数（不扫描集合）"""
+    return _make_estimated_stats(
+        documents.estimated_document_count(),
+        document_sections.estimated_document_count(),
+        document_contents.estimated_document_count()
+    )
+
+
+def _make_estimated_stats(total_documents: int, total_sections: int, total_contents: int) -> Dict[str, Any]:
+    return {
+        'total_documents': total_documents,
+        'total_sections': total_sections,
+        'total_contents': total_contents,
+        'documents_by_status': {},
+        'contents_by_type': {},
+        'bytes_ingested': None,
+        'updated_at': datetime.utcnow(),
+        'source': 'estimated'
+    }
+
+
+def _counter_stats(counters: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'total_documents': counters.get('total_documents', 0),
+        'total_sections': counters.get('total_sections', 0),
+        'total_contents': counters.get('total_contents', 0),
+        'documents_by_status': counters.get('documents_by_status', {}),
+        'contents_by_type': counters.get('contents_by_type', {}),
+        'bytes_ingested': counters.get('bytes_ingested', 0),
+        'updated_at': counters.get('updated_at'),
+        'source': 'counters'
+    }
+
+
+def _get_cached(now: float) -> Optional[Dict[str, Any]]:
+    with _cache_lock:
+        if _cache['value'] is not None and now < _cache['expires_at']:
+            return _cache['value']
+    return None
+
+
+def _set_cached(now: float, stats: Dict[str, Any]):
+    with _cache_lock:
+        _cache['value'] = stats
+        _cache['expires_at'] = now + _get_cache_ttl()
+
+
+def get_stats() -> Dict[str, Any]:
+    """获取文档统计信息，结果在进程内缓存 STATS_CACHE_TTL 秒"""
+    now = time.monotonic()
+    cached = _get_cached(now)
+    if cached is not None:
+        return cached
+
+    counters = system_stats.find_one({'_id': STATS_ID})
+    stats = _counter_stats(counters) if counters else _estimated_stats()
+    _set_cached(now, stats)
+    return stats
+
+
+async def get_stats_async() -> Dict[str, Any]:
+    """get_stats 的异步版本（ASGI 服务模式），与同步版本共用进程内缓存"""
+    now = time.monotonic()
+    cached = _get_cached(now)
+    if cached is not None:
+        return cached
+
+    from database.async_mongo_client import get_async_collection
+
+    counters = await get_async_collection(system_stats.name).find_one({'_id': STATS_ID})
+    if counters:
+        stats = _counter_stats(counters)
+    else:
+        stats = _make_estimated_stats(*await asyncio.gather(
+            get_async_collection(documents.name).estimated_document_count(),
+            get_async_collection(document_sections.name).estimated_document_count(),
+            get_async_collection(document_contents.name).estimated_document_count()
+        ))
+    _set_cached(now, stats)
+    return stats
+
+
+def rebuild_stats() -> Dict[str, Any]:
+    """按当前数据精确重建计数器（用于初始化已有数据，会扫描集合）"""
+    by_status = {
+        row['_id']: row['count'] for row in documents.aggregate([
+            {'$group': {'_id': '$status', 'count': {'$sum': 1}}}
+        ]) if row['_id']
+    }
+    bytes_ingested = sum(row['bytes'] for row in documents.aggregate([
+        {'$group': {'_id': None, 'bytes': {'$sum': '$file_size'}}}
+    ]))
+    by_type = {
+        row['_id']: row['count'] for row in document_contents.aggregate([
+            {'$group': {'_id': '$content_type', 'count': {'$sum': 1}}}
+        ]) if row['_id']
+    }
+    counters = {
+        'total_documents': documents.count_documents({}),
+        'total_sections': document_sections.count_documents({}),
+        'total_contents': document_contents.count_documents({}),
+        'documents_by_status': by_status,
+        'contents_by_type': by_type,
+        'bytes_ingested': bytes_ingested,
+        'updated_at': datetime.utcnow()
+    }
+    system_stats.replace_one({'_id': STATS_ID}, counters, upsert=True)
+
+    with _cache_lock:
+        _cache['value'] = None
+    return counters
\ No newline at end of file
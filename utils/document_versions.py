@@ -0,0 +1,532 @@
+"""
+文档的版本化更新
+
+上传文档的新版本时，重新解析文件并与当前版本按章节比对：
+- 章节按（层级, 标题）对齐，内容哈希（章节下各内容块哈希的组合）相同的章节不读取、不改写其内容块
+- 内容哈希不同的章节在章节内按内容块哈希对齐，只写入新增、删除和位置变化的内容块；
+  保留的内容块沿用原序号，新增的内容块插入原序号之间的空隙
+- 被修改或删除的章节、内容块先复制到 document_section_versions / document_content_versions
+  （记录原 _id 和被替换的版本号），因此历史版本仍可按版本号还原
+
+章节和内容块记录的 version 字段为其写入时的版本号（缺失表示版本1）。
+"""
+import json
+import uuid
+import hashlib
+import logging
+from collections import Counter
+from datetime import datetime
+from difflib import SequenceMatcher
+from typing import Any, BinaryIO, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from pymongo import UpdateOne
+
+from models.document_models import DocumentStatus
+from database.mongo_client import (
+    documents, document_sections, document_contents, content_relationships, search_postings,
+    content_embeddings, document_versions, document_section_versions, document_content_versions
+)
+from utils.bulk_writer import BulkWriter
+from utils.content_codec import decode_content
+from utils.document_processor import DocumentProcessor, find_duplicate_document
+from utils.document_query import CONTENT_SORT
+from utils.document_stats import record_status_change, record_document_updated
+from utils.document_outline import reading_order, save_outline
+from utils.search_index import build_postings, update_term_frequencies, content_text
+from utils.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# 可以上传新版本的文档状态
+UPDATABLE_STATUSES = (DocumentStatus.PROCESSED.value, DocumentStatus.ERROR.value)
+# 内容块序号的步长（与入库时一致）
+ORDER_STEP = 10
+# 章节记录中描述位置的字段，任一变化时章节记录更新为新版本
+SECTION_POSITION_FIELDS = ('title', 'level', 'parent_id', 'order', 'section_number')
+
+
+class DocumentUpdateConflict(Exception):
+    """文档正在处理中，或新文件与其他文档内容相同"""
+
+
+class _RecordCollector:
+    """在内存中收集解析结果的写入缓冲区（接口与 BulkWriter 相同），由比对结果决定实际写入的记录"""
+
+    def __init__(self):
+        self.records: Dict[str, List[Dict[str, Any]]] = {}
+
+    def add(self, collection, doc: Dict[str, Any]):
+        self.records.setdefault(collection.name, []).append(doc)
+
+    def flush(self):
+        pass
+
+    def after_flush(self, callback: Callable[[Optional[Exception]], None]):
+        callback(None)
+
+    def discard(self, document_id: str):
+        self.records.clear()
+
+    def get(self, collection) -> List[Dict[str, Any]]:
+        return self.records.get(collection.name, [])
+
+
+def content_hash(content_data: Dict[str, Any]) -> str:
+    """内容块的哈希（按还原后的内容计算，与存储格式无关）"""
+    decoded = decode_content(content_data)
+    payload = json.dumps(
+        [decoded.get('content_type'), decoded.get('content'), decoded.get('page')],
+        ensure_ascii=False, sort_keys=True, separators=(',', ':')
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def section_hash(content_hashes: Iterable[str]) -> str:
+    """章节的内容哈希：按顺序组合章节下各内容块的哈希（不含子章节）"""
+    digest = hashlib.sha256()
+    for value in content_hashes:
+        digest.update(value.encode('ascii'))
+    return digest.hexdigest()
+
+
+def _align(old_keys: List[Any], new_keys: List[Any],
+           pair_replaced: Optional[Callable[[Any, Any], bool]] = None) -> Tuple[Dict[int, int], List[int]]:
+    """对齐新旧两个序列，返回（新序号 -> 旧序号 的对应关系, 未对应的旧序号）
+
+    被替换的片段中，pair_replaced 为真的元素按位置一一对应（如标题修改但层级不变的章节）。
+    """
+    matches: Dict[int, int] = {}
+    matcher = SequenceMatcher(None, old_keys, new_keys, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            matches.update(zip(range(j1, j2), range(i1, i2)))
+        elif tag == 'replace' and pair_replaced is not None:
+            for i, j in zip(range(i1, i2), range(j1, j2)):
+                if pair_replaced(old_keys[i], new_keys[j]):
+                    matches[j] = i
+    matched = set(matches.values())
+    return matches, [i for i in range(len(old_keys)) if i not in matched]
+
+
+def _assign_orders(old_orders: List[Optional[int]]) -> List[int]:
+    """为新版本的内容块分配序号：保留的内容块尽量沿用原序号，新增的内容块插入原序号之间的空隙
+
+    old_orders 按新版本的顺序给出各内容块的原序号（新增的内容块为 None）。
+    """
+    orders = []
+    previous = 0
+    i = 0
+    while i < len(old_orders):
+        if old_orders[i] is not None and old_orders[i] > previous:
+            previous = old_orders[i]
+            orders.append(previous)
+            i += 1
+            continue
+
+        # 一段连续的新增（或无法沿用原序号）的内容块，放在下一个可沿用的原序号之前
+        j = i
+        while j < len(old_orders) and not (old_orders[j] is not None and old_orders[j] > previous):
+            j += 1
+        count = j - i
+        step = (old_orders[j] - previous) // (count + 1) if j < len(old_orders) else ORDER_STEP
+        # 空隙不足时顺延，之后的内容块也不再沿用原序号
+        step = step if step >= 1 else ORDER_STEP
+        for _ in range(count):
+            previous += step
+            orders.append(previous)
+        i = j
+    return orders
+
+
+def _archive(record: Dict[str, Any], superseded_version: int) -> Dict[str, Any]:
+    """生成历史版本记录：记录原 _id 和被替换时的版本号"""
+    archived = dict(record, _id=str(uuid.uuid4()), record_id=record['_id'],
+                    superseded_version=superseded_version)
+    archived.setdefault('version', 1)
+    return archived
+
+
+def _restore(archived: Dict[str, Any]) -> Dict[str, Any]:
+    """将历史版本记录还原为原记录"""
+    record = dict(archived, _id=archived['record_id'])
+    record.pop('record_id', None)
+    record.pop('superseded_version', None)
+    return record
+
+
+def _change_counts() -> Dict[str, int]:
+    return {'inserted': 0, 'updated': 0, 'removed': 0, 'unchanged': 0}
+
+
+def _version_record(doc: Dict[str, Any], version: int, created_at: datetime,
+                    changes: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return {
+        '_id': f"{doc['_id']}:{version}",
+        'document_id': doc['_id'],
+        'version': version,
+        'filename': doc.get('filename'),
+        'file_type': doc.get('file_type'),
+        'content_hash': doc.get('content_hash'),
+        'file_size': doc.get('file_size'),
+        'created_at': created_at,
+        'changes': changes
+    }
+
+
+class _VersionUpdate:
+    """比对新旧版本并写入差异"""
+
+    def __init__(self, doc: Dict[str, Any], processor: DocumentProcessor):
+        self.doc = doc
+        self.document_id = doc['_id']
+        self.previous_version = doc.get('version', 1)
+        self.version = self.previous_version + 1
+        self.processor = processor
+        self.writer = BulkWriter()
+        self.section_updates: List[UpdateOne] = []
+        self.content_updates: List[UpdateOne] = []
+        self.removed_section_ids: List[str] = []
+        self.removed_content_ids: List[str] = []
+        self.term_deltas = Counter()
+        self.content_type_deltas = Counter()
+        self.pending_embeddings: List[Dict[str, Any]] = []
+        # numpy 较重，按需导入
+        from utils.embeddings import get_embedder, EMBEDDING_BATCH_SIZE
+        self.embedder = get_embedder()
+        self.embedding_batch_size = EMBEDDING_BATCH_SIZE
+        self.sections = _change_counts()
+        self.contents = _change_counts()
+        # 是否写入或删除了向量
+        self.embeddings_changed = False
+
+        collector = processor.writer
+        self.new_sections = collector.get(document_sections)
+        self.new_contents_by_section: Dict[str, List[Dict[str, Any]]] = {}
+        for content in collector.get(document_contents):
+            self.new_contents_by_section.setdefault(content['section_id'], []).append(content)
+        self.new_hashes = {
+            content['_id']: content_hash(content) for content in collector.get(document_contents)
+        }
+
+    def apply(self) -> Dict[str, Any]:
+        old_sections = reading_order(list(document_sections.find({'document_id': self.document_id})))
+        new_section_hashes = {
+            section['_id']: section_hash(
+                self.new_hashes[content['_id']] for content in self.new_contents_by_section.get(section['_id'], []))
+            for section in self.new_sections
+        }
+        matches, removed = _align(
+            [(section['level'], section['title']) for section in old_sections],
+            [(section['level'], section['title']) for section in self.new_sections],
+            pair_replaced=lambda old, new: old[0] == new[0]
+        )
+
+        # 只读取需要比对或删除的章节的内容块
+        load_ids = [old_sections[i]['_id'] for i in removed]
+        for j, i in matches.items():
+            if old_sections[i].get('content_hash') != new_section_hashes[self.new_sections[j]['_id']]:
+                load_ids.append(old_sections[i]['_id'])
+        old_contents_by_section: Dict[str, List[Dict[str, Any]]] = {}
+        if load_ids:
+            cursor = document_contents.find(
+                {'document_id': self.document_id, 'section_id': {'$in': load_ids}}).sort(CONTENT_SORT)
+            for content in cursor:
+                old_contents_by_section.setdefault(content['section_id'], []).append(content)
+
+        # 新版本的章节 _id -> 写入后的章节 _id（对应旧章节时沿用旧 _id）
+        self.id_map: Dict[str, str] = {}
+        id_map = self.id_map
+        for j, new in enumerate(self.new_sections):
+            parent_id = id_map.get(new['parent_id']) if new.get('parent_id') else None
+            new_hash = new_section_hashes[new['_id']]
+            new_contents = self.new_contents_by_section.get(new['_id'], [])
+            if j not in matches:
+                id_map[new['_id']] = new['_id']
+                self.writer.add(document_sections,
+                                dict(new, parent_id=parent_id, content_hash=new_hash, version=self.version))
+                self.sections['inserted'] += 1
+                for content in new_contents:
+                    self._insert_content(content, new['_id'], content['order'])
+                continue
+
+            old = old_sections[matches[j]]
+            id_map[new['_id']] = old['_id']
+            if old.get('content_hash') != new_hash:
+                old_contents = old_contents_by_section.get(old['_id'], [])
+                old_hashes = [content_hash(content) for content in old_contents]
+                if section_hash(old_hashes) != new_hash:
+                    self._diff_contents(old['_id'], old_contents, old_hashes, new_contents)
+                else:
+                    self.contents['unchanged'] += len(old_contents)
+            else:
+                self.contents['unchanged'] += len(new_contents)
+
+            position = {'title': new['title'], 'level': new['level'], 'parent_id': parent_id,
+                        'order': new['order'], 'section_number': new['section_number']}
+            if any(old.get(field) != position[field] for field in SECTION_POSITION_FIELDS):
+                self.writer.add(document_section_versions, _archive(old, self.version))
+                self.section_updates.append(UpdateOne(
+                    {'_id': old['_id']},
+                    {'$set': dict(position, content_hash=new_hash, version=self.version)}
+                ))
+                self.sections['updated'] += 1
+            else:
+                if old.get('content_hash') != new_hash:
+                    # 内容哈希是派生字段，更新时不产生新的章节版本
+                    self.section_updates.append(UpdateOne({'_id': old['_id']}, {'$set': {'content_hash': new_hash}}))
+                self.sections['unchanged'] += 1
+
+        for i in removed:
+            old = old_sections[i]
+            self.writer.add(document_section_versions, _archive(old, self.version))
+            self.removed_section_ids.append(old['_id'])
+            self.sections['removed'] += 1
+            for content in old_contents_by_section.get(old['_id'], []):
+                self._remove_content(content)
+
+        self._flush_embeddings()
+        self._write()
+        return {
+            'document_id': self.document_id,
+            'version': self.version,
+            'previous_version': self.previous_version,
+            'changed': True,
+            'sections': self.sections,
+            'contents': self.contents
+        }
+
+    def _diff_contents(self, section_id: str, old_contents: List[Dict[str, Any]], old_hashes: List[str],
+                       new_contents: List[Dict[str, Any]]):
+        """章节内按内容块哈希比对，保留的内容块只在序号变化时更新"""
+        matches, removed = _align(old_hashes, [self.new_hashes[content['_id']] for content in new_contents])
+        orders = _assign_orders([
+            old_contents[matches[j]]['order'] if j in matches else None for j in range(len(new_contents))
+        ])
+        for j, content in enumerate(new_contents):
+            if j not in matches:
+                self._insert_content(content, section_id, orders[j])
+                continue
+            old = old_contents[matches[j]]
+            if old['order'] != orders[j]:
+                self.writer.add(document_content_versions, _archive(old, self.version))
+                self.content_updates.append(UpdateOne(
+                    {'_id': old['_id']}, {'$set': {'order': orders[j], 'version': self.version}}))
+                self.contents['updated'] += 1
+            else:
+                self.contents['unchanged'] += 1
+        for i in removed:
+            self._remove_content(old_contents[i])
+
+    def _insert_content(self, content: Dict[str, Any], section_id: str, order: int):
+        record = dict(content, section_id=section_id, order=order, version=self.version)
+        self.writer.add(document_contents, record)
+        for posting in build_postings(record):
+            self.writer.add(search_postings, posting)
+            self.term_deltas[posting['term']] += 1
+        if self.embedder is not None:
+            self.pending_embeddings.append(record)
+        self.content_type_deltas[record['content_type']] += 1
+        self.contents['inserted'] += 1
+
+    def _remove_content(self, content: Dict[str, Any]):
+        self.writer.add(document_content_versions, _archive(content, self.version))
+        self.removed_content_ids.append(content['_id'])
+        self.content_type_deltas[content['content_type']] -= 1
+        self.contents['removed'] += 1
+
+    def _flush_embeddings(self):
+        if not self.pending_embeddings:
+            return
+        from utils.embeddings import build_embedding_records
+
+        with timed('embedding'):
+            for start in range(0, len(self.pending_embeddings), self.embedding_batch_size):
+                contents = self.pending_embeddings[start:start + self.embedding_batch_size]
+                records = build_embedding_records(
+                    self.embedder, contents, [content_text(content) for content in contents])
+                for record in records:
+                    self.writer.add(content_embeddings, record)
+        self.pending_embeddings = []
+        self.embeddings_changed = True
+
+    def _write(self):
+        """写入差异：先写入新记录和历史版本，再更新和删除当前记录"""
+        self.writer.flush()
+        with timed('db_write'):
+            if self.section_updates:
+                document_sections.bulk_write(self.section_updates, ordered=False)
+            if self.content_updates:
+                document_contents.bulk_write(self.content_updates, ordered=False)
+
+            if self.removed_content_ids:
+                ids = self.removed_content_ids
+                self.term_deltas.subtract(Counter(
+                    posting['term'] for posting in search_postings.find({'content_id': {'$in': ids}}, {'term': 1})
+                ))
+                search_postings.delete_many({'content_id': {'$in': ids}})
+                if content_embeddings.delete_many({'_id': {'$in': ids}}).deleted_count:
+                    self.embeddings_changed = True
+                content_relationships.delete_many({'$or': [
+                    {'source_id': {'$in': ids}},
+                    {'target_id': {'$in': ids}}
+                ]})
+                document_contents.delete_many({'_id': {'$in': ids}})
+            if self.removed_section_ids:
+                document_sections.delete_many({'_id': {'$in': self.removed_section_ids}})
+
+        term_deltas = Counter({term: delta for term, delta in self.term_deltas.items() if delta})
+        if term_deltas:
+            with timed('search_index'):
+                update_term_frequencies(term_deltas)
+
+
+def update_document(document_id: str, filename: str,
+                    file_content: Union[bytes, BinaryIO]) -> Optional[Dict[str, Any]]:
+    """上传文档的新版本，只写入与当前版本不同的章节和内容块，返回版本号和变更统计
+
+    文档不存在时返回 None；文档正在处理中，或新文件与其他文档内容相同时抛出 DocumentUpdateConflict。
+    """
+    doc = documents.find_one({'_id': document_id})
+    if not doc:
+        return None
+
+    # 解析时不构建索引和向量，比对后只为新增的内容块构建
+    processor = DocumentProcessor(filename, file_content, document_id=document_id, build_search_index=False,
+                                  build_embeddings=False, writer=_RecordCollector())
+    try:
+        if processor.source.sha256 == doc.get('content_hash') and doc.get('status') == DocumentStatus.PROCESSED.value:
+            version = doc.get('version', 1)
+            return {
+                'document_id': document_id,
+                'version': version,
+                'previous_version': version,
+                'changed': False,
+                'sections': _change_counts(),
+                'contents': _change_counts()
+            }
+        duplicate = find_duplicate_document(processor.source.sha256)
+        if duplicate and duplicate['_id'] != document_id:
+            raise DocumentUpdateConflict(f"文件内容与已有文档 {duplicate['_id']} 相同")
+
+        # 原子地将文档标记为处理中，同一文档的并发更新只有一个生效
+        claimed = documents.find_one_and_update(
+            {'_id': document_id, 'status': {'$in': list(UPDATABLE_STATUSES)}},
+            {'$set': {'status': DocumentStatus.PROCESSING.value, 'last_modified': datetime.utcnow()}}
+        )
+        if not claimed:
+            raise DocumentUpdateConflict("文档正在处理中，请稍后再上传新版本")
+        record_status_change(claimed['status'], DocumentStatus.PROCESSING.value)
+
+        with timed('update_document'):
+            try:
+                processor.parse()
+            except Exception as e:
+                # 解析失败时尚未写入任何记录，恢复原状态
+                documents.update_one({'_id': document_id}, {'$set': {'status': claimed['status']}})
+                record_status_change(DocumentStatus.PROCESSING.value, claimed['status'])
+                raise Exception(f"处理文档时出错: {str(e)}")
+
+            try:
+                update = _VersionUpdate(claimed, processor)
+                result = update.apply()
+                _mark_updated(update, result)
+            except Exception as e:
+                # 部分差异可能已写入，标记为处理失败，可重新上传新版本修复
+                logger.error(f"Failed to update document {document_id}: {e}")
+                documents.update_one(
+                    {'_id': document_id},
+                    {'$set': {'status': DocumentStatus.ERROR.value, 'error_message': str(e)},
+                     '$unset': {'content_hash': ''}}
+                )
+                record_status_change(DocumentStatus.PROCESSING.value, DocumentStatus.ERROR.value)
+                raise Exception(f"更新文档时出错: {str(e)}")
+        return result
+    finally:
+        processor.source.close()
+
+
+def _mark_updated(update: _VersionUpdate, result: Dict[str, Any]):
+    """记录版本信息，更新文档记录和统计"""
+    doc, processor = update.doc, update.processor
+    now = datetime.utcnow()
+    # 首次更新时补记版本1（上传时的文件信息）
+    document_versions.update_one(
+        {'_id': f"{doc['_id']}:{result['previous_version']}"},
+        {'$setOnInsert': _version_record(doc, result['previous_version'], doc.get('upload_time'))},
+        upsert=True
+    )
+    updated = dict(doc, filename=processor.filename, file_type=processor.file_type,
+                   content_hash=processor.source.sha256, file_size=processor.source.size)
+    changes = {'sections': result['sections'], 'contents': result['contents']}
+    save_outline(processor.outline.build(doc['_id'], result['version'], update.id_map))
+    document_versions.insert_one(_version_record(updated, result['version'], now, changes))
+
+    documents.update_one(
+        {'_id': doc['_id']},
+        {'$set': {
+            'status': DocumentStatus.PROCESSED.value,
+            'version': result['version'],
+            'filename': processor.filename,
+            'file_type': processor.file_type,
+            'content_hash': processor.source.sha256,
+            'file_size': processor.source.size,
+            'progress': processor.progress,
+            'last_modified': now
+        },
+        # 发布新版本时清除之前失败/中断的入库运行，避免回收时删除与其 run_id 相同的现有记录
+        '$unset': {'error_message': '', 'ingest_run': ''}}
+    )
+    record_status_change(DocumentStatus.PROCESSING.value, DocumentStatus.PROCESSED.value)
+    if update.embeddings_changed:
+        # 替换相同数量的内容块时向量数不变，需通知向量索引更新该文档的向量
+        from utils.vector_index import notify_embeddings_changed
+        notify_embeddings_changed([doc['_id']])
+    sections = result['sections']
+    record_document_updated(
+        sections=sections['inserted'] - sections['removed'],
+        contents=update.content_type_deltas,
+        file_size=processor.source.size
+    )
+
+
+def list_versions(doc: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """列出文档的各个版本（从未更新过的文档只有版本1）"""
+    versions = list(document_versions.find({'document_id': doc['_id']}).sort('version', 1))
+    current = doc.get('version', 1)
+    if not any(version['version'] == current for version in versions):
+        versions.append(_version_record(doc, current, doc.get('upload_time')))
+    return versions
+
+
+def get_document_version(doc: Dict[str, Any], version: int) -> Optional[Dict[str, Any]]:
+    """还原文档的指定版本，返回文档信息和该版本的章节、内容块（内容块为存储格式）；版本不存在时返回 None"""
+    current = doc.get('version', 1)
+    if version < 1 or version > current:
+        return None
+
+    document_id = doc['_id']
+    current_query = {
+        'document_id': document_id,
+        '$or': [{'version': {'$lte': version}}, {'version': {'$exists': False}}]
+    }
+    archived_query = {
+        'document_id': document_id,
+        'version': {'$lte': version},
+        'superseded_version': {'$gt': version}
+    }
+    sections = list(document_sections.find(current_query)) + [
+        _restore(record) for record in document_section_versions.find(archived_query)]
+    contents = list(document_contents.find(current_query)) + [
+        _restore(record) for record in document_content_versions.find(archived_query)]
+    # 按阅读顺序排列：章节按章节树，内容块按所在章节的位置和章节内的序号
+    sections = reading_order(sections)
+    ranks = {section['_id']: rank for rank, section in enumerate(sections)}
+    contents.sort(key=lambda c: (ranks.get(c['section_id'], len(ranks)), c['order'], c['_id']))
+
+    document = dict(doc, version=version)
+    if version != current:
+        record = document_versions.find_one({'_id': f"{document_id}:{version}"}) or {}
+        for field in ('filename', 'file_type', 'content_hash', 'file_size'):
+            if field in record:
+                document[field] = record[field]
+    return {'document': document, 'sections': sections, 'contents': contents}
@@ -0,0 +1,145 @@
+"""
+Word文档正文的单次遍历
+
+直接遍历 document.element.body 的子元素，按文档中的实际顺序产出标题、段落和表格，
+不为每个段落、单元格创建 python-docx 对象，也不逐段落查询样式。
+段落和单元格文本的取法与 python-docx 的 Paragraph.text / _Cell.text 一致。
+"""
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from docx.styles import BabelFish
+
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+
+
+def _w(name: str) -> str:
+    return f'{{{W_NS}}}{name}'
+
+
+P = _w('p')
+TBL = _w('tbl')
+TR = _w('tr')
+TC = _w('tc')
+R = _w('r')
+HYPERLINK = _w('hyperlink')
+T = _w('t')
+TAB = _w('tab')
+PTAB = _w('ptab')
+BR = _w('br')
+CR = _w('cr')
+NO_BREAK_HYPHEN = _w('noBreakHyphen')
+PPR = _w('pPr')
+PSTYLE = _w('pStyle')
+TCPR = _w('tcPr')
+VMERGE = _w('vMerge')
+STYLE = _w('style')
+NAME = _w('name')
+VAL = _w('val')
+TYPE = _w('type')
+DEFAULT = _w('default')
+STYLE_ID = _w('styleId')
+
+HEADING_PREFIX = 'Heading'
+
+
+def build_paragraph_styles(document) -> Tuple[Dict[str, str], Optional[str]]:
+    """读取段落样式ID到样式名（界面名称，如 'Heading 1'）的映射，以及默认段落样式名"""
+    names = {}
+    default_name = None
+    for style in document.styles.element.iterchildren(STYLE):
+        if style.get(TYPE) != 'paragraph':
+            continue
+        name_element = style.find(NAME)
+        name = BabelFish.internal2ui(name_element.get(VAL)) if name_element is not None else None
+        names[style.get(STYLE_ID)] = name
+        if style.get(DEFAULT) in ('1', 'true', 'on'):
+            default_name = name
+    return names, default_name
+
+
+def heading_level(style_name: Optional[str]) -> Optional[int]:
+    """'Heading N' 样式返回标题级别 N，其他样式返回 None"""
+    if not style_name or not style_name.startswith(HEADING_PREFIX):
+        return None
+    level = style_name[len(HEADING_PREFIX):].strip()
+    return int(level) if level.isdigit() else None
+
+
+def _append_run_text(run, parts: List[str]):
+    for element in run:
+        tag = element.tag
+        if tag == T:
+            parts.append(element.text or '')
+        elif tag == TAB or tag == PTAB:
+            parts.append('\t')
+        elif tag == BR:
+            # 分页符、分栏符没有对应的文本
+            if element.get(TYPE, 'textWrapping') == 'textWrapping':
+                parts.append('\n')
+        elif tag == CR:
+            parts.append('\n')
+        elif tag == NO_BREAK_HYPHEN:
+            parts.append('-')
+
+
+def paragraph_text(paragraph) -> str:
+    """段落文本，包括超链接中的文字；制表符和换行分别转为 \\t 和 \\n"""
+    parts: List[str] = []
+    for child in paragraph:
+        if child.tag == R:
+            _append_run_text(child, parts)
+        elif child.tag == HYPERLINK:
+            for run in child.iterchildren(R):
+                _append_run_text(run, parts)
+    return ''.join(parts)
+
+
+def _paragraph_style_id(paragraph) -> Optional[str]:
+    ppr = paragraph.find(PPR)
+    if ppr is None:
+        return None
+    pstyle = ppr.find(PSTYLE)
+    return pstyle.get(VAL) if pstyle is not None else None
+
+
+def table_rows(table) -> List[List[str]]:
+    """表格各行的单元格文本
+
+    每个 w:tc 只输出一次，横向合并（gridSpan）的单元格不再按列重复；
+    纵向合并（vMerge）的后续单元格输出空字符串，内容只保留在合并区域的第一行。
+    """
+    rows = []
+    for tr in table.iterchildren(TR):
+        row = []
+        for tc in tr.iterchildren(TC):
+            tcpr = tc.find(TCPR)
+            vmerge = tcpr.find(VMERGE) if tcpr is not None else None
+            # vMerge 未指定 val 时表示延续上方单元格
+            if vmerge is not None and vmerge.get(VAL, 'continue') == 'continue':
+                row.append('')
+            else:
+                row.append('\n'.join(paragraph_text(p) for p in tc.iterchildren(P)))
+        rows.append(row)
+    return rows
+
+
+def iter_docx_blocks(document) -> Iterator[Dict[str, Any]]:
+    """按文档顺序产出正文中的块
+
+    - {'type': 'heading', 'level': int, 'text': str}
+    - {'type': 'paragraph', 'text': str}
+    - {'type': 'table', 'rows': List[List[str]]}
+    """
+    styles, default_style = build_paragraph_styles(document)
+    for element in document.element.body.iterchildren():
+        if element.tag == P:
+            style_id = _paragraph_style_id(element)
+            style_name = styles.get(style_id, default_style) if style_id else default_style
+            level = heading_level(style_name)
+            text = paragraph_text(element)
+            if level is not None:
+                yield {'type': 'heading', 'level': level, 'text': text}
+            else:
+                yield {'type': 'paragraph', 'text': text}
+        elif element.tag == TBL:
+            yield {'type': 'table', 'rows': table_rows(element)}
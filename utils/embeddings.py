@@ -0,0 +1,135 @@
+import os
+import zlib
+import math
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import Counter
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from bson import Binary
+
+from utils.search_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMBEDDING_BACKEND = 'hashing'
+DEFAULT_EMBEDDING_DIM = 256
+# 入库时每累积多少个内容块计算一次向量
+EMBEDDING_BATCH_SIZE = 64
+# 向量以小端 float32 存储
+VECTOR_DTYPE = np.dtype('<f4')
+
+
+def encode_vector(vector: np.ndarray) -> Binary:
+    """将向量编码为紧凑的二进制（float32）"""
+    return Binary(np.asarray(vector, dtype=VECTOR_DTYPE).tobytes())
+
+
+def decode_vector(data: bytes) -> np.ndarray:
+    """将二进制解码为 float32 向量"""
+    return np.frombuffer(data, dtype=VECTOR_DTYPE)
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """按行做L2归一化（零向量保持为零）"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class Embedder(ABC):
+    """文本向量化接口"""
+
+    # 模型标识，随向量一起存储；更换模型后旧向量不会被加载
+    name: str = ''
+    dimension: int = 0
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """返回形状为 (len(texts), dimension) 的 float32 矩阵，各行已归一化"""
+
+
+@lru_cache(maxsize=200000)
+def _hash_token(token: str):
+    value = zlib.crc32(token.encode('utf-8'))
+    return value, 1.0 if value & 0x80000000 else -1.0
+
+
+class HashingEmbedder(Embedder):
+    """本地哈希向量化：词项（与全文检索相同的分词）经特征哈希映射到固定维度
+
+    权重为 1 + log(tf)，符号由哈希值决定以抵消冲突带来的偏差。结果确定且无需训练或联网，
+    适合作为默认实现；需要语义更强的向量时可通过 set_embedder 替换。
+    """
+
+    def __init__(self, dimension: int = DEFAULT_EMBEDDING_DIM):
+        if dimension < 1:
+            raise ValueError("向量维度必须大于0")
+        self.dimension = dimension
+        self.name = f"hashing-{dimension}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token, tf in Counter(tokenize(text)).items():
+                value, sign = _hash_token(token)
+                vectors[row, value % self.dimension] += sign * (1.0 + math.log(tf))
+        return normalize_rows(vectors)
+
+
+def _create_default_embedder() -> Optional[Embedder]:
+    backend = os.getenv('EMBEDDING_BACKEND', DEFAULT_EMBEDDING_BACKEND)
+    if backend == 'none':
+        return None
+    if backend != 'hashing':
+        logger.warning(f"Unknown EMBEDDING_BACKEND value, using default: {DEFAULT_EMBEDDING_BACKEND}")
+    try:
+        dimension = int(os.getenv('EMBEDDING_DIM', DEFAULT_EMBEDDING_DIM))
+    except (TypeError, ValueError):
+        logger.warning(f"Invalid EMBEDDING_DIM value, using default: {DEFAULT_EMBEDDING_DIM}")
+        dimension = DEFAULT_EMBEDDING_DIM
+    return HashingEmbedder(dimension)
+
+
+_embedder: Optional[Embedder] = None
+_embedder_loaded = False
+_embedder_lock = threading.Lock()
+
+
+def get_embedder() -> Optional[Embedder]:
+    """获取当前使用的向量化实现（EMBEDDING_BACKEND=none 时返回 None，不生成向量）"""
+    global _embedder, _embedder_loaded
+    if not _embedder_loaded:
+        with _embedder_lock:
+            if not _embedder_loaded:
+                _embedder = _create_default_embedder()
+                _embedder_loaded = True
+    return _embedder
+
+
+def set_embedder(embedder: Optional[Embedder]):
+    """替换向量化实现（例如接入外部模型）"""
+    global _embedder, _embedder_loaded
+    with _embedder_lock:
+        _embedder = embedder
+        _embedder_loaded = True
+
+
+def build_embedding_records(embedder: Embedder, contents: List[Dict[str, Any]],
+                            texts: List[str]) -> List[Dict[str, Any]]:
+    """为一批内容块计算向量，返回待写入 content_embeddings 的记录（跳过没有文本的内容块）"""
+    pairs = [(content, text) for content, text in zip(contents, texts) if text.strip()]
+    if not pairs:
+        return []
+
+    vectors = embedder.embed([text for _, text in pairs])
+    return [{
+        '_id': content['_id'],
+        'document_id': content['document_id'],
+        'section_id': content['section_id'],
+        'model': embedder.name,
+        'vector': encode_vector(vector)
+    } for (content, _), vector in zip(pairs, vectors)]
@@ -0,0 +1,312 @@
+"""
+文档解析的隔离工作进程池
+
+各格式的解析函数在常驻的工作进程中执行，与Web进程隔离：
+- 每个任务的累计等待时间超过 EXTRACT_TIMEOUT 秒（默认120）时终止该工作进程，任务以超时失败
+- 工作进程的地址空间受 EXTRACT_MEMORY_LIMIT_MB 限制（默认1024MB，0 表示不限制，依赖 RLIMIT_AS），
+  超出时解析以 MemoryError 失败，不影响Web进程
+- 进程池创建时预先启动 EXTRACT_WORKERS 个工作进程（默认为CPU核数），各进程启动时预先导入解析库，
+  之后跨任务复用；超时、内存超限或异常退出的工作进程被终止，在下次使用时重新启动
+
+解析函数须为模块级函数；stream 方式下函数返回迭代器，结果分批传回，调用方可以边解析边入库。
+EXTRACT_ISOLATION=false 时在当前进程中直接调用解析函数（不限制耗时和内存）。
+"""
+import os
+import time
+import queue
+import atexit
+import signal
+import logging
+import importlib
+import threading
+import multiprocessing
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EXTRACT_TIMEOUT = 120.0
+DEFAULT_EXTRACT_MEMORY_LIMIT_MB = 1024
+# stream 方式下每批传回的结果数
+STREAM_BATCH_SIZE = 32
+# 工作进程启动时预先导入的解析库，避免每个任务付出导入成本
+PRELOAD_MODULES = ('PyPDF2', 'docx', 'utils.docx_walker')
+
+
+class ExtractionError(Exception):
+    """文档解析失败（解析出错、超时或工作进程异常退出）"""
+
+
+class ExtractionTimeout(ExtractionError):
+    """文档解析超时"""
+
+
+def get_extract_workers() -> int:
+    """读取解析工作进程数上限配置（默认为CPU核数）"""
+    default_workers = os.cpu_count() or 1
+    try:
+        return max(1, int(os.getenv('EXTRACT_WORKERS', default_workers)))
+    except (TypeError, ValueError):
+        logger.warning(f"Invalid EXTRACT_WORKERS value, using default: {default_workers}")
+        return default_workers
+
+
+def get_extract_timeout() -> float:
+    """读取单个解析任务的超时配置（秒，0 表示不限制）"""
+    try:
+        return max(0.0, float(os.getenv('EXTRACT_TIMEOUT', DEFAULT_EXTRACT_TIMEOUT)))
+    except (TypeError, ValueError):
+        logger.warning(f"Invalid EXTRACT_TIMEOUT value, using default: {DEFAULT_EXTRACT_TIMEOUT}")
+        return DEFAULT_EXTRACT_TIMEOUT
+
+
+def get_extract_memory_limit() -> int:
+    """读取工作进程的内存上限配置（MB，0 表示不限制）"""
+    try:
+        return max(0, int(os.getenv('EXTRACT_MEMORY_LIMIT_MB', DEFAULT_EXTRACT_MEMORY_LIMIT_MB)))
+    except (TypeError, ValueError):
+        logger.warning(f"Invalid EXTRACT_MEMORY_LIMIT_MB value, using default: {DEFAULT_EXTRACT_MEMORY_LIMIT_MB}")
+        return DEFAULT_EXTRACT_MEMORY_LIMIT_MB
+
+
+def is_isolation_enabled() -> bool:
+    """是否在隔离的工作进程中解析文档"""
+    return os.getenv('EXTRACT_ISOLATION', 'true').lower() not in ('0', 'false', 'no')
+
+
+def _apply_memory_limit(memory_limit_mb: int):
+    if not memory_limit_mb:
+        return
+    try:
+        import resource
+    except ImportError:
+        # Windows 不支持 RLIMIT_AS
+        return
+    # 只设置软限制，由工作进程启动的转换工具可以恢复为原有上限
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    limit = memory_limit_mb * 1024 * 1024
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def _worker_main(conn, memory_limit_mb: int):
+    """工作进程主循环：依次执行任务，结果通过管道返回"""
+    # 中断信号由父进程处理，工作进程由父进程终止
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for name in PRELOAD_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+    _apply_memory_limit(memory_limit_mb)
+
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+
+        func, args, stream = task
+        try:
+            result = func(*args)
+            if stream:
+                batch = []
+                for item in result:
+                    batch.append(item)
+                    if len(batch) >= STREAM_BATCH_SIZE:
+                        conn.send(('items', batch))
+                        batch = []
+                if batch:
+                    conn.send(('items', batch))
+                result = None
+            conn.send(('done', result))
+        except MemoryError:
+            conn.send(('fatal', f"超出解析进程的内存上限（{memory_limit_mb}MB）"))
+        except Exception as e:
+            conn.send(('error', str(e) or type(e).__name__))
+
+
+class _Worker:
+    """一个常驻的工作进程及其管道"""
+
+    def __init__(self, context, memory_limit_mb: int):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(child_conn, memory_limit_mb),
+            name='extract-worker',
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+    def stop(self, kill: bool = False):
+        if self.process.is_alive():
+            if kill:
+                self.process.kill()
+            else:
+                try:
+                    self.conn.send(None)
+                except OSError:
+                    self.process.kill()
+            self.process.join(timeout=5)
+        self.conn.close()
+
+
+class ExtractorPool:
+    """隔离的解析工作进程池（线程安全）"""
+
+    def __init__(self, size: Optional[int] = None, timeout: Optional[float] = None,
+                 memory_limit_mb: Optional[int] = None):
+        self.size = size or get_extract_workers()
+        self.timeout = timeout if timeout is not None else get_extract_timeout()
+        self.memory_limit_mb = memory_limit_mb if memory_limit_mb is not None else get_extract_memory_limit()
+        # 使用spawn避免在持有数据库连接和线程的进程中fork
+        self._context = multiprocessing.get_context('spawn')
+        # 空闲的工作进程（后进先出，优先复用最近使用的进程），None 表示待重新启动的名额
+        self._idle: 'queue.LifoQueue[Optional[_Worker]]' = queue.LifoQueue()
+        self._workers: List[_Worker] = []
+        self._lock = threading.Lock()
+        self._dispatcher = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix='extract')
+        # 各工作进程并行启动，首个任务只需等待一个进程就绪
+        for _ in range(self.size):
+            self._idle.put(self._spawn())
+
+    def _spawn(self) -> _Worker:
+        worker = _Worker(self._context, self.memory_limit_mb)
+        with self._lock:
+            self._workers.append(worker)
+        return worker
+
+    def _discard(self, worker: _Worker):
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+        worker.stop(kill=True)
+
+    def _checkout(self) -> _Worker:
+        """取得一个空闲的工作进程，全部繁忙时等待"""
+        worker = self._idle.get()
+        if worker is not None and not worker.is_alive():
+            logger.warning(f"Extract worker {worker.process.pid} exited, restarting")
+            self._discard(worker)
+            worker = None
+        return worker or self._spawn()
+
+    def _checkin(self, worker: _Worker, healthy: bool):
+        if healthy:
+            self._idle.put(worker)
+            return
+        # 状态不确定的工作进程直接终止，名额留给下次使用时重新启动
+        self._discard(worker)
+        self._idle.put(None)
+
+    def _receive(self, worker: _Worker, timeout: float, waited: float):
+        """等待工作进程的下一条消息；返回消息和累计等待时间"""
+        started = time.monotonic()
+        try:
+            if not worker.conn.poll(max(0.0, timeout - waited) if timeout else None):
+                raise ExtractionTimeout(f"文档解析超时（超过 {timeout:g} 秒）")
+            message = worker.conn.recv()
+        except (EOFError, OSError):
+            worker.process.join(timeout=1)
+            raise ExtractionError(f"解析进程异常退出（退出码 {worker.process.exitcode}）")
+        return message, waited + time.monotonic() - started
+
+    def stream(self, func: Callable[..., Iterator[Any]], *args, timeout: Optional[float] = None) -> Iterator[Any]:
+        """在工作进程中执行返回迭代器的解析函数，逐个产出结果
+
+        工作进程在迭代结束前一直被占用；调用方提前停止迭代时终止该工作进程。
+        """
+        timeout = self.timeout if timeout is None else timeout
+        worker = self._checkout()
+        healthy = False
+        try:
+            worker.conn.send((func, args, True))
+            waited = 0.0
+            while True:
+                (kind, payload), waited = self._receive(worker, timeout, waited)
+                if kind == 'items':
+                    yield from payload
+                    continue
+                healthy = kind in ('done', 'error')
+                if kind == 'done':
+                    return
+                raise ExtractionError(payload)
+        finally:
+            self._checkin(worker, healthy)
+
+    def run(self, func: Callable[..., Any], *args, timeout: Optional[float] = None) -> Any:
+        """在工作进程中执行解析函数并返回结果"""
+        timeout = self.timeout if timeout is None else timeout
+        worker = self._checkout()
+        healthy = False
+        try:
+            worker.conn.send((func, args, False))
+            (kind, payload), _ = self._receive(worker, timeout, 0.0)
+            healthy = kind in ('done', 'error')
+            if kind == 'done':
+                return payload
+            raise ExtractionError(payload)
+        finally:
+            self._checkin(worker, healthy)
+
+    def submit(self, func: Callable[..., Any], *args, timeout: Optional[float] = None) -> Future:
+        """异步执行解析函数（同时执行的任务数不超过工作进程数）"""
+        return self._dispatcher.submit(self.run, func, *args, timeout=timeout)
+
+    def close(self):
+        """停止全部工作进程"""
+        self._dispatcher.shutdown(wait=False)
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.stop()
+
+
+class InlineExtractorPool:
+    """在当前进程中直接执行解析函数（EXTRACT_ISOLATION=false），接口与 ExtractorPool 相同"""
+
+    size = 1
+
+    def stream(self, func: Callable[..., Iterator[Any]], *args, timeout: Optional[float] = None) -> Iterator[Any]:
+        return iter(func(*args))
+
+    def run(self, func: Callable[..., Any], *args, timeout: Optional[float] = None) -> Any:
+        return func(*args)
+
+    def submit(self, func: Callable[..., Any], *args, timeout: Optional[float] = None) -> Future:
+        future = Future()
+        try:
+            future.set_result(func(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def close(self):
+        pass
+
+
+_pool = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+
+
+def get_extractor_pool():
+    """获取本进程常驻的解析进程池（fork 出的子进程会创建自己的进程池）"""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            if is_isolation_enabled():
+                _pool = ExtractorPool()
+                atexit.register(_pool.close)
+            else:
+                _pool = InlineExtractorPool()
+            _pool_pid = os.getpid()
+        return _pool
@@ -0,0 +1,587 @@
+"""
+文档格式解析器注册表
+
+按文件内容的特征字节（python-magic，未安装 libmagic 时使用内置的签名表）判断文件类型，
+按类型选择解析器。解析器产出按文档顺序排列的块，由 DocumentProcessor 统一建立章节并保存内容：
+- {'type': 'heading', 'level': int, 'text': str}：标题，开始新章节
+- {'type': 'paragraph', 'text': str}：段落
+- {'type': 'table', 'rows': List[List[str]]}：表格，第一行为表头
+- {'type': 'page', 'text': str}：一页文本（PDF），内容块记录页码
+- {'type': 'text', 'text': str}：连续文本的一个片段，相邻片段合并后分块（纯文本）
+
+除纯文本的逐段解码外，各格式的解析都在隔离的解析进程池（utils.extractor_pool）中执行。
+新的格式通过 register_extractor 注册。
+"""
+import io
+import os
+import codecs
+import re
+import shutil
+import logging
+import tempfile
+import zipfile
+import subprocess
+from html.parser import HTMLParser
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from utils.upload_source import MappedFile, UploadSource
+from utils.extractor_pool import get_extractor_pool, get_extract_timeout
+
+logger = logging.getLogger(__name__)
+
+Block = Dict[str, Any]
+TaskSource = Union[bytes, str]
+
+OCTET_STREAM = 'application/octet-stream'
+PDF_TYPE = 'application/pdf'
+DOCX_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+DOC_TYPE = 'application/msword'
+TEXT_TYPE = 'text/plain'
+MARKDOWN_TYPE = 'text/markdown'
+HTML_TYPE = 'text/html'
+
+# 判断文件类型时读取的文件头字节数
+SNIFF_BYTES = 8192
+# 纯文本每次解码读取的字符数
+TEXT_READ_SIZE = 64 * 1024
+# .doc 转换工具：auto 按 soffice、libreoffice、antiword 的顺序查找
+DOC_CONVERTERS = ('auto', 'soffice', 'libreoffice', 'antiword')
+# 没有 .doc 转换工具时保存的提示内容
+DOC_PLACEHOLDER = "注意：暂不支持直接处理 .doc 格式文件，请将文件转换为 .docx 格式后重新上传。"
+
+OLE_SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+# libmagic 返回的类型与注册表类型的对应关系
+MAGIC_ALIASES = {
+    'application/x-ole-storage': DOC_TYPE,
+    'application/CDFV2': DOC_TYPE,
+    'application/vnd.ms-office': DOC_TYPE,
+    'application/xhtml+xml': HTML_TYPE,
+    'text/x-markdown': MARKDOWN_TYPE,
+    'application/x-empty': TEXT_TYPE,
+    'inode/x-empty': TEXT_TYPE
+}
+# 内容为文本时按扩展名细分的类型
+TEXT_EXTENSION_TYPES = {
+    '.md': MARKDOWN_TYPE,
+    '.markdown': MARKDOWN_TYPE,
+    '.html': HTML_TYPE,
+    '.htm': HTML_TYPE
+}
+
+
+class Extractor:
+    """一种文档格式的解析器
+
+    extract(source, **options) 按文档顺序产出块；options 为处理器传入的解析选项（如 pdf_workers，
+    以及PDF从检查点续传时的起始页 start_page）。
+    """
+
+    def __init__(self, name: str, label: str, mime_type: str, extensions: Tuple[str, ...],
+                 extract: Callable[..., Iterator[Block]]):
+        self.name = name
+        self.label = label
+        self.mime_type = mime_type
+        self.extensions = extensions
+        self.extract = extract
+
+
+# MIME类型与解析器的对应关系
+EXTRACTORS: Dict[str, Extractor] = {}
+# 文件扩展名与MIME类型的对应关系
+FILE_TYPE_MAP: Dict[str, str] = {}
+
+
+def register_extractor(extractor: Extractor):
+    """注册（或替换）一种格式的解析器"""
+    EXTRACTORS[extractor.mime_type] = extractor
+    for extension in extractor.extensions:
+        FILE_TYPE_MAP[extension] = extractor.mime_type
+
+
+def get_extractor(mime_type: str) -> Optional[Extractor]:
+    return EXTRACTORS.get(mime_type)
+
+
+def get_file_type(filename: str) -> str:
+    """根据文件扩展名判断文件类型"""
+    ext = os.path.splitext(filename)[1].lower()
+    return FILE_TYPE_MAP.get(ext, OCTET_STREAM)
+
+
+def normalize_file_type(file_type: str) -> str:
+    """将扩展名（如 pdf）转换为保存的 MIME 类型，其他值原样返回"""
+    return FILE_TYPE_MAP.get('.' + file_type.lower().lstrip('.'), file_type)
+
+
+# ---------------------------------------------------------------------------
+# 文件类型识别
+# ---------------------------------------------------------------------------
+
+_magic = None
+
+
+def _magic_mime(head: bytes) -> Optional[str]:
+    """使用 python-magic 识别类型；未安装 libmagic 时返回 None"""
+    global _magic
+    if _magic is None:
+        try:
+            import magic
+            _magic = magic
+        except ImportError:
+            logger.warning("python-magic is unavailable, using built-in file signatures")
+            _magic = False
+    if not _magic:
+        return None
+    try:
+        return _magic.from_buffer(head, mime=True)
+    except Exception as e:
+        logger.warning(f"libmagic failed to detect file type: {e}")
+        return None
+
+
+def _looks_like_text(head: bytes) -> bool:
+    if b'\x00' in head:
+        return False
+    # 文件头可能在多字节字符中间截断
+    for trim in range(4):
+        try:
+            head[:len(head) - trim].decode('utf-8')
+            return True
+        except UnicodeDecodeError:
+            continue
+    return False
+
+
+def _signature_mime(head: bytes) -> str:
+    """按内置的签名表识别类型"""
+    if head.startswith(b'%PDF-'):
+        return PDF_TYPE
+    if head.startswith(b'PK\x03\x04'):
+        return 'application/zip'
+    if head.startswith(OLE_SIGNATURE):
+        return DOC_TYPE
+    if _looks_like_text(head):
+        start = head.lstrip(b'\xef\xbb\xbf \t\r\n').lower()
+        if start.startswith((b'<!doctype html', b'<html')):
+            return HTML_TYPE
+        return TEXT_TYPE
+    return OCTET_STREAM
+
+
+def _is_docx(source: UploadSource) -> bool:
+    """zip 文件中包含 Word 正文时为 DOCX"""
+    try:
+        with source.open() as stream, zipfile.ZipFile(stream) as archive:
+            return 'word/document.xml' in archive.namelist()
+    except (zipfile.BadZipFile, OSError):
+        return False
+
+
+def sniff_file_type(source: UploadSource, filename: str = '') -> str:
+    """根据文件内容识别文件类型（文本类文件再按扩展名区分纯文本、Markdown 和 HTML）"""
+    with source.open() as stream:
+        head = stream.read(SNIFF_BYTES)
+    mime_type = _magic_mime(head)
+    if not mime_type or mime_type == OCTET_STREAM:
+        mime_type = _signature_mime(head)
+    mime_type = MAGIC_ALIASES.get(mime_type, mime_type)
+
+    if mime_type in ('application/zip', DOCX_TYPE):
+        return DOCX_TYPE if _is_docx(source) else mime_type
+    if mime_type == TEXT_TYPE or mime_type.startswith('text/') and mime_type not in EXTRACTORS:
+        ext = os.path.splitext(filename)[1].lower()
+        return TEXT_EXTENSION_TYPES.get(ext, TEXT_TYPE)
+    return mime_type
+
+
+def _task_source(source: UploadSource) -> TaskSource:
+    """传给解析进程的文件：已落盘的文件只传递路径，内存中的小文件传递内容"""
+    return source.path or source.read_bytes()
+
+
+def _open_task_source(source: TaskSource) -> io.BufferedIOBase:
+    if isinstance(source, str):
+        return io.BufferedReader(MappedFile(source))
+    return io.BytesIO(source)
+
+
+# ---------------------------------------------------------------------------
+# PDF / Word
+# ---------------------------------------------------------------------------
+
+def extract_pdf(source: UploadSource, pdf_workers: Optional[int] = None, start_page: int = 0,
+                **options) -> Iterator[Block]:
+    from utils.pdf_extractor import iter_pdf_pages
+
+    for text in iter_pdf_pages(source, max_workers=pdf_workers, start_page=start_page):
+        yield {'type': 'page', 'text': text}
+
+
+def _docx_blocks(source: TaskSource) -> Iterator[Block]:
+    """在解析进程中单次遍历Word正文"""
+    from docx import Document as DocxDocument
+    from utils.docx_walker import iter_docx_blocks
+
+    with _open_task_source(source) as stream:
+        yield from iter_docx_blocks(DocxDocument(stream))
+
+
+def extract_docx(source: UploadSource, **options) -> Iterator[Block]:
+    return get_extractor_pool().stream(_docx_blocks, _task_source(source))
+
+
+def get_doc_converter() -> Optional[str]:
+    """查找 .doc 转换工具（DOC_CONVERTER 配置，默认 auto）"""
+    converter = os.getenv('DOC_CONVERTER', 'auto').lower()
+    if converter not in DOC_CONVERTERS:
+        logger.warning("Invalid DOC_CONVERTER value, using default: auto")
+        converter = 'auto'
+    candidates = DOC_CONVERTERS[1:] if converter == 'auto' else (converter,)
+    for candidate in candidates:
+        path = shutil.which(candidate)
+        if path:
+            return path
+    return None
+
+
+def _reset_memory_limit():
+    """转换工具不受解析进程内存上限的约束（仍受超时限制）"""
+    try:
+        import resource
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        resource.setrlimit(resource.RLIMIT_AS, (hard, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+
+def _run_converter(args: List[str]) -> bytes:
+    try:
+        result = subprocess.run(args, capture_output=True, timeout=get_extract_timeout() or None,
+                                preexec_fn=_reset_memory_limit if os.name == 'posix' else None)
+    except subprocess.TimeoutExpired:
+        raise RuntimeError(f"{os.path.basename(args[0])} 转换超时")
+    if result.returncode != 0:
+        message = result.stderr.decode('utf-8', errors='replace').strip()
+        raise RuntimeError(f"{os.path.basename(args[0])} 转换失败: {message or result.returncode}")
+    return result.stdout
+
+
+def _doc_blocks(source: TaskSource) -> Iterator[Block]:
+    """在解析进程中用本地转换工具处理 .doc 文件
+
+    LibreOffice 转换为 .docx 后按Word文档解析（保留标题和表格）；antiword 输出纯文本，按空行分段。
+    """
+    converter = get_doc_converter()
+    if converter is None:
+        raise RuntimeError("未找到 .doc 转换工具，请安装 LibreOffice 或 antiword，或将文件转换为 .docx 格式后重新上传")
+
+    with tempfile.TemporaryDirectory(prefix='doc-convert-') as workdir:
+        path = source
+        if not isinstance(source, str):
+            path = os.path.join(workdir, 'source.doc')
+            with open(path, 'wb') as f:
+                f.write(source)
+
+        if os.path.basename(converter).startswith('antiword'):
+            text = _run_converter([converter, '-w', '0', path]).decode('utf-8', errors='replace')
+            for paragraph in re.split(r'\n\s*\n', text):
+                if paragraph.strip():
+                    yield {'type': 'paragraph', 'text': paragraph.strip()}
+            return
+
+        outdir = os.path.join(workdir, 'out')
+        # 独立的用户配置目录，允许多个转换同时进行
+        _run_converter([
+            converter, '--headless', '--norestore',
+            f'-env:UserInstallation=file://{os.path.join(workdir, "profile")}',
+            '--convert-to', 'docx', '--outdir', outdir, path
+        ])
+        converted = [name for name in os.listdir(outdir) if name.endswith('.docx')] if os.path.isdir(outdir) else []
+        if not converted:
+            raise RuntimeError("转换后的 .docx 文件不存在")
+        yield from _docx_blocks(os.path.join(outdir, converted[0]))
+
+
+def extract_doc(source: UploadSource, **options) -> Iterator[Block]:
+    if get_doc_converter() is None:
+        # 没有转换工具时保存一条提示，提醒转换为 .docx 后重新上传
+        logger.warning("No .doc converter found, storing placeholder content")
+        return iter([{'type': 'paragraph', 'text': DOC_PLACEHOLDER}])
+    return get_extractor_pool().stream(_doc_blocks, _task_source(source))
+
+
+# ---------------------------------------------------------------------------
+# 纯文本 / Markdown / HTML
+# ---------------------------------------------------------------------------
+
+def extract_text(source: UploadSource, **options) -> Iterator[Block]:
+    """逐段解码纯文本，不在内存中保留完整的文本（线性处理，不使用解析进程）"""
+    with io.TextIOWrapper(source.open(), encoding='utf-8') as stream:
+        for piece in iter(lambda: stream.read(TEXT_READ_SIZE), ''):
+            yield {'type': 'text', 'text': piece}
+
+
+MD_HEADING = re.compile(r'^ {0,3}(#{1,6})(?:[ \t]+(.*?))?(?:[ \t]+#+)?[ \t]*$')
+MD_SETEXT = re.compile(r'^ {0,3}(=+|-+)[ \t]*$')
+MD_FENCE = re.compile(r'^ {0,3}(`{3,}|~{3,})')
+MD_TABLE_DELIMITER = re.compile(r'^ *\|? *:?-+:? *(\| *:?-+:? *)*\|? *$')
+
+
+def _split_table_row(line: str) -> List[str]:
+    line = line.strip()
+    if line.startswith('|'):
+        line = line[1:]
+    if line.endswith('|') and not line.endswith('\\|'):
+        line = line[:-1]
+    cells = re.split(r'(?<!\\)\|', line)
+    return [cell.strip().replace('\\|', '|') for cell in cells]
+
+
+def _markdown_blocks(source: TaskSource) -> Iterator[Block]:
+    """在解析进程中逐行解析 Markdown：ATX/Setext 标题、段落、代码块和管道表格"""
+    paragraph: List[str] = []
+    table: Optional[List[List[str]]] = None
+    fence: Optional[str] = None
+    code: List[str] = []
+
+    def flush_paragraph() -> Iterator[Block]:
+        if paragraph:
+            yield {'type': 'paragraph', 'text': '\n'.join(paragraph)}
+            paragraph.clear()
+
+    with io.TextIOWrapper(_open_task_source(source), encoding='utf-8') as stream:
+        for line in stream:
+            line = line.rstrip('\r\n')
+
+            if fence is not None:
+                if line.strip().startswith(fence):
+                    fence = None
+                    yield {'type': 'paragraph', 'text': '\n'.join(code)}
+                    code = []
+                else:
+                    code.append(line)
+                continue
+
+            if table is not None:
+                if line.strip() and '|' in line:
+                    table.append(_split_table_row(line))
+                    continue
+                yield {'type': 'table', 'rows': table}
+                table = None
+
+            match = MD_FENCE.match(line)
+            if match:
+                yield from flush_paragraph()
+                fence = match.group(1)
+                continue
+
+            match = MD_HEADING.match(line)
+            if match:
+                yield from flush_paragraph()
+                yield {'type': 'heading', 'level': len(match.group(1)), 'text': (match.group(2) or '').strip()}
+                continue
+
+            if not line.strip():
+                yield from flush_paragraph()
+                continue
+
+            if len(paragraph) == 1 and '|' in paragraph[0] and MD_TABLE_DELIMITER.match(line) and '-' in line:
+                table = [_split_table_row(paragraph.pop())]
+                continue
+
+            match = MD_SETEXT.match(line)
+            if match and paragraph:
+                text = '\n'.join(paragraph)
+                paragraph.clear()
+                yield {'type': 'heading', 'level': 1 if match.group(1)[0] == '=' else 2, 'text': text}
+                continue
+
+            paragraph.append(line.strip())
+
+    if fence is not None and code:
+        yield {'type': 'paragraph', 'text': '\n'.join(code)}
+    if table is not None:
+        yield {'type': 'table', 'rows': table}
+    yield from flush_paragraph()
+
+
+def extract_markdown(source: UploadSource, **options) -> Iterator[Block]:
+    return get_extractor_pool().stream(_markdown_blocks, _task_source(source))
+
+
+HTML_HEADINGS = {'h1': 1, 'h2': 2, 'h3': 3, 'h4': 4, 'h5': 5, 'h6': 6}
+# 结束当前段落的块级元素
+HTML_BLOCK_TAGS = {
+    'p', 'div', 'section', 'article', 'header', 'footer', 'main', 'aside', 'nav',
+    'li', 'ul', 'ol', 'dl', 'dt', 'dd', 'blockquote', 'pre', 'figure', 'figcaption',
+    'form', 'fieldset', 'address', 'hr', 'caption', 'body'
+}
+# 不输出文本的元素
+HTML_SKIPPED_TAGS = {'script', 'style', 'noscript', 'template', 'head', 'title', 'svg'}
+HTML_VOID_TAGS = {'br', 'hr', 'img', 'input', 'meta', 'link', 'area', 'base', 'col', 'embed', 'source', 'wbr'}
+HTML_CHARSET = re.compile(rb'<meta[^>]+charset=["\']?([A-Za-z0-9_-]+)', re.IGNORECASE)
+HTML_READ_SIZE = 64 * 1024
+
+
+class _HtmlBlockParser(HTMLParser):
+    """将 HTML 转为块：h1-h6 为标题，块级元素分段，table 为表格（嵌套表格的文本并入外层单元格）"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks: List[Block] = []
+        self._text: List[str] = []
+        self._heading: Optional[int] = None
+        self._skip_depth = 0
+        self._pre_depth = 0
+        self._table_depth = 0
+        self._rows: List[List[str]] = []
+        self._row: Optional[List[str]] = None
+        self._cell: Optional[List[str]] = None
+
+    def _collected(self, parts: List[str]) -> str:
+        text = ''.join(parts)
+        if self._pre_depth:
+            return text.strip('\n')
+        # 源码中的空白已在读入时合并为空格，换行只来自 <br>
+        return re.sub(r' *\n[ \n]*', '\n', text).strip()
+
+    def _flush_text(self):
+        text = self._collected(self._text)
+        self._text = []
+        if not text:
+            return
+        if self._heading is not None:
+            self.blocks.append({'type': 'heading', 'level': self._heading, 'text': text.replace('\n', ' ')})
+        else:
+            self.blocks.append({'type': 'paragraph', 'text': text})
+
+    def handle_starttag(self, tag, attrs):
+        if tag in HTML_SKIPPED_TAGS:
+            if tag not in HTML_VOID_TAGS:
+                self._skip_depth += 1
+            return
+        if self._skip_depth:
+            return
+
+        if tag == 'table':
+            self._table_depth += 1
+            if self._table_depth == 1:
+                self._flush_text()
+                self._rows = []
+            elif self._cell is not None:
+                self._cell.append('\n')
+            return
+        if self._table_depth:
+            if self._table_depth == 1 and tag == 'tr':
+                self._row = []
+            elif self._table_depth == 1 and tag in ('td', 'th') and self._row is not None:
+                self._cell = []
+            elif self._cell is not None and tag in ('br', 'tr', 'p', 'div', 'li'):
+                self._cell.append('\n')
+            elif self._cell is not None and tag in ('td', 'th'):
+                self._cell.append(' ')
+            return
+
+        if tag in HTML_HEADINGS:
+            self._flush_text()
+            self._heading = HTML_HEADINGS[tag]
+        elif tag == 'br':
+            self._text.append('\n')
+        elif tag in HTML_BLOCK_TAGS:
+            self._flush_text()
+            if tag == 'pre':
+                self._pre_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in HTML_SKIPPED_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+            return
+        if self._skip_depth:
+            return
+
+        if tag == 'table' and self._table_depth:
+            self._table_depth -= 1
+            if self._table_depth == 0:
+                self._end_row()
+                if self._rows:
+                    self.blocks.append({'type': 'table', 'rows': self._rows})
+                self._rows = []
+            return
+        if self._table_depth:
+            if self._table_depth == 1 and tag in ('td', 'th'):
+                self._end_cell()
+            elif self._table_depth == 1 and tag == 'tr':
+                self._end_row()
+            return
+
+        if tag in HTML_HEADINGS and self._heading is not None:
+            self._flush_text()
+            self._heading = None
+        elif tag in HTML_BLOCK_TAGS:
+            self._flush_text()
+            if tag == 'pre':
+                self._pre_depth = max(0, self._pre_depth - 1)
+
+    def _end_cell(self):
+        if self._cell is not None and self._row is not None:
+            self._row.append(self._collected(self._cell))
+        self._cell = None
+
+    def _end_row(self):
+        self._end_cell()
+        if self._row is not None:
+            self._rows.append(self._row)
+        self._row = None
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        if not self._pre_depth:
+            data = re.sub(r'\s+', ' ', data)
+        if self._table_depth:
+            if self._cell is not None:
+                self._cell.append(data)
+            return
+        self._text.append(data)
+
+    def close(self):
+        super().close()
+        if self._table_depth:
+            self._end_row()
+            if self._rows:
+                self.blocks.append({'type': 'table', 'rows': self._rows})
+        self._flush_text()
+
+
+def _html_blocks(source: TaskSource) -> Iterator[Block]:
+    """在解析进程中分段解析 HTML，每读入一段输出已完成的块"""
+    with _open_task_source(source) as stream:
+        match = HTML_CHARSET.search(stream.read(SNIFF_BYTES))
+        stream.seek(0)
+        encoding = match.group(1).decode('ascii') if match else 'utf-8'
+        try:
+            codecs.lookup(encoding)
+        except LookupError:
+            encoding = 'utf-8'
+
+        decoder = io.TextIOWrapper(stream, encoding=encoding, errors='replace')
+        parser = _HtmlBlockParser()
+        for piece in iter(lambda: decoder.read(HTML_READ_SIZE), ''):
+            parser.feed(piece)
+            if parser.blocks:
+                yield from parser.blocks
+                parser.blocks = []
+        parser.close()
+        yield from parser.blocks
+
+
+def extract_html(source: UploadSource, **options) -> Iterator[Block]:
+    return get_extractor_pool().stream(_html_blocks, _task_source(source))
+
+
+register_extractor(Extractor('pdf', 'PDF', PDF_TYPE, ('.pdf',), extract_pdf))
+register_extractor(Extractor('docx', 'Word', DOCX_TYPE, ('.docx',), extract_docx))
+register_extractor(Extractor('doc', 'Word', DOC_TYPE, ('.doc',), extract_doc))
+register_extractor(Extractor('text', '文本', TEXT_TYPE, ('.txt',), extract_text))
+register_extractor(Extractor('markdown', 'Markdown', MARKDOWN_TYPE, ('.md', '.markdown'), extract_markdown))
+register_extractor(Extractor('html', 'HTML', HTML_TYPE, ('.html', '.htm'), extract_html))
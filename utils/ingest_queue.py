@@ -0,0 +1,314 @@
+import os
+import time
+import uuid
+import logging
+import threading
+import multiprocessing
+from datetime import datetime, timedelta
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, BinaryIO, Dict, Optional, Set, Union
+from pymongo.errors import DuplicateKeyError
+from models.document_models import Document, DocumentStatus
+from database.mongo_client import documents, document_files
+from utils.document_processor import DocumentProcessor, find_duplicate_document
+from utils.extractors import get_file_type
+from utils.upload_source import UploadSource
+from utils.document_stats import record_document_created, record_status_change
+from utils.ingest_runs import (
+    SWEEP_BATCH_SIZE, can_resume, get_stale_seconds, get_sweep_interval, maybe_sweep, sweep
+)
+
+logger = logging.getLogger(__name__)
+
+# 后台处理模式：
+# - thread: 在Web进程内的线程池中处理（默认）
+# - process: 在Web进程派生的进程池中处理
+# - external: Web进程只负责入队，由独立的 worker 进程（python manage.py worker）领取处理
+INGEST_WORKER_MODES = ('thread', 'process', 'external')
+DEFAULT_MAX_WORKERS = 2
+DEFAULT_POLL_INTERVAL = 2.0
+
+_executor: Optional[Executor] = None
+_executor_lock = threading.Lock()
+# 已提交到进程内处理池、尚未完成的文档
+_submitted: Set[str] = set()
+_submitted_lock = threading.Lock()
+_maintenance_thread: Optional[threading.Thread] = None
+
+
+class RetryConflict(Exception):
+    """文档当前不能重试处理"""
+
+
+def get_worker_mode() -> str:
+    """读取后台处理模式配置"""
+    mode = os.getenv('INGEST_WORKER_MODE', 'thread').lower()
+    if mode not in INGEST_WORKER_MODES:
+        logger.warning(f"Invalid INGEST_WORKER_MODE value: {mode}, using thread")
+        return 'thread'
+    return mode
+
+
+def get_executor() -> Executor:
+    """获取（并按需创建）进程内的后台处理池"""
+    global _executor
+    if _executor is not None:
+        return _executor
+
+    with _executor_lock:
+        if _executor is None:
+            try:
+                max_workers = int(os.getenv('INGEST_MAX_WORKERS', DEFAULT_MAX_WORKERS))
+            except (TypeError, ValueError):
+                max_workers = DEFAULT_MAX_WORKERS
+
+            if get_worker_mode() == 'process':
+                # 使用spawn避免在持有数据库连接的进程中fork
+                _executor = ProcessPoolExecutor(
+                    max_workers=max_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            else:
+                _executor = ThreadPoolExecutor(
+                    max_workers=max_workers,
+                    thread_name_prefix='ingest'
+                )
+    return _executor
+
+
+def _submit(document_id: str) -> bool:
+    """将文档提交到进程内的处理池，已提交且未完成的文档不重复提交"""
+    with _submitted_lock:
+        if document_id in _submitted:
+            return False
+        _submitted.add(document_id)
+    try:
+        future = get_executor().submit(run_ingest_job, document_id)
+    except Exception:
+        with _submitted_lock:
+            _submitted.discard(document_id)
+        raise
+    future.add_done_callback(lambda _: _finish_submitted(document_id))
+    return True
+
+
+def _finish_submitted(document_id: str):
+    with _submitted_lock:
+        _submitted.discard(document_id)
+
+
+def submit_document(filename: str, file_content: Union[bytes, BinaryIO]) -> Dict[str, Any]:
+    """保存原始文件并创建pending状态的文档记录，随后交给后台处理
+
+    返回 document_id、status 和 duplicate；内容与已有文档相同时直接返回已有文档。
+    """
+    with UploadSource(file_content) as source:
+        existing = find_duplicate_document(source.sha256)
+        if existing:
+            return {'document_id': existing['_id'], 'status': existing['status'], 'duplicate': True}
+
+        # 先保存原始文件再创建记录，保证worker领取到的任务都有对应的文件；
+        # GridFS 对文件流分块读取和写入，无需将整个文件读入内存
+        document_id = str(uuid.uuid4())
+        with source.open() as stream:
+            document_files.put(stream, _id=document_id, filename=filename)
+
+        doc = Document(filename, get_file_type(filename))
+        doc.data['_id'] = document_id
+        doc.data['content_hash'] = source.sha256
+        doc.data['file_size'] = source.size
+        try:
+            documents.insert_one(doc.data)
+        except DuplicateKeyError:
+            # 相同内容的文件被并发上传
+            document_files.delete(document_id)
+            existing = find_duplicate_document(source.sha256)
+            if not existing:
+                raise
+            return {'document_id': existing['_id'], 'status': existing['status'], 'duplicate': True}
+        record_document_created(DocumentStatus.PENDING.value, source.size)
+
+    if get_worker_mode() != 'external':
+        _submit(document_id)
+    return {'document_id': document_id, 'status': DocumentStatus.PENDING.value, 'duplicate': False}
+
+
+def _claim_job(query: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """原子地将一个pending任务标记为processing，保证同一任务只被领取一次
+
+    领取时间（claimed_at）作为租约：处理进程在开始入库运行前退出时，清理任务据此将任务恢复为pending。
+    """
+    query = dict(query, status=DocumentStatus.PENDING.value)
+    now = datetime.utcnow()
+    job = documents.find_one_and_update(
+        query,
+        {'$set': {
+            'status': DocumentStatus.PROCESSING.value,
+            'last_modified': now,
+            'claimed_at': now
+        }},
+        sort=[('upload_time', 1)]
+    )
+    if job:
+        record_status_change(DocumentStatus.PENDING.value, DocumentStatus.PROCESSING.value)
+    return job
+
+
+def _process_job(job: Dict[str, Any]) -> bool:
+    """处理已领取的任务，成功后删除原始文件"""
+    document_id = job['_id']
+    try:
+        grid_file = document_files.get(document_id)
+    except Exception as e:
+        logger.error(f"Failed to load queued file {document_id}: {e}")
+        documents.update_one(
+            {'_id': document_id},
+            {'$set': {
+                'status': DocumentStatus.ERROR.value,
+                'error_message': f"读取待处理文件失败: {str(e)}"
+            },
+            '$unset': {'content_hash': '', 'claimed_at': ''}}
+        )
+        record_status_change(DocumentStatus.PROCESSING.value, DocumentStatus.ERROR.value)
+        return False
+
+    try:
+        # 原始文件保留到处理成功为止，失败后可以重试（PDF从最后一个检查点继续）
+        processor = DocumentProcessor(
+            job['filename'],
+            grid_file,
+            document_id=document_id,
+            track_progress=True,
+            resumable=True,
+            previous_run=job.get('ingest_run')
+        )
+        processor.process_and_save()
+    except Exception as e:
+        # 错误状态已由处理器写入，保留原始文件以便排查和重试
+        logger.error(f"Ingest job {document_id} failed: {e}")
+        return False
+    finally:
+        grid_file.close()
+
+    document_files.delete(document_id)
+    return True
+
+
+def run_ingest_job(document_id: str) -> bool:
+    """处理指定文档的后台任务（可在线程池、进程池或独立worker中调用）"""
+    job = _claim_job({'_id': document_id})
+    if not job:
+        logger.info(f"Ingest job {document_id} already claimed or finished")
+        return False
+    return _process_job(job)
+
+
+def retry_document(document_id: str) -> Optional[Dict[str, Any]]:
+    """将处理失败的异步上传文档重新加入队列，文档不存在时返回 None
+
+    上一次运行有未过期的检查点时从检查点继续（返回的 resume_from_page 为已处理的页数），
+    否则删除上一次运行写入的记录后重新处理。同步上传的文档没有保留原始文件，不能重试。
+    """
+    doc = documents.find_one({'_id': document_id}, {'status': 1})
+    if not doc:
+        return None
+    if doc['status'] != DocumentStatus.ERROR.value:
+        raise RetryConflict(f"只能重试处理失败的文档（当前状态: {doc['status']}）")
+    if not document_files.exists(document_id):
+        raise RetryConflict('原始文件未保留，请重新上传')
+
+    job = documents.find_one_and_update(
+        {'_id': document_id, 'status': DocumentStatus.ERROR.value},
+        {'$set': {
+            'status': DocumentStatus.PENDING.value,
+            'last_modified': datetime.utcnow()
+        },
+        '$unset': {'error_message': ''}},
+        projection={'ingest_run': 1}
+    )
+    if not job:
+        raise RetryConflict('文档已在重试中')
+    record_status_change(DocumentStatus.ERROR.value, DocumentStatus.PENDING.value)
+
+    if get_worker_mode() != 'external':
+        _submit(document_id)
+    previous = job.get('ingest_run')
+    return {
+        'document_id': document_id,
+        'status': DocumentStatus.PENDING.value,
+        'resume_from_page': previous['checkpoint']['pages'] if can_resume(previous) else 0
+    }
+
+
+def resubmit_pending(older_than: Optional[datetime] = None, limit: int = 0) -> int:
+    """将pending状态的文档重新提交到进程内的处理池，返回提交的文档数
+
+    进程内的处理池不保存任务：进程重启前未处理的文档，以及清理任务恢复为pending的领取超时文档，都需要重新提交。
+    older_than 表示只提交该时间之前更新的文档，limit 为 0 时不限制数量。
+    """
+    query = {'status': DocumentStatus.PENDING.value}
+    if older_than is not None:
+        query['last_modified'] = {'$lt': older_than}
+    pending = documents.find(query, {'_id': 1}).sort('upload_time', 1).limit(limit)
+    submitted = sum(1 for doc in list(pending) if _submit(doc['_id']))
+    if submitted:
+        logger.info(f"Resubmitted {submitted} pending ingest jobs")
+    return submitted
+
+
+def run_maintenance(now: Optional[datetime] = None) -> Dict[str, int]:
+    """执行一次后台维护：清理入库运行，并重新提交等待超时的pending文档"""
+    now = now or datetime.utcnow()
+    result = sweep(now)
+    # 入队不久的文档可能仍在处理池中排队（其他Web进程提交的），只重新提交等待超过超时时间的文档
+    cutoff = now - timedelta(seconds=get_stale_seconds())
+    result['resubmitted'] = resubmit_pending(older_than=cutoff, limit=SWEEP_BATCH_SIZE)
+    return result
+
+
+def _maintenance_loop(interval: int):
+    try:
+        resubmit_pending()
+    except Exception as e:
+        logger.error(f"Failed to resubmit pending ingest jobs: {e}")
+    while True:
+        time.sleep(interval)
+        try:
+            run_maintenance()
+        except Exception as e:
+            logger.error(f"Ingest maintenance failed: {e}")
+
+
+def start_maintenance_thread() -> bool:
+    """启动Web进程的后台维护线程（thread/process 模式，应用启动时调用）
+
+    线程启动后先重新提交进程重启前遗留的pending文档，之后每隔 INGEST_SWEEP_INTERVAL 秒执行一次 run_maintenance。
+    external 模式由 worker 进程领取任务和清理；INGEST_SWEEP_INTERVAL 为 0 时不启动。
+    """
+    global _maintenance_thread
+    interval = get_sweep_interval()
+    if get_worker_mode() == 'external' or interval <= 0:
+        return False
+    with _executor_lock:
+        if _maintenance_thread is not None:
+            return False
+        _maintenance_thread = threading.Thread(
+            target=_maintenance_loop, args=(interval,), name='ingest-maintenance', daemon=True
+        )
+        _maintenance_thread.start()
+    return True
+
+
+def run_worker(poll_interval: float = DEFAULT_POLL_INTERVAL, once: bool = False):
+    """独立worker进程的主循环：按上传顺序领取并处理pending任务"""
+    logger.info("Ingest worker started")
+    while True:
+        # 定期清理中断和失败的入库运行（间隔由 INGEST_SWEEP_INTERVAL 配置）
+        maybe_sweep()
+        job = _claim_job({})
+        if job:
+            _process_job(job)
+            continue
+        if once:
+            return
+        time.sleep(poll_interval)
\ No newline at end of file
@@ -0,0 +1,318 @@
+"""
+入库运行：崩溃安全、可续传的文档入库
+
+每次处理文档时生成一个运行，处理器写入的章节、内容块、倒排记录和向量都带有 run_id 和 run_segment
+（写入时所在的检查点区间）。运行的状态、心跳和检查点保存在文档记录的 ingest_run 字段中，
+处理完成时以一次文档更新发布：状态改为 processed 并移除 ingest_run。检索和相似内容接口只返回 processed 文档的内容，
+处理中的记录在发布前不可见。
+
+- 处理失败、或进程崩溃后心跳超过 INGEST_RUN_STALE_SECONDS 秒未更新时，文档标记为 error，
+  已写入的记录由清理任务（sweep）按运行批量删除
+- 队列任务领取后超过 INGEST_RUN_STALE_SECONDS 秒仍未开始运行（处理进程在领取后退出）时，
+  清理任务将文档恢复为 pending，由队列重新处理
+- 异步上传的PDF每处理 INGEST_CHECKPOINT_PAGES 页提交一次检查点；重试时删除最后一个检查点之后写入的记录，
+  从检查点的下一页继续。有检查点的运行保留 INGEST_RESUME_RETENTION 秒，之后才被清理
+- 清理任务由Web进程的后台维护线程或 worker 主循环每隔 INGEST_SWEEP_INTERVAL 秒执行（每次处理一批），
+  不在上传请求和入库过程中执行；python manage.py sweep 循环执行直到没有需要清理的文档
+"""
+import os
+import time
+import uuid
+import logging
+import threading
+from enum import Enum
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from models.document_models import DocumentStatus
+from database.mongo_client import (
+    documents, document_sections, document_contents, search_postings, content_embeddings
+)
+from utils.document_stats import record_status_change
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEARTBEAT_INTERVAL = 10
+DEFAULT_STALE_SECONDS = 300
+DEFAULT_CHECKPOINT_PAGES = 50
+DEFAULT_RESUME_RETENTION = 24 * 3600
+DEFAULT_SWEEP_INTERVAL = 60
+SWEEP_BATCH_SIZE = 100
+
+# 运行写入的集合（按删除顺序：先删除引用内容块的记录）
+RUN_COLLECTIONS = (search_postings, content_embeddings, document_contents, document_sections)
+
+ABANDONED_MESSAGE = '处理中断（处理进程退出或心跳超时），可通过重试接口继续处理'
+
+_last_sweep = 0.0
+_sweep_lock = threading.Lock()
+
+
+class IngestRunState(Enum):
+    """入库运行状态"""
+    RUNNING = 'running'
+    FAILED = 'failed'
+    ABANDONED = 'abandoned'
+    COLLECTING = 'collecting'
+
+
+def _get_int_setting(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        logger.warning(f"Invalid {name} value, using default: {default}")
+        return default
+
+
+def get_stale_seconds() -> int:
+    """读取心跳和领取超时时间（秒）"""
+    return _get_int_setting('INGEST_RUN_STALE_SECONDS', DEFAULT_STALE_SECONDS)
+
+
+def get_sweep_interval() -> int:
+    """读取清理任务的执行间隔（秒），0 表示关闭"""
+    return _get_int_setting('INGEST_SWEEP_INTERVAL', DEFAULT_SWEEP_INTERVAL)
+
+
+def get_checkpoint_pages() -> int:
+    """读取PDF检查点间隔（页数），0 表示不提交检查点"""
+    return max(0, _get_int_setting('INGEST_CHECKPOINT_PAGES', DEFAULT_CHECKPOINT_PAGES))
+
+
+class IngestRun:
+    """一次入库运行"""
+
+    def __init__(self, document_id: str, run_id: Optional[str] = None, attempt: int = 1,
+                 resumable: bool = False, checkpoint: Optional[Dict[str, Any]] = None):
+        self.document_id = document_id
+        self.id = run_id or str(uuid.uuid4())
+        # 同一运行每次续传时加1，旧的处理进程（被判定为中断后仍在运行）不能再更新文档记录
+        self.attempt = attempt
+        # 原始文件已保留（异步上传），失败后可以重试
+        self.resumable = resumable
+        self.checkpoint = checkpoint
+        # 已提交的检查点区间数，新写入的记录属于该区间
+        self.segment = checkpoint['segment'] if checkpoint else 0
+        self.heartbeat_interval = _get_int_setting('INGEST_HEARTBEAT_INTERVAL', DEFAULT_HEARTBEAT_INTERVAL)
+        self._last_heartbeat = time.monotonic()
+
+    def record(self) -> Dict[str, Any]:
+        """写入文档记录 ingest_run 字段的运行状态"""
+        now = datetime.utcnow()
+        return {
+            '_id': self.id,
+            'state': IngestRunState.RUNNING.value,
+            'attempt': self.attempt,
+            'resumable': self.resumable,
+            'started_at': now,
+            'heartbeat_at': now,
+            'checkpoint': self.checkpoint
+        }
+
+    def query(self) -> Dict[str, Any]:
+        """只匹配仍由本次运行处理的文档记录"""
+        return {'_id': self.document_id, 'ingest_run._id': self.id, 'ingest_run.attempt': self.attempt}
+
+    def tag(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        record['run_id'] = self.id
+        record['run_segment'] = self.segment
+        return record
+
+    def heartbeat_due(self) -> bool:
+        return time.monotonic() - self._last_heartbeat >= self.heartbeat_interval
+
+    def heartbeat(self, fields: Optional[Dict[str, Any]] = None):
+        """更新心跳（可同时更新文档记录的其他字段，如处理进度）；运行已被判定为中断时抛出异常，停止处理"""
+        result = documents.update_one(
+            self.query(),
+            {'$set': dict(fields or {}, **{'ingest_run.heartbeat_at': datetime.utcnow()})}
+        )
+        if not result.matched_count:
+            raise Exception("入库运行已中断（心跳超时），请重试")
+        self._last_heartbeat = time.monotonic()
+
+    def commit_checkpoint(self, state: Dict[str, Any], fields: Optional[Dict[str, Any]] = None):
+        """提交检查点：调用前检查点之前的记录必须已全部写入"""
+        self.segment += 1
+        self.checkpoint = dict(state, segment=self.segment)
+        self.heartbeat(dict(fields or {}, **{'ingest_run.checkpoint': self.checkpoint}))
+
+    def release(self):
+        """运行已被清理任务判定为中断后，删除本进程写入的记录（运行已被重试续传时保留，由续传的处理进程负责）"""
+        if not documents.find_one({'_id': self.document_id, 'ingest_run._id': self.id}, {'_id': 1}):
+            delete_run_records([self.document_id], [self.id])
+
+    def failure_fields(self) -> Dict[str, Any]:
+        """处理失败时写入文档记录的运行状态；有检查点的运行保留一段时间以便续传"""
+        return {
+            'ingest_run.state': IngestRunState.FAILED.value,
+            'ingest_run.expires_at': _expires_at(self.resumable, self.checkpoint, datetime.utcnow())
+        }
+
+
+def _expires_at(resumable: bool, checkpoint: Optional[Dict[str, Any]], now: datetime) -> datetime:
+    if resumable and checkpoint:
+        return now + timedelta(seconds=_get_int_setting('INGEST_RESUME_RETENTION', DEFAULT_RESUME_RETENTION))
+    return now
+
+
+def can_resume(previous: Optional[Dict[str, Any]]) -> bool:
+    """上一次运行是否可以从检查点续传"""
+    return bool(
+        previous
+        and previous.get('checkpoint')
+        and previous.get('state') in (IngestRunState.FAILED.value, IngestRunState.ABANDONED.value)
+        and previous.get('expires_at') and previous['expires_at'] > datetime.utcnow()
+    )
+
+
+def start_run(document_id: str, previous: Optional[Dict[str, Any]] = None,
+              resumable: bool = False) -> IngestRun:
+    """开始文档的入库运行
+
+    previous 为文档记录中上一次运行的状态：可以续传时沿用该运行并删除最后一个检查点之后写入的记录，
+    否则删除上一次运行写入的全部记录后重新开始。
+    """
+    if resumable and can_resume(previous):
+        run = IngestRun(document_id, previous['_id'], previous.get('attempt', 1) + 1,
+                        resumable=True, checkpoint=previous['checkpoint'])
+        delete_run_records([document_id], [run.id], from_segment=run.segment)
+        logger.info(f"Resuming ingest run {run.id} of {document_id} from page {run.checkpoint['pages']}")
+        return run
+
+    if previous:
+        delete_run_records([document_id], [previous['_id']])
+    return IngestRun(document_id, resumable=resumable)
+
+
+def delete_run_records(document_ids: List[str], run_ids: List[str], from_segment: Optional[int] = None):
+    """批量删除运行写入的记录（按 document_id 索引定位）；from_segment 表示只删除该检查点区间及之后的记录"""
+    if not document_ids:
+        return
+    query = {'document_id': {'$in': document_ids}, 'run_id': {'$in': run_ids}}
+    if from_segment is not None:
+        query['run_segment'] = {'$gte': from_segment}
+    for collection in RUN_COLLECTIONS:
+        collection.delete_many(query)
+
+
+def _release_stale_claims(now: datetime, batch_size: int) -> int:
+    """将领取超时仍未开始入库运行的队列任务恢复为pending（不修改 last_modified，由队列立即重新处理）"""
+    cutoff = now - timedelta(seconds=get_stale_seconds())
+    stale = documents.find(
+        {
+            'status': DocumentStatus.PROCESSING.value,
+            'claimed_at': {'$lt': cutoff},
+            'ingest_run.state': {'$ne': IngestRunState.RUNNING.value}
+        },
+        {'claimed_at': 1}
+    ).limit(batch_size)
+    released = 0
+    for doc in list(stale):
+        # 开始运行时会移除 claimed_at，领取时间不变说明处理进程仍未开始运行
+        result = documents.update_one(
+            {'_id': doc['_id'], 'status': DocumentStatus.PROCESSING.value, 'claimed_at': doc['claimed_at']},
+            {'$set': {'status': DocumentStatus.PENDING.value},
+             '$unset': {'claimed_at': ''}}
+        )
+        if result.modified_count:
+            record_status_change(DocumentStatus.PROCESSING.value, DocumentStatus.PENDING.value)
+            released += 1
+            logger.warning(f"Ingest job {doc['_id']} released (claimed at {doc['claimed_at']})")
+    return released
+
+
+def _abandon_stale_runs(now: datetime, batch_size: int) -> int:
+    """将心跳超时的运行标记为中断，文档标记为处理失败"""
+    cutoff = now - timedelta(seconds=get_stale_seconds())
+    stale = documents.find(
+        {
+            'status': DocumentStatus.PROCESSING.value,
+            'ingest_run.state': IngestRunState.RUNNING.value,
+            'ingest_run.heartbeat_at': {'$lt': cutoff}
+        },
+        {'ingest_run': 1}
+    ).limit(batch_size)
+    abandoned = 0
+    for doc in list(stale):
+        run = doc['ingest_run']
+        # 只在心跳仍未更新时修改，处理进程恢复心跳或已发布时不受影响
+        result = documents.update_one(
+            {
+                '_id': doc['_id'],
+                'status': DocumentStatus.PROCESSING.value,
+                'ingest_run._id': run['_id'],
+                'ingest_run.heartbeat_at': run['heartbeat_at']
+            },
+            {'$set': {
+                'status': DocumentStatus.ERROR.value,
+                'error_message': ABANDONED_MESSAGE,
+                'last_modified': now,
+                'ingest_run.state': IngestRunState.ABANDONED.value,
+                'ingest_run.expires_at': _expires_at(run.get('resumable', False), run.get('checkpoint'), now)
+            },
+            # 与处理失败相同，移除内容哈希使相同文件可以重新上传
+            '$unset': {'content_hash': ''}}
+        )
+        if result.modified_count:
+            record_status_change(DocumentStatus.PROCESSING.value, DocumentStatus.ERROR.value)
+            abandoned += 1
+            logger.warning(f"Ingest run {run['_id']} of {doc['_id']} abandoned (heartbeat at {run['heartbeat_at']})")
+    return abandoned
+
+
+def _collect_failed_runs(now: datetime, batch_size: int) -> int:
+    """删除一批已过保留期的失败运行写入的记录"""
+    query = {
+        'status': DocumentStatus.ERROR.value,
+        'ingest_run.state': {'$in': [IngestRunState.FAILED.value, IngestRunState.ABANDONED.value,
+                                     IngestRunState.COLLECTING.value]},
+        'ingest_run.expires_at': {'$lte': now}
+    }
+    document_ids = [doc['_id'] for doc in documents.find(query, {'_id': 1}).limit(batch_size)]
+    if not document_ids:
+        return 0
+
+    # 先标记为清理中：重试领取后的文档不再匹配，不会删除新运行的记录
+    documents.update_many(dict(query, _id={'$in': document_ids}),
+                          {'$set': {'ingest_run.state': IngestRunState.COLLECTING.value}})
+    claimed = list(documents.find(
+        {'_id': {'$in': document_ids}, 'ingest_run.state': IngestRunState.COLLECTING.value},
+        {'ingest_run._id': 1}
+    ))
+    delete_run_records([doc['_id'] for doc in claimed], [doc['ingest_run']['_id'] for doc in claimed])
+    documents.update_many(
+        {'_id': {'$in': document_ids}, 'ingest_run.state': IngestRunState.COLLECTING.value},
+        {'$unset': {'ingest_run': ''}}
+    )
+    return len(claimed)
+
+
+def sweep(now: Optional[datetime] = None, batch_size: int = SWEEP_BATCH_SIZE) -> Dict[str, int]:
+    """清理入库运行：恢复领取超时的队列任务，标记心跳超时的运行，删除失败运行写入的记录
+
+    每一项最多处理 batch_size 个文档，剩余的由下一次清理处理。
+    """
+    now = now or datetime.utcnow()
+    released = _release_stale_claims(now, batch_size)
+    abandoned = _abandon_stale_runs(now, batch_size)
+    collected = _collect_failed_runs(now, batch_size)
+    if released or abandoned or collected:
+        logger.info(f"Ingest sweep: {released} jobs released, {abandoned} runs abandoned, {collected} runs collected")
+    return {'released': released, 'abandoned': abandoned, 'collected': collected}
+
+
+def maybe_sweep() -> Optional[Dict[str, int]]:
+    """距上次清理超过 INGEST_SWEEP_INTERVAL 秒时执行一次清理（由 worker 主循环调用，0 表示关闭）"""
+    global _last_sweep
+    interval = get_sweep_interval()
+    if interval <= 0:
+        return None
+    with _sweep_lock:
+        if _last_sweep and time.monotonic() - _last_sweep < interval:
+            return None
+        _last_sweep = time.monotonic()
+    try:
+        return sweep()
+    except Exception as e:
+        logger.error(f"Ingest sweep failed: {e}")
+        return None
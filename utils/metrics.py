@@ -0,0 +1,279 @@
+"""
+进程内指标：计数器、直方图、处理阶段计时和MongoDB命令统计
+
+指标以 Prometheus 文本格式通过 /metrics 输出。每个进程（包括 process 模式的处理进程）
+各自维护一份指标，多进程部署时由采集端按实例汇总。
+请求携带 X-Profile: 1 时，本次请求内记录的各阶段耗时以 Server-Timing 响应头返回。
+"""
+import time
+import threading
+import functools
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from pymongo import monitoring
+
+# 直方图默认分桶（秒）
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """带标签的指标基类"""
+
+    type_name = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels: Dict[str, Any]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._render_samples())
+        return lines
+
+    def _render_samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """单调递增计数器"""
+
+    type_name = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._label_values(labels), 0)
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in values]
+
+
+class Histogram(Metric):
+    """累积分桶直方图"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 每组标签：各分桶计数（非累积，最后一个为 +Inf）、总和
+        self._values: Dict[LabelValues, List[Any]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._label_values(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._label_values(labels))
+        return sum(state[0]) if state else 0
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            values = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        lines = []
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames + ('le',), key + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+stage_seconds = registry.register(Histogram(
+    'document_stage_seconds', 'Time spent in each document processing stage', ['stage']))
+documents_processed = registry.register(Counter(
+    'documents_processed_total', 'Documents processed by file type and outcome', ['file_type', 'status']))
+http_request_seconds = registry.register(Histogram(
+    'http_request_seconds', 'HTTP request handling time', ['method', 'endpoint', 'status']))
+mongodb_commands = registry.register(Counter(
+    'mongodb_commands_total', 'MongoDB commands by name and outcome', ['command', 'outcome']))
+mongodb_command_seconds = registry.register(Histogram(
+    'mongodb_command_seconds', 'MongoDB command round-trip time', ['command']))
+
+
+def render_metrics() -> str:
+    """以 Prometheus 文本格式输出所有指标"""
+    return registry.render()
+
+
+# 当前请求的阶段耗时（仅在开启请求级分析时存在）：阶段 -> [次数, 总耗时]
+_profile: ContextVar[Optional[Dict[str, List[float]]]] = ContextVar('metrics_profile', default=None)
+
+
+def start_profile():
+    """开启当前上下文（请求）的阶段耗时记录"""
+    _profile.set({})
+
+
+def stop_profile() -> Dict[str, List[float]]:
+    """结束当前上下文的阶段耗时记录并返回结果"""
+    profile = _profile.get()
+    _profile.set(None)
+    return profile or {}
+
+
+def _add_to_profile(stage: str, seconds: float):
+    profile = _profile.get()
+    if profile is not None:
+        entry = profile.setdefault(stage, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+
+def record_stage(stage: str, seconds: float):
+    """记录一次阶段耗时"""
+    stage_seconds.observe(seconds, stage=stage)
+    _add_to_profile(stage, seconds)
+
+
+class timed:
+    """统计代码块或函数的耗时，可用作上下文管理器或装饰器
+
+        with timed('parse'):
+            ...
+
+        @timed('process.pdf')
+        def _process_pdf(self):
+            ...
+    """
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self._started = 0.0
+
+    def __enter__(self) -> 'timed':
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        record_stage(self.stage, time.perf_counter() - self._started)
+        return False
+
+    def __call__(self, func):
+        # 作为装饰器时每次调用使用新的计时实例，支持并发和递归调用
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(self.stage):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+def timed_iter(iterable: Iterable[Any], stage: str) -> Iterator[Any]:
+    """统计迭代器每次产出下一项的耗时（例如逐页提取PDF文本）"""
+    iterator = iter(iterable)
+    while True:
+        started = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        record_stage(stage, time.perf_counter() - started)
+        yield item
+
+
+def format_server_timing(profile: Dict[str, List[float]], total: Optional[float] = None) -> str:
+    """将阶段耗时格式化为 Server-Timing 响应头（毫秒）"""
+    entries = [f'{stage.replace(" ", "_")};dur={seconds * 1000:.3f};desc="x{int(count)}"'
+               for stage, (count, seconds) in sorted(profile.items(), key=lambda item: -item[1][1])]
+    if total is not None:
+        entries.append(f'total;dur={total * 1000:.3f}')
+    return ', '.join(entries)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """统计MongoDB命令的次数和往返耗时（回调在执行命令的线程中调用）"""
+
+    # 连接握手和心跳不计入
+    IGNORED_COMMANDS = frozenset({'hello', 'ismaster', 'isMaster', 'saslStart', 'saslContinue', 'endSessions'})
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        pass
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self._record(event, 'success')
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._record(event, 'failure')
+
+    def _record(self, event, outcome: str):
+        if event.command_name in self.IGNORED_COMMANDS:
+            return
+        seconds = event.duration_micros / 1_000_000
+        mongodb_commands.inc(command=event.command_name, outcome=outcome)
+        mongodb_command_seconds.observe(seconds, command=event.command_name)
+        _add_to_profile(f"db.{event.command_name}", seconds)
+
+
+command_listener = MongoCommandListener()
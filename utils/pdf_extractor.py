@@ -0,0 +1,97 @@
+import os
+import io
+import logging
+from typing import Iterator, List, Optional, Tuple, Union
+from PyPDF2 import PdfReader
+from utils.upload_source import MappedFile, UploadSource
+from utils.extractor_pool import get_extractor_pool
+
+logger = logging.getLogger(__name__)
+
+# 页数少于该值时在一个工作进程中依次提取，避免进程间传输的开销超过收益
+DEFAULT_MIN_PARALLEL_PAGES = 32
+
+
+def get_pdf_workers() -> int:
+    """读取单个PDF并行提取的进程数配置（默认为CPU核数，不超过解析进程池的大小）"""
+    default_workers = os.cpu_count() or 1
+    try:
+        return max(1, int(os.getenv('PDF_EXTRACT_WORKERS', default_workers)))
+    except (TypeError, ValueError):
+        logger.warning(f"Invalid PDF_EXTRACT_WORKERS value, using default: {default_workers}")
+        return default_workers
+
+
+def _open_stream(source: Union[bytes, str]) -> io.BufferedIOBase:
+    """source 为磁盘文件路径时直接内存映射该文件，避免在进程间传输文件内容"""
+    if isinstance(source, str):
+        return io.BufferedReader(MappedFile(source))
+    return io.BytesIO(source)
+
+
+def _pdf_page_count(source: Union[bytes, str]) -> int:
+    """在工作进程中读取PDF的页数"""
+    with _open_stream(source) as stream:
+        return len(PdfReader(stream).pages)
+
+
+def _iter_page_range(source: Union[bytes, str], start: int = 0, end: Optional[int] = None) -> Iterator[str]:
+    """在工作进程中打开独立的PdfReader，逐页产出[start, end)范围内的页面文本（end 为空表示到最后一页）"""
+    with _open_stream(source) as stream:
+        reader = PdfReader(stream)
+        end = len(reader.pages) if end is None else end
+        for i in range(start, end):
+            yield reader.pages[i].extract_text()
+
+
+def _extract_page_range(source: Union[bytes, str], start: int, end: int) -> List[str]:
+    """在工作进程中提取[start, end)范围内的页面文本"""
+    return list(_iter_page_range(source, start, end))
+
+
+def _split_ranges(page_count: int, parts: int) -> List[Tuple[int, int]]:
+    """将页码均匀切分为连续区间"""
+    size, remainder = divmod(page_count, parts)
+    ranges = []
+    start = 0
+    for i in range(parts):
+        end = start + size + (1 if i < remainder else 0)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def iter_pdf_pages(source: UploadSource,
+                   max_workers: Optional[int] = None,
+                   min_parallel_pages: int = DEFAULT_MIN_PARALLEL_PAGES,
+                   pool=None,
+                   start_page: int = 0) -> Iterator[str]:
+    """按页码顺序逐页返回PDF文本（从第 start_page 页开始，页码从0计）
+
+    PDF在隔离的解析进程中打开和提取，超时或超出内存上限时抛出 ExtractionError；
+    大文件的页码区间分配到多个解析进程中并行提取，按顺序重新组装，
+    小文件或仅配置一个进程时在一个解析进程中逐页提取并分批返回。
+    """
+    pool = pool or get_extractor_pool()
+    # 已落盘的文件只传递路径，内存中的小文件传递内容
+    task_source = source.path or source.read_bytes()
+    max_workers = min(max_workers or get_pdf_workers(), pool.size)
+    if max_workers <= 1:
+        yield from pool.stream(_iter_page_range, task_source, start_page)
+        return
+
+    page_count = pool.run(_pdf_page_count, task_source)
+    remaining = max(0, page_count - start_page)
+    workers = min(max_workers, remaining)
+    if workers <= 1 or remaining < min_parallel_pages:
+        yield from pool.stream(_iter_page_range, task_source, start_page, page_count)
+        return
+
+    futures = [pool.submit(_extract_page_range, task_source, start_page + start, start_page + end)
+               for start, end in _split_ranges(remaining, workers)]
+    try:
+        for future in futures:
+            yield from future.result()
+    finally:
+        for future in futures:
+            future.cancel()
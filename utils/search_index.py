@@ -0,0 +1,181 @@
+import math
+import re
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from pymongo import UpdateOne
+from models.document_models import ContentType, DocumentStatus
+from database.mongo_client import documents, document_sections, document_contents, search_postings, search_terms
+from utils.content_codec import decode_content
+
+# 每个词项最多读取的倒排记录数（按词频降序），限制高频词的查询成本
+MAX_POSTINGS_PER_TERM = 2000
+# BM25 参数，内容块平均长度按固定值估算以免维护全局统计
+BM25_K1 = 1.2
+BM25_B = 0.75
+AVG_BLOCK_TOKENS = 200
+SNIPPET_RADIUS = 40
+TERM_UPDATE_BATCH_SIZE = 1000
+
+# 拉丁字母/数字单词，以及连续的中日韩字符
+TOKEN_PATTERN = re.compile(r'[0-9a-z]+|[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]+')
+CJK_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]')
+
+
+def tokenize(text: str) -> List[str]:
+    """分词：拉丁文本按单词切分，中日韩文本按相邻二元组切分（单字词保留单字）"""
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        word = match.group()
+        if not CJK_PATTERN.match(word):
+            tokens.append(word)
+        elif len(word) == 1:
+            tokens.append(word)
+        else:
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+    return tokens
+
+
+def content_text(content_data: Dict[str, Any]) -> str:
+    """提取内容块中可检索的文本（紧凑格式的内容块先还原）"""
+    content = decode_content(content_data).get('content') or {}
+    if content_data.get('content_type') == ContentType.TABLE.value:
+        cells = list(content.get('headers') or [])
+        for row in content.get('rows') or []:
+            cells.extend(row)
+        return '\n'.join(cell for cell in cells if cell)
+    return content.get('text') or ''
+
+
+def build_postings(content_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """为一个内容块生成倒排记录（每个词项一条）"""
+    tokens = tokenize(content_text(content_data))
+    if not tokens:
+        return []
+
+    return [{
+        'term': term,
+        'document_id': content_data['document_id'],
+        'section_id': content_data['section_id'],
+        'content_id': content_data['_id'],
+        'tf': tf,
+        'length': len(tokens)
+    } for term, tf in Counter(tokens).items()]
+
+
+def update_term_frequencies(document_frequencies: Counter):
+    """累加各词项的文档频率（包含该词项的内容块数）"""
+    operations = [
+        UpdateOne({'_id': term}, {'$inc': {'df': df}}, upsert=True)
+        for term, df in document_frequencies.items()
+    ]
+    for start in range(0, len(operations), TERM_UPDATE_BATCH_SIZE):
+        search_terms.bulk_write(operations[start:start + TERM_UPDATE_BATCH_SIZE], ordered=False)
+
+
+def _make_snippet(text: str, query: str, terms: Iterable[str]) -> str:
+    """截取命中位置附近的文本片段"""
+    lowered = text.lower()
+    candidates = [query.lower().strip()] + sorted(set(terms), key=len, reverse=True)
+    position = -1
+    for candidate in candidates:
+        if candidate:
+            position = lowered.find(candidate)
+            if position >= 0:
+                break
+
+    if position < 0:
+        return text[:SNIPPET_RADIUS * 2]
+
+    start = max(0, position - SNIPPET_RADIUS)
+    end = min(len(text), position + SNIPPET_RADIUS)
+    return ('…' if start else '') + text[start:end] + ('…' if end < len(text) else '')
+
+
+def search(query: str, limit: int = 20, document_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """在倒排索引中检索内容块，按BM25得分返回命中结果"""
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return []
+
+    total_blocks = max(document_contents.estimated_document_count(), 1)
+    doc_frequencies = {term['_id']: term['df'] for term in search_terms.find({'_id': {'$in': terms}})}
+
+    scores: Dict[str, float] = {}
+    locations: Dict[str, Dict[str, str]] = {}
+    projection = {'_id': 0, 'content_id': 1, 'document_id': 1, 'section_id': 1, 'tf': 1, 'length': 1}
+    for term in terms:
+        df = doc_frequencies.get(term)
+        if not df:
+            continue
+        idf = math.log(1 + (total_blocks - df + 0.5) / (df + 0.5))
+
+        posting_query = {'term': term}
+        if document_id:
+            posting_query['document_id'] = document_id
+        postings = search_postings.find(posting_query, projection).sort('tf', -1).limit(MAX_POSTINGS_PER_TERM)
+        for posting in postings:
+            tf = posting['tf']
+            norm = 1 - BM25_B + BM25_B * posting['length'] / AVG_BLOCK_TOKENS
+            content_id = posting['content_id']
+            scores[content_id] = scores.get(content_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * norm)
+            locations[content_id] = posting
+
+    if not scores:
+        return []
+
+    # 多取一些候选以弥补被过滤的结果
+    candidates = sorted(scores, key=scores.get, reverse=True)[:limit * 2]
+    return hydrate_hits(candidates, scores, locations, limit,
+                        lambda text: _make_snippet(text, query, terms))
+
+
+def hydrate_hits(candidates: List[str],
+                 scores: Dict[str, float],
+                 locations: Dict[str, Dict[str, str]],
+                 limit: int,
+                 make_snippet: Callable[[str], str]) -> List[Dict[str, Any]]:
+    """只保留已处理完成的文档中的候选内容块，并补充文件名、章节和摘要
+
+    locations 为每个候选内容块的 document_id 和 section_id。
+    """
+    document_ids = list({locations[content_id]['document_id'] for content_id in candidates})
+    processed = {
+        doc['_id']: doc for doc in documents.find(
+            {'_id': {'$in': document_ids}, 'status': DocumentStatus.PROCESSED.value},
+            {'filename': 1}
+        )
+    }
+    hits = [content_id for content_id in candidates if locations[content_id]['document_id'] in processed][:limit]
+    if not hits:
+        return []
+
+    contents = {
+        content['_id']: content for content in document_contents.find(
+            {'_id': {'$in': hits}},
+            {'content': 1, 'content_type': 1}
+        )
+    }
+    section_ids = list({locations[content_id]['section_id'] for content_id in hits})
+    sections = {
+        section['_id']: section for section in document_sections.find(
+            {'_id': {'$in': section_ids}},
+            {'section_number': 1, 'title': 1}
+        )
+    }
+
+    results = []
+    for content_id in hits:
+        location = locations[content_id]
+        section = sections.get(location['section_id'], {})
+        content = contents.get(content_id)
+        results.append({
+            'document_id': location['document_id'],
+            'filename': processed[location['document_id']].get('filename'),
+            'section_id': location['section_id'],
+            'section_number': section.get('section_number'),
+            'section_title': section.get('title'),
+            'content_id': content_id,
+            'score': round(scores[content_id], 4),
+            'snippet': make_snippet(content_text(content)) if content else ''
+        })
+    return results
\ No newline at end of file
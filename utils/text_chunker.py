@@ -0,0 +1,167 @@
+import os
+import re
+import logging
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 默认分块参数
+DEFAULT_CHUNK_MAX_SIZE = 2000
+DEFAULT_CHUNK_OVERLAP = 0
+DEFAULT_CHUNK_UNIT = 'chars'
+CHUNK_UNITS = ('chars', 'tokens')
+
+# 可切分的位置：换行、西文句末标点后的空白、中文句末标点之后
+BOUNDARY_PATTERN = re.compile(r'\n+[ \t]*|(?<=[.!?;:])[ \t]+|(?<=[。！？；])')
+# Markdown 风格的标题行，总是作为新分块的开头
+HEADING_PATTERN = re.compile(r'#{1,6}[ \t]')
+# 近似的分词：连续的ASCII字母数字计为一个词元，其他非空白字符（包括每个汉字、标点）各计为一个
+TOKEN_PATTERN = re.compile(r'[A-Za-z0-9]+|\S')
+
+
+def _get_env(name: str, default, cast):
+    try:
+        return cast(os.getenv(name, default))
+    except (TypeError, ValueError):
+        logger.warning(f"Invalid {name} value, using default: {default}")
+        return default
+
+
+def get_chunk_max_size() -> int:
+    """读取单个分块的大小上限配置"""
+    return _get_env('CHUNK_MAX_SIZE', DEFAULT_CHUNK_MAX_SIZE, int)
+
+
+def get_chunk_overlap() -> int:
+    """读取相邻分块的重叠大小配置"""
+    return _get_env('CHUNK_OVERLAP', DEFAULT_CHUNK_OVERLAP, int)
+
+
+def get_chunk_unit() -> str:
+    """读取分块大小的计量单位配置（chars 或 tokens）"""
+    unit = os.getenv('CHUNK_UNIT', DEFAULT_CHUNK_UNIT)
+    if unit not in CHUNK_UNITS:
+        logger.warning(f"Invalid CHUNK_UNIT value, using default: {DEFAULT_CHUNK_UNIT}")
+        return DEFAULT_CHUNK_UNIT
+    return unit
+
+
+class TextChunker:
+    """将文本切分为大小受限的分块
+
+    优先在换行和句末切分，Markdown 标题行总是开始新的分块；没有可切分位置的超长文本
+    按大小上限强制切分（尽量在空白处）。只含空白的单元并入当前分块，不计入大小上限的判断。
+    输入可以是逐段读取的文本流，处理时只在内存中保留当前分块和未完成的一句。
+    不设置重叠时，各分块依次拼接即为原文。
+    """
+
+    def __init__(self, max_size: Optional[int] = None, overlap: Optional[int] = None,
+                 unit: Optional[str] = None):
+        self.max_size = max_size if max_size is not None else get_chunk_max_size()
+        self.overlap = overlap if overlap is not None else get_chunk_overlap()
+        self.unit = unit or get_chunk_unit()
+        if self.unit not in CHUNK_UNITS:
+            raise ValueError(f"不支持的分块单位: {self.unit}")
+        if self.max_size < 1:
+            raise ValueError("分块大小上限必须大于0")
+        if not 0 <= self.overlap < self.max_size:
+            raise ValueError("分块重叠必须小于分块大小上限")
+
+    def measure(self, text: str) -> int:
+        """按配置的单位计算文本大小"""
+        if self.unit == 'chars':
+            return len(text)
+        return len(TOKEN_PATTERN.findall(text))
+
+    def chunk_text(self, text: str) -> Iterator[str]:
+        """切分一段完整的文本"""
+        # 词元数不会超过字符数，短文本无需切分
+        if len(text) <= self.max_size:
+            if text.strip():
+                yield text
+            return
+        yield from self.chunk_stream([text])
+
+    def chunk_stream(self, pieces: Iterable[str]) -> Iterator[str]:
+        """切分逐段读取的文本流"""
+        current: List[Tuple[str, int]] = []
+        size = 0
+        for unit in self._iter_units(pieces):
+            unit_size = self.measure(unit)
+            if current and HEADING_PATTERN.match(unit):
+                yield from self._emit(current)
+                current, size = [], 0
+            elif current and size + unit_size > self.max_size and unit.strip():
+                yield from self._emit(current)
+                current = self._overlap_tail(current)
+                size = sum(item_size for _, item_size in current)
+                while current and size + unit_size > self.max_size:
+                    size -= current.pop(0)[1]
+            current.append((unit, unit_size))
+            size += unit_size
+        yield from self._emit(current)
+
+    def _emit(self, units: List[Tuple[str, int]]) -> Iterator[str]:
+        text = ''.join(unit for unit, _ in units)
+        if text.strip():
+            yield text
+
+    def _overlap_tail(self, units: List[Tuple[str, int]]) -> List[Tuple[str, int]]:
+        """上一分块末尾不超过重叠大小的若干完整句子"""
+        tail: List[Tuple[str, int]] = []
+        size = 0
+        for unit, unit_size in reversed(units):
+            if size + unit_size > self.overlap:
+                break
+            tail.insert(0, (unit, unit_size))
+            size += unit_size
+        return tail
+
+    def _iter_units(self, pieces: Iterable[str]) -> Iterator[str]:
+        """将文本流切分为不可再分的单元（句子或行），超长单元再按大小强制切分"""
+        buffer = ''
+        for piece in pieces:
+            buffer += piece
+            start = 0
+            for match in BOUNDARY_PATTERN.finditer(buffer):
+                # 位于缓冲区末尾的换行可能还未读完，留到下一段再判断
+                if match.end() == len(buffer):
+                    break
+                yield from self._split_oversized(buffer[start:match.end()])
+                start = match.end()
+            buffer = buffer[start:]
+            # 长时间没有可切分位置时，只保留不足一个分块的部分
+            if len(buffer) > self.max_size * 2:
+                parts = list(self._split_oversized(buffer))
+                yield from parts[:-1]
+                buffer = parts[-1]
+        if buffer:
+            yield from self._split_oversized(buffer)
+
+    def _split_oversized(self, text: str) -> Iterator[str]:
+        start = 0
+        while len(text) - start > self.max_size:
+            cut = self._cut_position(text, start)
+            if cut is None:
+                break
+            yield text[start:cut]
+            start = cut
+        if start < len(text):
+            yield text[start:]
+
+    def _cut_position(self, text: str, start: int) -> Optional[int]:
+        """从 start 开始不超过大小上限的最长片段的结束位置，尽量落在空白处；剩余部分不超限时返回 None"""
+        if self.unit == 'chars':
+            limit = start + self.max_size
+        else:
+            limit = start
+            for count, match in enumerate(TOKEN_PATTERN.finditer(text, start), 1):
+                if count > self.max_size:
+                    break
+                limit = match.end()
+            else:
+                return None
+        space = max(text.rfind(' ', start, limit), text.rfind('\t', start, limit))
+        if space > start + (limit - start) // 2:
+            return space + 1
+        return limit
@@ -0,0 +1,175 @@
+import io
+import os
+import mmap
+import hashlib
+import logging
+import tempfile
+from typing import BinaryIO, Iterator, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# 超过该大小的上传文件写入磁盘临时文件，而不是保存在内存中
+DEFAULT_SPOOL_THRESHOLD = 2 * 1024 * 1024  # 2MB
+COPY_CHUNK_SIZE = 64 * 1024
+
+
+def get_spool_threshold() -> int:
+    """读取上传文件落盘阈值配置"""
+    try:
+        return int(os.getenv('UPLOAD_SPOOL_THRESHOLD', DEFAULT_SPOOL_THRESHOLD))
+    except (TypeError, ValueError):
+        logger.warning(f"Invalid UPLOAD_SPOOL_THRESHOLD value, using default: {DEFAULT_SPOOL_THRESHOLD}")
+        return DEFAULT_SPOOL_THRESHOLD
+
+
+class MappedFile(io.RawIOBase):
+    """以内存映射方式只读打开磁盘文件，提供标准的可定位文件接口"""
+
+    def __init__(self, path: str):
+        super().__init__()
+        self._file = open(path, 'rb')
+        self._size = os.fstat(self._file.fileno()).st_size
+        # 空文件无法映射
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self._size else None
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._size
+        self._pos = max(0, offset)
+        return self._pos
+
+    def readinto(self, buffer) -> int:
+        if self._map is None or self._pos >= self._size:
+            return 0
+        data = self._map[self._pos:self._pos + len(buffer)]
+        buffer[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            if self._map is not None:
+                self._map.close()
+            self._file.close()
+        super().close()
+
+
+class UploadSource:
+    """上传文件的数据源
+
+    小文件保存在内存中；超过阈值的文件以分块方式写入磁盘临时文件，
+    之后通过内存映射读取，使每次上传的常驻内存不随文件大小增长。
+    复制过程中同时计算内容的SHA-256，用于识别重复上传。
+    """
+
+    def __init__(self, source: Union[bytes, BinaryIO], spool_threshold: Optional[int] = None):
+        self.spool_threshold = spool_threshold if spool_threshold is not None else get_spool_threshold()
+        self.path: Optional[str] = None
+        self._content: Optional[bytes] = None
+
+        if isinstance(source, (bytes, bytearray)):
+            self._content = bytes(source)
+            self.size = len(self._content)
+            self.sha256 = hashlib.sha256(self._content).hexdigest()
+        else:
+            self._spool(source)
+
+    def _spool(self, stream: BinaryIO):
+        """分块复制数据流，超过阈值时转存到磁盘"""
+        buffer = bytearray()
+        spool_file = None
+        digest = hashlib.sha256()
+        self.size = 0
+
+        try:
+            while True:
+                chunk = stream.read(COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                self.size += len(chunk)
+                digest.update(chunk)
+
+                if spool_file is not None:
+                    spool_file.write(chunk)
+                    continue
+
+                buffer.extend(chunk)
+                if len(buffer) > self.spool_threshold:
+                    spool_file = self._create_spool_file()
+                    spool_file.write(buffer)
+                    buffer = bytearray()
+        except Exception:
+            if spool_file is not None:
+                spool_file.close()
+                os.unlink(spool_file.name)
+            raise
+
+        self.sha256 = digest.hexdigest()
+        if spool_file is None:
+            self._content = bytes(buffer)
+            return
+
+        spool_file.close()
+        self.path = spool_file.name
+
+    def _create_spool_file(self):
+        """创建磁盘临时文件（配置了 UPLOAD_FOLDER 时写入该目录）"""
+        upload_folder = os.getenv('UPLOAD_FOLDER')
+        if upload_folder:
+            os.makedirs(upload_folder, exist_ok=True)
+        return tempfile.NamedTemporaryFile(prefix='upload-', dir=upload_folder or None, delete=False)
+
+    @property
+    def is_spooled(self) -> bool:
+        """是否已转存到磁盘"""
+        return self.path is not None
+
+    def open(self) -> BinaryIO:
+        """打开一个新的只读、可定位的数据流"""
+        if self.path:
+            return io.BufferedReader(MappedFile(self.path))
+        return io.BytesIO(self._content)
+
+    def read_bytes(self) -> bytes:
+        """读取全部内容（仅用于小文件或必须完整读取的场景）"""
+        if self._content is not None:
+            return self._content
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def iter_chunks(self, chunk_size: int = COPY_CHUNK_SIZE) -> Iterator[bytes]:
+        """分块读取内容"""
+        with self.open() as stream:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+    def close(self):
+        """删除磁盘临时文件"""
+        if self.path:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+        self._content = None
+
+    def __enter__(self) -> 'UploadSource':
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
\ No newline at end of file
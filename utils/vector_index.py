@@ -0,0 +1,537 @@
+import os
+import time
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from database.mongo_client import content_embeddings, content_relationships, document_contents, system_stats
+from models.document_models import ContentRelationship
+from utils.bulk_writer import BulkWriter
+from utils.embeddings import Embedder, VECTOR_DTYPE, EMBEDDING_BATCH_SIZE, build_embedding_records, get_embedder
+from utils.search_index import SNIPPET_RADIUS, content_text, hydrate_hits
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_MODE = 'flat'
+INDEX_MODES = ('flat', 'ivf')
+DEFAULT_REFRESH_SECONDS = 30.0
+DEFAULT_N_PROBE = 8
+# 暴力检索时每次参与矩阵乘法的向量行数
+SEARCH_BLOCK_ROWS = 65536
+# IVF 聚类的迭代次数和训练样本上限
+KMEANS_ITERATIONS = 10
+KMEANS_MAX_SAMPLES = 50000
+LOAD_BATCH_SIZE = 5000
+SIMILAR_RELATIONSHIP = 'similar'
+# system_stats 中记录向量版本号的文档ID
+INDEX_GENERATION_ID = 'vector_index'
+# 版本记录中保留的最近变更数（每个版本号一条，记录向量有变化的文档）
+CHANGE_LOG_SIZE = 1000
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """返回得分最高的 k 个位置（按得分降序）"""
+    if k >= len(scores):
+        return np.argsort(-scores, kind='stable')
+    candidates = np.argpartition(-scores, k)[:k]
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+class VectorIndex:
+    """内存向量索引，按余弦相似度（归一化向量的内积）检索
+
+    - flat：分块矩阵乘法暴力检索，结果精确
+    - ivf：先用球面k-means把向量分到若干簇，查询时只检索最接近的 n_probe 个簇，结果近似
+    - quantize=True 时向量按行缩放为 int8 保存，内存占用约为 float32 的四分之一
+
+    索引构建后不再修改，replace_documents 返回新的索引，其他线程可以继续检索原索引。
+    """
+
+    def __init__(self, dimension: int, mode: str = DEFAULT_INDEX_MODE, quantize: bool = False,
+                 n_lists: Optional[int] = None, n_probe: int = DEFAULT_N_PROBE):
+        if mode not in INDEX_MODES:
+            raise ValueError(f"不支持的索引模式: {mode}")
+        self.dimension = dimension
+        self.mode = mode
+        self.quantize = quantize
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.ids: List[str] = []
+        self.document_ids: List[str] = []
+        self.section_ids: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._rows_by_document: Dict[str, np.ndarray] = {}
+        self._matrix = np.zeros((0, dimension), dtype=np.float32)
+        self._scales: Optional[np.ndarray] = None
+        self._centroids: Optional[np.ndarray] = None
+        self._lists: List[np.ndarray] = []
+        # 每行所属的簇，以及聚类时的向量数
+        self._assignment = np.zeros(0, dtype=np.int64)
+        self._trained_rows = 0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def build(self, ids: List[str], document_ids: List[str], section_ids: List[str], vectors: np.ndarray):
+        """用一批归一化向量构建索引"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimension)
+        self._set_rows(list(ids), list(document_ids), list(section_ids), *self._encode(vectors))
+
+        self._centroids = None
+        self._lists = []
+        if self.mode == 'ivf' and len(self.ids):
+            self._train_ivf(vectors)
+
+    def replace_documents(self, documents: Dict[str, Tuple[List[str], List[str], np.ndarray]]) -> 'VectorIndex':
+        """返回替换了若干文档向量的新索引
+
+        documents 为 document_id -> (内容块ID, 章节ID, 归一化向量)，没有向量时从索引中移除该文档。
+        IVF 模式下新向量分配到最接近的已有簇，向量数超过聚类时的两倍后重新聚类。
+        """
+        keep = np.ones(len(self.ids), dtype=bool)
+        for document_id in documents:
+            rows = self._rows_by_document.get(document_id)
+            if rows is not None:
+                keep[rows] = False
+        kept = np.flatnonzero(keep)
+
+        ids = [self.ids[row] for row in kept]
+        document_ids = [self.document_ids[row] for row in kept]
+        section_ids = [self.section_ids[row] for row in kept]
+        added = [np.zeros((0, self.dimension), dtype=np.float32)]
+        for document_id, (content_ids, content_section_ids, vectors) in documents.items():
+            ids.extend(content_ids)
+            document_ids.extend([document_id] * len(content_ids))
+            section_ids.extend(content_section_ids)
+            added.append(np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimension))
+        added_vectors = np.concatenate(added)
+
+        index = VectorIndex(self.dimension, self.mode, self.quantize, self.n_lists, self.n_probe)
+        matrix, scales = index._encode(added_vectors)
+        index._set_rows(
+            ids, document_ids, section_ids,
+            np.concatenate([self._matrix[kept], matrix]),
+            None if scales is None else np.concatenate([self._scales[kept], scales])
+        )
+        if self.mode == 'ivf' and len(index):
+            if self._centroids is None or len(index) > 2 * self._trained_rows:
+                index._train_ivf(index._rows_as_float(slice(None)))
+            else:
+                index._centroids = self._centroids
+                index._trained_rows = self._trained_rows
+                index._set_lists(np.concatenate([self._assignment[kept], index._assign(added_vectors)]))
+        return index
+
+    def _encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """返回保存的矩阵和各行的缩放系数（未量化时为 None）"""
+        if not self.quantize:
+            return vectors, None
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    def _set_rows(self, ids: List[str], document_ids: List[str], section_ids: List[str],
+                  matrix: np.ndarray, scales: Optional[np.ndarray]):
+        self.ids = ids
+        self.document_ids = document_ids
+        self.section_ids = section_ids
+        self._positions = {content_id: row for row, content_id in enumerate(self.ids)}
+
+        rows_by_document: Dict[str, List[int]] = {}
+        for row, document_id in enumerate(self.document_ids):
+            rows_by_document.setdefault(document_id, []).append(row)
+        self._rows_by_document = {key: np.array(rows) for key, rows in rows_by_document.items()}
+        self._matrix = matrix
+        self._scales = scales
+
+    def vector(self, content_id: str) -> Optional[np.ndarray]:
+        """索引中某个内容块的向量"""
+        row = self._positions.get(content_id)
+        if row is None:
+            return None
+        return self._rows_as_float(np.array([row]))[0]
+
+    def location(self, content_id: str) -> Dict[str, str]:
+        """内容块所属的 document_id 和 section_id"""
+        row = self._positions[content_id]
+        return {'document_id': self.document_ids[row], 'section_id': self.section_ids[row]}
+
+    def _rows_as_float(self, rows) -> np.ndarray:
+        block = self._matrix[rows]
+        if self._scales is None:
+            return block
+        return block.astype(np.float32) * self._scales[rows][:, None]
+
+    def _score_rows(self, rows, queries: np.ndarray) -> np.ndarray:
+        """计算若干行与查询向量的内积，返回 (len(rows), len(queries))"""
+        return self._rows_as_float(rows) @ queries.T
+
+    def _train_ivf(self, vectors: np.ndarray):
+        n_lists = self.n_lists or max(1, int(np.sqrt(len(vectors))))
+        n_lists = min(n_lists, len(vectors))
+        rng = np.random.default_rng(0)
+        sample = vectors
+        if len(vectors) > KMEANS_MAX_SAMPLES:
+            sample = vectors[rng.choice(len(vectors), KMEANS_MAX_SAMPLES, replace=False)]
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+        for _ in range(KMEANS_ITERATIONS):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for cluster in range(n_lists):
+                members = sample[assignment == cluster]
+                if len(members):
+                    centroids[cluster] = members.sum(axis=0)
+            norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids /= norms
+
+        self._centroids = centroids
+        self._trained_rows = len(vectors)
+        self._set_lists(self._assign(vectors))
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        """每个向量最接近的簇"""
+        assignment = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), SEARCH_BLOCK_ROWS):
+            block = vectors[start:start + SEARCH_BLOCK_ROWS]
+            assignment[start:start + len(block)] = np.argmax(block @ self._centroids.T, axis=1)
+        return assignment
+
+    def _set_lists(self, assignment: np.ndarray):
+        self._assignment = assignment
+        self._lists = [np.flatnonzero(assignment == cluster) for cluster in range(len(self._centroids))]
+
+    def search(self, queries: np.ndarray, k: int, document_id: Optional[str] = None,
+               exclude_ids: Optional[List[str]] = None) -> List[List[Tuple[str, float]]]:
+        """为每个查询向量返回最相似的 k 个 (content_id, score)"""
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dimension)
+        if not len(self.ids) or k < 1:
+            return [[] for _ in range(len(queries))]
+        excluded = {self._positions[c] for c in exclude_ids or [] if c in self._positions}
+        fetch = k + len(excluded)
+
+        if document_id is not None:
+            rows = self._rows_by_document.get(document_id)
+            if rows is None:
+                return [[] for _ in range(len(queries))]
+            candidates = [(rows, self._score_rows(rows, queries))]
+            results = self._merge(candidates, len(queries), fetch)
+        elif self.mode == 'ivf':
+            results = [self._search_ivf(query, fetch) for query in queries]
+        else:
+            candidates = []
+            for start in range(0, len(self.ids), SEARCH_BLOCK_ROWS):
+                stop = min(start + SEARCH_BLOCK_ROWS, len(self.ids))
+                # 连续的行用切片读取，避免复制整块矩阵
+                scores = self._score_rows(slice(start, stop), queries)
+                candidates.append(self._best_in_block(np.arange(start, stop), scores, fetch))
+            results = self._merge(candidates, len(queries), fetch)
+
+        return [[(self.ids[row], float(score)) for row, score in result if row not in excluded][:k]
+                for result in results]
+
+    def _best_in_block(self, rows: np.ndarray, scores: np.ndarray, k: int):
+        """每个查询在本块中的前 k 行，减少合并时的数据量"""
+        if len(rows) <= k:
+            return rows, scores
+        keep = np.unique(np.argpartition(-scores, k - 1, axis=0)[:k].ravel())
+        return rows[keep], scores[keep]
+
+    def _merge(self, candidates, n_queries: int, k: int) -> List[List[Tuple[int, float]]]:
+        results = []
+        rows = np.concatenate([block_rows for block_rows, _ in candidates])
+        for query in range(n_queries):
+            scores = np.concatenate([block_scores[:, query] for _, block_scores in candidates])
+            best = _top_k(scores, k)
+            results.append(list(zip(rows[best].tolist(), scores[best].tolist())))
+        return results
+
+    def _search_ivf(self, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        probes = _top_k(self._centroids @ query, min(self.n_probe, len(self._lists)))
+        rows = np.concatenate([self._lists[cluster] for cluster in probes])
+        if not len(rows):
+            return []
+        scores = self._score_rows(rows, query[None, :])[:, 0]
+        best = _top_k(scores, k)
+        return list(zip(rows[best].tolist(), scores[best].tolist()))
+
+
+def _get_index_settings() -> Dict[str, Any]:
+    mode = os.getenv('VECTOR_INDEX_MODE', DEFAULT_INDEX_MODE)
+    if mode not in INDEX_MODES:
+        logger.warning(f"Invalid VECTOR_INDEX_MODE value, using default: {DEFAULT_INDEX_MODE}")
+        mode = DEFAULT_INDEX_MODE
+    try:
+        n_probe = int(os.getenv('VECTOR_INDEX_NPROBE', DEFAULT_N_PROBE))
+    except (TypeError, ValueError):
+        logger.warning(f"Invalid VECTOR_INDEX_NPROBE value, using default: {DEFAULT_N_PROBE}")
+        n_probe = DEFAULT_N_PROBE
+    return {
+        'mode': mode,
+        'quantize': os.getenv('VECTOR_INDEX_QUANTIZE', 'false').lower() in ('1', 'true', 'yes'),
+        'n_probe': n_probe
+    }
+
+
+def _get_refresh_seconds() -> float:
+    try:
+        return float(os.getenv('VECTOR_INDEX_REFRESH_SECONDS', DEFAULT_REFRESH_SECONDS))
+    except (TypeError, ValueError):
+        logger.warning(f"Invalid VECTOR_INDEX_REFRESH_SECONDS value, using default: {DEFAULT_REFRESH_SECONDS}")
+        return DEFAULT_REFRESH_SECONDS
+
+
+def _read_vectors(embedder: Embedder, query: Dict[str, Any]) -> Tuple[List[str], List[str], List[str], np.ndarray]:
+    """读取当前模型的向量，返回内容块ID、文档ID、章节ID和向量矩阵"""
+    ids, document_ids, section_ids, chunks = [], [], [], []
+    cursor = content_embeddings.find(
+        dict(query, model=embedder.name),
+        {'document_id': 1, 'section_id': 1, 'vector': 1}
+    ).batch_size(LOAD_BATCH_SIZE)
+    for record in cursor:
+        ids.append(record['_id'])
+        document_ids.append(record['document_id'])
+        section_ids.append(record['section_id'])
+        chunks.append(bytes(record['vector']))
+    vectors = np.frombuffer(b''.join(chunks), dtype=VECTOR_DTYPE).reshape(-1, embedder.dimension)
+    return ids, document_ids, section_ids, vectors
+
+
+def load_vector_index(embedder: Embedder) -> VectorIndex:
+    """从 content_embeddings 加载当前模型的全部向量并构建索引"""
+    ids, document_ids, section_ids, vectors = _read_vectors(embedder, {})
+    index = VectorIndex(embedder.dimension, **_get_index_settings())
+    index.build(ids, document_ids, section_ids, vectors)
+    logger.info(f"Vector index loaded: {len(index)} vectors ({index.mode})")
+    return index
+
+
+def _load_document_vectors(embedder: Embedder,
+                           document_ids: Set[str]) -> Dict[str, Tuple[List[str], List[str], np.ndarray]]:
+    """读取若干文档的向量，用于 VectorIndex.replace_documents（没有向量的文档对应空列表）"""
+    ids, owners, section_ids, vectors = _read_vectors(embedder, {'document_id': {'$in': sorted(document_ids)}})
+    rows: Dict[str, List[int]] = {document_id: [] for document_id in document_ids}
+    for row, document_id in enumerate(owners):
+        rows[document_id].append(row)
+    return {
+        document_id: ([ids[row] for row in document_rows], [section_ids[row] for row in document_rows],
+                      vectors[document_rows])
+        for document_id, document_rows in rows.items()
+    }
+
+
+def _read_generation() -> Tuple[int, List[Dict[str, Any]]]:
+    """读取向量版本号和最近的变更记录"""
+    record = system_stats.find_one({'_id': INDEX_GENERATION_ID}, {'generation': 1, 'changes': 1}) or {}
+    return record.get('generation', 0), record.get('changes', [])
+
+
+def _changed_documents(generation: int, changes: List[Dict[str, Any]], since: int) -> Optional[Set[str]]:
+    """版本号 since 之后向量有变化的文档；变更记录已不完整或有未记录文档的变更时返回 None（需要全量加载）
+
+    每次版本号加1时追加一条变更记录，最后一条对应当前版本号。
+    """
+    missing = generation - since
+    if missing <= 0 or missing > len(changes):
+        return None
+    document_ids: Set[str] = set()
+    for change in changes[len(changes) - missing:]:
+        if change.get('document_ids') is None:
+            return None
+        document_ids.update(change['document_ids'])
+    return document_ids
+
+
+class _IndexHolder:
+    """进程内共享的向量索引
+
+    最多每 VECTOR_INDEX_REFRESH_SECONDS 检查一次向量的版本号和向量数：版本号变化且变更记录完整时只重新读取有变化的文档的向量，
+    其他变化（更换模型、变更记录不完整、版本号不变而向量数变化）时全量加载。
+    新索引在锁外构建后替换，刷新期间其他线程继续使用当前索引；还没有索引时等待加载完成。
+    """
+
+    def __init__(self):
+        self.index: Optional[VectorIndex] = None
+        self.model: Optional[str] = None
+        self.state: Optional[Tuple[int, int]] = None
+        self.checked_at: Optional[float] = 0.0
+        self.lock = threading.Lock()
+        # 同一时间只有一个线程刷新索引
+        self.refresh_lock = threading.Lock()
+        self.invalidations = 0
+
+    def _fresh_index(self, embedder: Embedder) -> Tuple[Optional[VectorIndex], bool]:
+        """当前模型的索引，以及是否需要检查更新（调用时须持有 lock）"""
+        if self.index is None or self.model != embedder.name:
+            return None, True
+        due = self.checked_at is None or time.monotonic() - self.checked_at >= _get_refresh_seconds()
+        return self.index, due
+
+    def get(self, embedder: Embedder) -> VectorIndex:
+        with self.lock:
+            index, due = self._fresh_index(embedder)
+        if not due:
+            return index
+        # 已有索引时不等待其他线程的刷新
+        if not self.refresh_lock.acquire(blocking=index is None):
+            return index
+        try:
+            with self.lock:
+                index, due = self._fresh_index(embedder)
+                state, invalidations = self.state, self.invalidations
+            if not due:
+                return index
+            index, state = self._refresh(embedder, index, state)
+            with self.lock:
+                self.index, self.model, self.state = index, embedder.name, state
+                # 刷新期间收到的变更通知可能未包含在新索引中，下一次获取时再检查
+                self.checked_at = time.monotonic() if self.invalidations == invalidations else None
+            return index
+        finally:
+            self.refresh_lock.release()
+
+    @staticmethod
+    def _refresh(embedder: Embedder, index: Optional[VectorIndex],
+                 state: Optional[Tuple[int, int]]) -> Tuple[VectorIndex, Tuple[int, int]]:
+        generation, changes = _read_generation()
+        current = (generation, content_embeddings.estimated_document_count())
+        if index is not None and state is not None:
+            if current == state:
+                return index, state
+            document_ids = _changed_documents(generation, changes, state[0])
+            if document_ids is not None:
+                index = index.replace_documents(_load_document_vectors(embedder, document_ids))
+                logger.debug(f"Vector index updated for {len(document_ids)} documents: {len(index)} vectors")
+                return index, current
+        return load_vector_index(embedder), current
+
+    def invalidate(self):
+        """下一次获取索引时立即检查是否需要更新"""
+        with self.lock:
+            self.checked_at = None
+            self.invalidations += 1
+
+
+_holder = _IndexHolder()
+
+
+def notify_embeddings_changed(document_ids: Optional[List[str]] = None):
+    """写入或删除向量的操作提交后调用：版本号加1并记录有变化的文档
+
+    各进程在下一次检查时只重新读取这些文档的向量（本进程在下一次获取时立即检查）；
+    document_ids 为 None 表示变化范围未知（如补算全部向量），各进程全量加载。
+    """
+    system_stats.update_one(
+        {'_id': INDEX_GENERATION_ID},
+        {'$inc': {'generation': 1},
+         '$push': {'changes': {'$each': [{'document_ids': document_ids}], '$slice': -CHANGE_LOG_SIZE}}},
+        upsert=True
+    )
+    _holder.invalidate()
+
+
+def get_vector_index() -> Optional[VectorIndex]:
+    """获取当前模型的向量索引（未启用向量化时返回 None）"""
+    embedder = get_embedder()
+    if embedder is None:
+        return None
+    return _holder.get(embedder)
+
+
+def find_similar(text: Optional[str] = None, content_id: Optional[str] = None, limit: int = 10,
+                 document_id: Optional[str] = None) -> Optional[List[Dict[str, Any]]]:
+    """按一段文本或已有内容块查找最相似的内容块
+
+    传入 content_id 时使用该内容块已存储的向量，结果中不包含它本身。
+    未启用向量化时返回 None；content_id 没有对应向量时返回空列表。
+    """
+    embedder = get_embedder()
+    if embedder is None:
+        return None
+    index = _holder.get(embedder)
+
+    exclude_ids = None
+    if content_id:
+        query = index.vector(content_id)
+        if query is None:
+            return []
+        exclude_ids = [content_id]
+    else:
+        query = embedder.embed([text])[0]
+
+    # 多取一些候选，过滤掉未处理完成的文档后仍能凑够数量
+    matches = index.search(query, limit * 2, document_id=document_id, exclude_ids=exclude_ids)[0]
+    scores = dict(matches)
+    locations = {match_id: index.location(match_id) for match_id, _ in matches}
+    return hydrate_hits([match_id for match_id, _ in matches], scores, locations, limit,
+                        lambda content: content[:SNIPPET_RADIUS * 2])
+
+
+def backfill_embeddings(batch_size: int = LOAD_BATCH_SIZE) -> int:
+    """为还没有当前模型向量的内容块补算向量，返回新增的向量数"""
+    embedder = get_embedder()
+    if embedder is None:
+        return 0
+
+    existing = {record['_id'] for record in content_embeddings.find({'model': embedder.name}, {'_id': 1})}
+    writer = BulkWriter()
+    added = 0
+    batch: List[Dict[str, Any]] = []
+    cursor = document_contents.find(
+        {}, {'document_id': 1, 'section_id': 1, 'content_type': 1, 'content': 1}
+    ).batch_size(batch_size)
+    for content in cursor:
+        if content['_id'] in existing:
+            continue
+        batch.append(content)
+        if len(batch) >= EMBEDDING_BATCH_SIZE:
+            added += _add_embedding_records(writer, embedder, batch)
+            batch = []
+    added += _add_embedding_records(writer, embedder, batch)
+    writer.flush()
+    if added:
+        notify_embeddings_changed()
+    return added
+
+
+def _add_embedding_records(writer: BulkWriter, embedder: Embedder, contents: List[Dict[str, Any]]) -> int:
+    # 模型变化后以新向量覆盖旧记录
+    ids = [content['_id'] for content in contents]
+    if ids:
+        content_embeddings.delete_many({'_id': {'$in': ids}, 'model': {'$ne': embedder.name}})
+    records = build_embedding_records(embedder, contents, [content_text(content) for content in contents])
+    for record in records:
+        writer.add(content_embeddings, record)
+    return len(records)
+
+
+def build_similarity_links(k: int = 5, min_score: float = 0.0, batch_size: int = 256) -> int:
+    """为每个内容块写入与其最相似的 k 个内容块的关系（relationship_type='similar'），返回写入的关系数
+
+    先删除已有的 similar 关系再整体重建；关系强度（metadata.strength）为余弦相似度。
+    """
+    embedder = get_embedder()
+    if embedder is None:
+        return 0
+    index = load_vector_index(embedder)
+    content_relationships.delete_many({'relationship_type': SIMILAR_RELATIONSHIP})
+
+    writer = BulkWriter()
+    created = 0
+    for start in range(0, len(index), batch_size):
+        source_ids = index.ids[start:start + batch_size]
+        queries = np.stack([index.vector(source_id) for source_id in source_ids])
+        # 多取一个：每个内容块与自身的相似度最高
+        for source_id, matches in zip(source_ids, index.search(queries, k + 1)):
+            matches = [(target_id, score) for target_id, score in matches if target_id != source_id][:k]
+            for target_id, score in matches:
+                if score < min_score:
+                    continue
+                relationship = ContentRelationship(source_id, target_id, SIMILAR_RELATIONSHIP)
+                relationship.data['metadata']['strength'] = round(score, 4)
+                relationship.data['metadata']['description'] = embedder.name
+                writer.add(content_relationships, relationship.data)
+                created += 1
+    writer.flush()
+    return created